@@ -6,16 +6,29 @@ Part of the Agent Escalation System for cost-effective AI usage
 """
 
 import json
+import os
 import time
+import uuid
+import heapq
+import math
 import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from typing import Dict, List, Optional, Any, Callable, Tuple
 from dataclasses import dataclass, field
 from datetime import datetime, timedelta
-from queue import Queue, Empty
+from queue import Empty
 import argparse
 import sys
 
+from ai_common import percentile
+
+try:
+    import numpy as np
+except ImportError:  # Optional: vectorized similarity clustering
+    np = None
+
 @dataclass
 class BatchRequest:
     """Represents a single AI request in a batch"""
@@ -49,22 +62,342 @@ class BatchResult:
     processing_time: float = 0.0
     completed_at: Optional[datetime] = None
 
+class PriorityScheduler:
+    """Thread-safe request queue ordered by aged priority
+
+    A waiting request gains one priority level every max_wait_time seconds
+    (aging), so bulk work cannot starve. Each request also has a deadline of
+    max_wait_time / priority after submission. Deadlines only order requests
+    within the best aged priority level: there, overdue requests go first,
+    earliest deadline first, but being overdue never lifts a request above a
+    higher level. With fair_queuing, requests are kept per
+    submitting agent (metadata 'agent') and, within the best priority level,
+    agents take turns in proportion to their weights (start-time fair
+    queuing). Offers the Queue calls the processor uses: put, get,
+    get_nowait, qsize and empty.
+
+    put() returns a ticket (sequence number); submitted_ahead() reports how
+    many queued requests were submitted before it, via a Fenwick tree over
+    tickets, in O(log n) without touching the queue. That is submission
+    order, not service order: a higher-priority request may be served ahead
+    of requests submitted before it. Tickets restart from 1 whenever the
+    queue drains, so the tree stays sized to the backlog.
+    """
+
+    TREE_SIZE = 1024  # Initial Fenwick tree size (doubles as tickets grow)
+    LATENCY_SAMPLES = 10000  # Recent queue waits kept per priority class
+
+    def __init__(self, max_wait_time: float, fair_queuing: bool = False,
+                 agent_weights: Optional[Dict[str, float]] = None):
+        self.max_wait_time = max_wait_time
+        self.aging_rate = 1.0 / max_wait_time if max_wait_time > 0 else 0.0  # levels per second
+        self.fair_queuing = fair_queuing
+        self.agent_weights = dict(agent_weights or {})
+
+        self._cond = threading.Condition()
+        self._agents: Dict[str, List[Tuple[float, int, BatchRequest]]] = {}  # agent -> aging heap
+        self._deadlines: List[Tuple[float, int, BatchRequest]] = []
+        self._live: Dict[int, str] = {}  # sequence number -> agent, for queued requests
+        self._seq = 0
+        self._tree: List[int] = [0] * self.TREE_SIZE  # Fenwick tree of queued sequence numbers
+        self._virtual_time = 0.0
+        self._agent_finish: Dict[str, float] = {}
+        self.wait_times: Dict[int, deque] = {}
+
+    def deadline(self, request: BatchRequest) -> float:
+        """Epoch time by which the request should be dispatched"""
+        return request.submitted_at.timestamp() + self.max_wait_time / max(request.priority, 1)
+
+    def _agent(self, request: BatchRequest) -> str:
+        return str(request.metadata.get('agent', '')) if self.fair_queuing else ''
+
+    def _mark(self, seq: int, delta: int):
+        if seq >= len(self._tree):
+            # Double the tree and re-add every queued ticket (amortized O(log n))
+            self._tree = [0] * (2 * seq)
+            for live_seq in self._live:
+                if live_seq != seq:
+                    self._mark(live_seq, 1)
+        while seq < len(self._tree):
+            self._tree[seq] += delta
+            seq += seq & -seq
+
+    def submitted_ahead(self, ticket: int) -> int:
+        """Number of requests still queued that were submitted before ticket
+
+        An approximation of the queue position: service follows aged
+        priority and deadlines, not submission order. 0 once the ticket
+        has left the queue.
+        """
+        with self._cond:
+            if ticket not in self._live:
+                return 0
+            count = 0
+            index = min(ticket - 1, len(self._tree) - 1)
+            while index > 0:
+                count += self._tree[index]
+                index -= index & -index
+            return count
+
+    def put(self, request: BatchRequest) -> int:
+        with self._cond:
+            self._seq += 1
+            agent = self._agent(request)
+            # priority + rate * (now - submitted) ranks the same as this static key
+            key = -(request.priority - self.aging_rate * request.submitted_at.timestamp())
+            heapq.heappush(self._agents.setdefault(agent, []), (key, self._seq, request))
+            heapq.heappush(self._deadlines, (self.deadline(request), self._seq, request))
+            self._live[self._seq] = agent
+            self._mark(self._seq, 1)
+            self._cond.notify()
+            return self._seq
+
+    def _head(self, heap: List[Tuple[float, int, BatchRequest]]) -> Optional[Tuple[float, int, BatchRequest]]:
+        while heap and heap[0][1] not in self._live:
+            heapq.heappop(heap)
+        return heap[0] if heap else None
+
+    def _level(self, request: BatchRequest, now: float) -> int:
+        """Whole priority level after aging"""
+        return math.floor(request.priority + self.aging_rate * (now - request.submitted_at.timestamp()))
+
+    def _pop_locked(self) -> BatchRequest:
+        now = time.time()
+
+        best = None
+        for agent, heap in list(self._agents.items()):
+            head = self._head(heap)
+            if head is None:
+                del self._agents[agent]
+                continue
+            start = max(self._virtual_time, self._agent_finish.get(agent, 0.0))
+            # Higher whole priority level first; fair share (or age) within a level
+            rank = (-self._level(head[2], now), start if self.fair_queuing else 0.0, head[0])
+            if best is None or rank < best[0]:
+                best = (rank, agent)
+
+        # Each agent heap is ordered by aged priority, so no request is above
+        # the best head's level; an overdue request at that level goes first
+        overdue = self._head(self._deadlines)
+        if overdue is not None and overdue[0] <= now and -self._level(overdue[2], now) == best[0][0]:
+            heapq.heappop(self._deadlines)
+            return self._take(overdue[1], overdue[2])
+
+        head = heapq.heappop(self._agents[best[1]])
+        return self._take(head[1], head[2])
+
+    def _take(self, seq: int, request: BatchRequest) -> BatchRequest:
+        agent = self._live.pop(seq)
+        self._mark(seq, -1)
+        if not self._live:
+            self._rebase()
+        if self.fair_queuing:
+            start = max(self._virtual_time, self._agent_finish.get(agent, 0.0))
+            self._agent_finish[agent] = start + 1.0 / self.agent_weights.get(agent, 1.0)
+            self._virtual_time = start
+
+        wait = time.time() - request.submitted_at.timestamp()
+        samples = self.wait_times.setdefault(request.priority, deque(maxlen=self.LATENCY_SAMPLES))
+        samples.append(wait)
+        return request
+
+    def _rebase(self):
+        """Restart tickets at 1 once the queue is empty (caller holds the lock)
+
+        Every heap entry left is a stale one from lazy deletion; they are
+        dropped so a reused ticket can never revive one.
+        """
+        self._agents.clear()
+        self._deadlines.clear()
+        self._seq = 0
+        self._tree = [0] * self.TREE_SIZE
+
+    def get(self, block: bool = True, timeout: Optional[float] = None) -> BatchRequest:
+        with self._cond:
+            if block and not self._live:
+                self._cond.wait_for(lambda: self._live, timeout)
+            if not self._live:
+                raise Empty
+            return self._pop_locked()
+
+    def get_nowait(self) -> BatchRequest:
+        return self.get(block=False)
+
+    def qsize(self) -> int:
+        with self._cond:
+            return len(self._live)
+
+    def empty(self) -> bool:
+        return self.qsize() == 0
+
+    def snapshot(self) -> List[BatchRequest]:
+        """Queued requests in submission order, without dequeuing them"""
+        with self._cond:
+            queued = [(seq, request) for heap in self._agents.values()
+                      for _key, seq, request in heap if seq in self._live]
+        return [request for _seq, request in sorted(queued, key=lambda item: item[0])]
+
+    def latency_stats(self) -> Dict[int, Dict[str, float]]:
+        """Queue wait percentiles per priority class, over recent dispatches"""
+        with self._cond:
+            samples = {priority: list(waits) for priority, waits in self.wait_times.items()}
+        return {
+            priority: {
+                'count': len(waits),
+                'p50_ms': round(percentile(waits, 50) * 1000, 1),
+                'p99_ms': round(percentile(waits, 99) * 1000, 1),
+            }
+            for priority, waits in sorted(samples.items(), reverse=True)
+        }
+
+class SimilarityClusterer:
+    """Finds, for every prompt, the others whose word-set Jaccard exceeds threshold
+
+    Each prompt is tokenized once. Up to dense_limit prompts are scored all
+    at once as a (prompts x shared words) matrix product in NumPy, row block
+    by row block. Larger inputs, or no NumPy, go through prefix filtering:
+    with words ordered rarest first, two sets can only reach the threshold
+    if their short prefixes share a word, so only those pairs are verified.
+    Both paths are exact.
+    """
+
+    def __init__(self, threshold: float = 0.6, dense_limit: int = 2048, block_size: int = 512):
+        self.threshold = threshold
+        self.dense_limit = dense_limit
+        self.block_size = block_size
+
+    @staticmethod
+    def tokenize(prompt: str) -> frozenset:
+        return frozenset(prompt.lower().split())
+
+    def neighbors(self, token_sets: List[frozenset]) -> List[List[Tuple[float, int]]]:
+        """Per prompt, (similarity, index) of every prompt above threshold, in input order"""
+        if np is not None and 1 < len(token_sets) <= self.dense_limit:
+            pairs = self._dense_pairs(token_sets)
+        else:
+            pairs = self._prefix_filtered_pairs(token_sets)
+
+        result: List[List[Tuple[float, int]]] = [[] for _ in token_sets]
+        for i, j, similarity in pairs:
+            result[i].append((similarity, j))
+            result[j].append((similarity, i))
+        for matches in result:
+            matches.sort(key=lambda item: item[1])
+        return result
+
+    def _dense_pairs(self, token_sets: List[frozenset]) -> List[Tuple[int, int, float]]:
+        # Words in a single prompt never add to an intersection: leave them out
+        counts: Dict[str, int] = {}
+        for tokens in token_sets:
+            for token in tokens:
+                counts[token] = counts.get(token, 0) + 1
+        vocab: Dict[str, int] = {}
+        for token, count in counts.items():
+            if count > 1:
+                vocab[token] = len(vocab)
+        if not vocab:
+            return []
+
+        matrix = np.zeros((len(token_sets), len(vocab)), dtype=np.float32)
+        for row, tokens in enumerate(token_sets):
+            columns = [vocab[t] for t in tokens if t in vocab]
+            if columns:
+                matrix[row, columns] = 1.0
+        sizes = np.array([len(tokens) for tokens in token_sets], dtype=np.float64)
+
+        pairs = []
+        for start in range(0, len(token_sets), self.block_size):
+            block = matrix[start:start + self.block_size]
+            overlap = (block @ matrix.T).astype(np.float64)
+            union = sizes[start:start + len(block), None] + sizes[None, :] - overlap
+            with np.errstate(divide='ignore', invalid='ignore'):
+                similarity = np.where(union > 0, overlap / union, 0.0)
+            rows, cols = np.nonzero(similarity > self.threshold)
+            for row, col in zip(rows.tolist(), cols.tolist()):
+                i = start + row
+                if i < col:
+                    pairs.append((i, col, float(similarity[row, col])))
+        return pairs
+
+    def _prefix_filtered_pairs(self, token_sets: List[frozenset]) -> List[Tuple[int, int, float]]:
+        frequency: Dict[str, int] = {}
+        for tokens in token_sets:
+            for token in tokens:
+                frequency[token] = frequency.get(token, 0) + 1
+
+        postings: Dict[str, List[int]] = {}
+        pairs = []
+        for i, tokens in enumerate(token_sets):
+            size = len(tokens)
+            if not size:
+                continue
+            ordered = sorted(tokens, key=lambda t: (frequency[t], t))
+            prefix = ordered[:size - math.ceil(self.threshold * size - 1e-9) + 1]
+
+            candidates = set()
+            for token in prefix:
+                candidates.update(postings.get(token, ()))
+                postings.setdefault(token, []).append(i)
+
+            for j in candidates:
+                other = token_sets[j]
+                overlap = len(tokens & other)
+                similarity = overlap / (size + len(other) - overlap)
+                if similarity > self.threshold:
+                    pairs.append((j, i, similarity))
+        return pairs
+
 class BatchProcessor:
     """Intelligent batch processing system for AI requests"""
 
-    def __init__(self, project_root: Path, max_batch_size: int = 5, max_wait_time: int = 30):
+    DEFAULT_MODEL = 'claude-3-haiku'
+
+    def __init__(self, project_root: Path, max_batch_size: int = 5, max_wait_time: int = 30,
+                 max_concurrency: int = 4, model_limits: Optional[Dict[str, int]] = None,
+                 fair_queuing: bool = False, agent_weights: Optional[Dict[str, float]] = None,
+                 journal_fsync: bool = False, compact_every: int = 1000):
         self.project_root = project_root
         self.max_batch_size = max_batch_size
         self.max_wait_time = max_wait_time  # seconds
-
-        # Thread safety
-        self.lock = threading.Lock()
+        self.clusterer = SimilarityClusterer(threshold=0.6)
+
+        # Dispatch: up to max_concurrency groups run at once, and at most
+        # model_limits[model] of them against the same model. Groups of a
+        # model at its limit wait in _model_backlog without taking a worker.
+        self.max_concurrency = max_concurrency
+        self.model_limits = dict(model_limits or {})
+        self._dispatch_slots = threading.BoundedSemaphore(max_concurrency)
+        self._model_active: Dict[str, int] = {}
+        self._model_backlog: Dict[str, deque] = {}
+        self.executor: Optional[ThreadPoolExecutor] = None
+
+        # Thread safety (re-entrant: helpers such as _enqueue run under it).
+        # Lock order is always _journal_lock, then lock.
+        self.lock = threading.RLock()
+
+        # Persistence: batch-state.json is a snapshot, batch-journal.jsonl an
+        # append-only log of submit/dispatch/complete events since that
+        # snapshot. The journal is folded into a new snapshot every
+        # compact_every events.
+        self.state_file = project_root / '.ai' / 'cache' / 'batch-state.json'
+        self.journal_file = project_root / '.ai' / 'cache' / 'batch-journal.jsonl'
+        self.journal_fsync = journal_fsync
+        self.compact_every = compact_every
+        self._journal_lock = threading.Lock()
+        self._journal = None
+        self._journal_events = 0
+        self._generation = 0
 
         # Queues and storage
-        self.request_queue: Queue = Queue()
+        self.request_queue = PriorityScheduler(max_wait_time, fair_queuing=fair_queuing,
+                                               agent_weights=agent_weights)
         self.batch_groups: Dict[str, BatchGroup] = {}
         self.processing_results: Dict[str, BatchResult] = {}
 
+        # request id -> current state ('queued' / 'collecting' / 'batching' /
+        # 'completed'), updated at every transition so status lookups are O(1)
+        self.request_index: Dict[str, Dict[str, Any]] = {}
+
         # Processing control
         self.is_running = False
         self.processing_thread: Optional[threading.Thread] = None
@@ -77,101 +410,182 @@ class BatchProcessor:
         self._load_state()
 
     def _load_state(self):
-        """Load batch processing state from disk"""
-        state_file = self.project_root / '.ai' / 'cache' / 'batch-state.json'
-        if state_file.exists():
+        """Load batch processing state: the last snapshot plus the journal since"""
+        pending: Dict[str, Dict[str, Any]] = {}
+        groups: Dict[str, Dict[str, Any]] = {}
+        generation = 0
+
+        if self.state_file.exists():
             try:
-                with open(state_file, 'r') as f:
+                with open(self.state_file, 'r') as f:
                     data = json.load(f)
+                pending = {r['id']: r for r in data.get('pending_requests', [])}
+                groups = {g['id']: g for g in data.get('batch_groups', [])}
+                generation = data.get('journal_generation', 0)
+            except Exception as e:
+                print(f"Warning: Could not load batch state: {e}", file=sys.stderr)
 
-                # Restore pending requests
-                with self.lock:
-                    for request_data in data.get('pending_requests', []):
-                        request_data['submitted_at'] = datetime.fromisoformat(request_data['submitted_at'])
-                        request = BatchRequest(**request_data)
-                        self.request_queue.put(request)
+        replayed = 0
+        if self.journal_file.exists():
+            try:
+                replayed = self._replay_journal(generation, pending, groups)
+            except Exception as e:
+                print(f"Warning: Could not replay batch journal: {e}", file=sys.stderr)
 
-                # Restore batch groups
-                with self.lock:
-                    for group_data in data.get('batch_groups', []):
-                        group_data['created_at'] = datetime.fromisoformat(group_data['created_at'])
-                        # Convert request dicts back to BatchRequest objects
-                        requests = []
-                        for req_data in group_data['requests']:
-                            req_data['submitted_at'] = datetime.fromisoformat(req_data['submitted_at'])
-                            requests.append(BatchRequest(**req_data))
-                        group_data['requests'] = requests
-                        group = BatchGroup(**group_data)
-                        self.batch_groups[group.id] = group
+        with self.lock:
+            for request_data in pending.values():
+                self._enqueue(self._request_from_dict(request_data))
+            for group_data in groups.values():
+                self._register_group(self._group_from_dict(group_data))
 
-            except Exception as e:
-                print(f"Warning: Could not load batch state: {e}", file=sys.stderr)
+        self._generation = generation
+        if replayed >= self.compact_every:
+            self._save_state()
+
+    def _replay_journal(self, generation: int, pending: Dict[str, Dict[str, Any]],
+                        groups: Dict[str, Dict[str, Any]]) -> int:
+        """Apply journal events on top of the snapshot; returns how many were applied
+
+        A journal from an older generation was already folded into the
+        snapshot and is ignored. Replay stops at a torn line (unparseable or
+        missing its newline), and the file is cut back to the last intact
+        line so later appends do not run on from the torn one.
+        """
+        seen = set(pending)
+        for group in groups.values():
+            seen.update(r['id'] for r in group['requests'])
+
+        applied = 0
+        with open(self.journal_file, 'rb') as f:
+            header = json.loads(f.readline() or '{}')
+            if header.get('generation', 0) != generation:
+                return 0
+            intact_end = f.tell()
+            for line in f:
+                if not line.endswith(b'\n'):
+                    break
+                try:
+                    event = json.loads(line)
+                except ValueError:
+                    break
+                kind = event.get('event')
+                if kind == 'submit':
+                    request_data = event['request']
+                    if request_data['id'] not in seen:
+                        pending[request_data['id']] = request_data
+                        seen.add(request_data['id'])
+                elif kind == 'dispatch':
+                    for group_data in event['groups']:
+                        for request_data in group_data['requests']:
+                            pending.pop(request_data['id'], None)
+                            seen.add(request_data['id'])
+                        groups[group_data['id']] = group_data
+                elif kind == 'complete':
+                    groups.pop(event['batch_id'], None)
+                applied += 1
+                intact_end += len(line)
+
+        torn = self.journal_file.stat().st_size - intact_end
+        if torn:
+            print(f"Warning: Discarding {torn} bytes of torn batch journal", file=sys.stderr)
+            os.truncate(self.journal_file, intact_end)
+        return applied
+
+    def _append_journal(self, event: Dict[str, Any]):
+        """Append one event (caller holds _journal_lock)"""
+        if self._journal is None:
+            self.journal_file.parent.mkdir(parents=True, exist_ok=True)
+            if self._journal_generation_on_disk() != self._generation:
+                self._reset_journal()
+            self._journal = open(self.journal_file, 'a')
+        self._journal.write(json.dumps(event) + '\n')
+        self._journal.flush()
+        if self.journal_fsync:
+            os.fsync(self._journal.fileno())
+        self._journal_events += 1
+
+    def _journal_generation_on_disk(self) -> Optional[int]:
+        try:
+            with open(self.journal_file, 'r') as f:
+                return json.loads(f.readline()).get('generation')
+        except (OSError, ValueError):
+            return None
+
+    def _reset_journal(self):
+        """Start an empty journal for the current generation"""
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
+        tmp_file = self.journal_file.with_name(self.journal_file.name + '.tmp')
+        with open(tmp_file, 'w') as f:
+            f.write(json.dumps({'journal': 1, 'generation': self._generation}) + '\n')
+        tmp_file.replace(self.journal_file)
+        self._journal_events = 0
 
     def _save_state(self):
-        """Save batch processing state to disk"""
-        state_file = self.project_root / '.ai' / 'cache' / 'batch-state.json'
-        state_file.parent.mkdir(parents=True, exist_ok=True)
+        """Compact: write a snapshot of the current state, then start a new journal
 
-        with self.lock:
-            try:
-                # Convert objects to serializable format
-                pending_requests = []
-                while not self.request_queue.empty():
-                    try:
-                        request = self.request_queue.get_nowait()
-                        request_data = {
-                            'id': request.id,
-                            'prompt': request.prompt,
-                            'context': request.context,
-                            'priority': request.priority,
-                            'max_tokens': request.max_tokens,
-                            'temperature': request.temperature,
-                            'submitted_at': request.submitted_at.isoformat(),
-                            'metadata': request.metadata
-                        }
-                        pending_requests.append(request_data)
-                    except Empty:
-                        break
-
-                # Put requests back in queue
-                for req in pending_requests:
-                    req['submitted_at'] = datetime.fromisoformat(req['submitted_at'])
-                    self.request_queue.put(BatchRequest(**req))
-
-                batch_groups = []
-                for group in self.batch_groups.values():
-                    group_data = {
-                        'id': group.id,
-                        'requests': [{
-                            'id': r.id,
-                            'prompt': r.prompt,
-                            'context': r.context,
-                            'priority': r.priority,
-                            'max_tokens': r.max_tokens,
-                            'temperature': r.temperature,
-                            'submitted_at': r.submitted_at.isoformat(),
-                            'metadata': r.metadata
-                        } for r in group.requests],
-                        'common_prompt': group.common_prompt,
-                        'combined_context': group.combined_context,
-                        'estimated_tokens': group.estimated_tokens,
-                        'priority': group.priority,
-                        'created_at': group.created_at.isoformat()
-                    }
-                    batch_groups.append(group_data)
+        The snapshot carries the next generation number, so a crash between
+        the two steps leaves an old journal that replay knows to skip.
+        """
+        self.state_file.parent.mkdir(parents=True, exist_ok=True)
 
+        with self._journal_lock, self.lock:
+            try:
                 state = {
-                    'pending_requests': pending_requests,
-                    'batch_groups': batch_groups,
+                    # Read the queue without draining it (draining would skew wait times)
+                    'pending_requests': [self._request_to_dict(r) for r in self.request_queue.snapshot()],
+                    'batch_groups': [self._group_to_dict(g) for g in self.batch_groups.values()],
+                    'journal_generation': self._generation + 1,
                     'saved_at': datetime.now().isoformat()
                 }
 
-                with open(state_file, 'w') as f:
+                tmp_file = self.state_file.with_name(self.state_file.name + '.tmp')
+                with open(tmp_file, 'w') as f:
                     json.dump(state, f, indent=2)
+                tmp_file.replace(self.state_file)
+
+                self._generation += 1
+                self._reset_journal()
 
             except Exception as e:
                 print(f"Error saving batch state: {e}", file=sys.stderr)
 
+    @staticmethod
+    def _request_to_dict(request: BatchRequest) -> Dict[str, Any]:
+        return {
+            'id': request.id,
+            'prompt': request.prompt,
+            'context': request.context,
+            'priority': request.priority,
+            'max_tokens': request.max_tokens,
+            'temperature': request.temperature,
+            'submitted_at': request.submitted_at.isoformat(),
+            'metadata': request.metadata
+        }
+
+    @staticmethod
+    def _request_from_dict(data: Dict[str, Any]) -> BatchRequest:
+        return BatchRequest(**{**data, 'submitted_at': datetime.fromisoformat(data['submitted_at'])})
+
+    def _group_to_dict(self, group: BatchGroup) -> Dict[str, Any]:
+        return {
+            'id': group.id,
+            'requests': [self._request_to_dict(r) for r in group.requests],
+            'common_prompt': group.common_prompt,
+            'combined_context': group.combined_context,
+            'estimated_tokens': group.estimated_tokens,
+            'priority': group.priority,
+            'created_at': group.created_at.isoformat()
+        }
+
+    def _group_from_dict(self, data: Dict[str, Any]) -> BatchGroup:
+        return BatchGroup(**{
+            **data,
+            'requests': [self._request_from_dict(r) for r in data['requests']],
+            'created_at': datetime.fromisoformat(data['created_at'])
+        })
+
     def submit_request(self, prompt: str, context: Optional[str] = None,
                       priority: int = 1, max_tokens: int = 1000,
                       temperature: float = 0.7, metadata: Optional[Dict[str, Any]] = None) -> str:
@@ -180,7 +594,7 @@ class BatchProcessor:
 
         Returns request ID
         """
-        request_id = f"req_{int(time.time() * 1000)}_{hash(prompt) % 10000:04d}"
+        request_id = f"req_{int(time.time() * 1000)}_{hash(prompt) % 10000:04d}{uuid.uuid4().hex[:4]}"
 
         request = BatchRequest(
             id=request_id,
@@ -192,113 +606,106 @@ class BatchProcessor:
             metadata=metadata or {}
         )
 
-        with self.lock:
-            self.request_queue.put(request)
-            self._save_state()
+        # One journal append; nothing proportional to the backlog
+        with self._journal_lock:
+            self._append_journal({'event': 'submit', 'request': self._request_to_dict(request)})
+            with self.lock:
+                self._enqueue(request)
 
         return request_id
 
+    def _enqueue(self, request: BatchRequest):
+        """Queue a request and index it (caller holds the lock)"""
+        ticket = self.request_queue.put(request)
+        self.request_index[request.id] = {'status': 'queued', 'request': request, 'ticket': ticket}
+
+    def _register_group(self, group: BatchGroup):
+        """Track a group and move its requests to 'batching' (caller holds the lock)"""
+        self.batch_groups[group.id] = group
+        for request in group.requests:
+            self.request_index[request.id] = {'status': 'batching', 'request': request, 'group': group}
+
     def get_request_status(self, request_id: str) -> Dict[str, Any]:
         """Get the status of a submitted request"""
-        # Check if request is still in queue
-        queue_requests = []
-        found_request = None
-
-        while not self.request_queue.empty():
-            try:
-                req = self.request_queue.get_nowait()
-                if req.id == request_id:
-                    found_request = req
-                else:
-                    queue_requests.append(req)
-            except Empty:
-                break
-
-        # Put requests back
-        for req in queue_requests:
-            self.request_queue.put(req)
-        if found_request:
-            self.request_queue.put(found_request)
-
-        if found_request:
-            return {
-                'status': 'queued',
-                'position': len(queue_requests),
-                'submitted_at': found_request.submitted_at.isoformat(),
-                'priority': found_request.priority
-            }
+        with self.lock:
+            entry = self.request_index.get(request_id)
+            if entry is None:
+                return {'status': 'not_found'}
+            request = entry['request']
 
-        # Check if request is in a batch group
-        for group in self.batch_groups.values():
-            for request in group.requests:
-                if request.id == request_id:
-                    return {
-                        'status': 'batching',
-                        'batch_id': group.id,
-                        'batch_size': len(group.requests),
-                        'submitted_at': request.submitted_at.isoformat()
-                    }
-
-        # Check if request has been processed
-        for result in self.processing_results.values():
-            if request_id in result.request_results:
-                req_result = result.request_results[request_id]
+            if entry['status'] == 'queued':
                 return {
-                    'status': 'completed',
-                    'batch_id': result.batch_id,
-                    'completed_at': result.completed_at.isoformat() if result.completed_at else None,
-                    'tokens_used': req_result.get('tokens_used', 0),
-                    'cost': req_result.get('cost', 0.0),
-                    'response': req_result.get('response', '')
+                    'status': 'queued',
+                    'submitted_ahead': self.request_queue.submitted_ahead(entry['ticket']),
+                    'submitted_at': request.submitted_at.isoformat(),
+                    'priority': request.priority
                 }
 
-        return {'status': 'not_found'}
-
-    def _calculate_similarity(self, prompt1: str, prompt2: str) -> float:
-        """Calculate similarity between two prompts"""
-        words1 = set(prompt1.lower().split())
-        words2 = set(prompt2.lower().split())
+            if entry['status'] == 'collecting':
+                return {
+                    'status': 'collecting',
+                    'submitted_at': request.submitted_at.isoformat(),
+                    'priority': request.priority
+                }
 
-        if not words1 or not words2:
-            return 0.0
+            if entry['status'] == 'batching':
+                group = entry['group']
+                return {
+                    'status': 'batching',
+                    'batch_id': group.id,
+                    'batch_size': len(group.requests),
+                    'submitted_at': request.submitted_at.isoformat()
+                }
 
-        intersection = words1.intersection(words2)
-        union = words1.union(words2)
+            result = entry['result']
+            req_result = result.request_results[request_id]
+            return {
+                'status': 'completed',
+                'batch_id': result.batch_id,
+                'completed_at': result.completed_at.isoformat() if result.completed_at else None,
+                'tokens_used': req_result.get('tokens_used', 0),
+                'cost': req_result.get('cost', 0.0),
+                'response': req_result.get('response', '')
+            }
 
-        return len(intersection) / len(union)
+    def _request_model(self, request: BatchRequest) -> str:
+        return request.metadata.get('model') or self.DEFAULT_MODEL
 
     def _group_similar_requests(self, requests: List[BatchRequest]) -> List[BatchGroup]:
-        """Group similar requests for batch processing"""
+        """Group similar requests for batch processing (never mixing models)
+
+        Greedy: each still-ungrouped request seeds a group and takes its
+        ungrouped neighbours above the threshold, in submission order, until
+        the batch is full.
+        """
         groups = []
         processed = set()
+        neighbors = self.clusterer.neighbors([self.clusterer.tokenize(r.prompt) for r in requests])
 
         for i, request in enumerate(requests):
-            if request.id in processed:
+            if i in processed:
                 continue
 
             group = BatchGroup(
-                id=f"batch_{int(time.time() * 1000)}_{i}",
+                id=f"batch_{int(time.time() * 1000)}_{i}_{uuid.uuid4().hex[:6]}",
                 requests=[request],
                 priority=request.priority
             )
-            processed.add(request.id)
+            processed.add(i)
 
             # Find similar requests
-            for j, other_request in enumerate(requests):
-                if other_request.id in processed:
+            for _similarity, j in neighbors[i]:
+                if len(group.requests) >= self.max_batch_size:
+                    break
+                other_request = requests[j]
+                if j in processed or self._request_model(other_request) != self._request_model(request):
                     continue
 
-                similarity = self._calculate_similarity(request.prompt, other_request.prompt)
-                if similarity > 0.6:  # Similarity threshold
-                    group.requests.append(other_request)
-                    processed.add(other_request.id)
-
-                    # Update group priority to highest in group
-                    group.priority = max(group.priority, other_request.priority)
+                group.requests.append(other_request)
+                processed.add(j)
 
-                    # Stop if batch is full
-                    if len(group.requests) >= self.max_batch_size:
-                        break
+                # Update group priority to highest in group
+                group.priority = max(group.priority, other_request.priority)
 
             # Create combined prompt and context
             if len(group.requests) > 1:
@@ -351,7 +758,7 @@ class BatchProcessor:
                 'response': response,
                 'tokens_used': tokens_used,
                 'cost': cost,
-                'model': 'claude-3-haiku',  # Mock model
+                'model': self._request_model(request),
                 'processing_time': time.time() - start_time
             }
 
@@ -365,56 +772,142 @@ class BatchProcessor:
 
         return result
 
+    def _group_model(self, group: BatchGroup) -> str:
+        return self._request_model(group.requests[0])
+
+    def _dispatch(self, group: BatchGroup):
+        """Hand a group to the worker pool, or park it if its model is at its limit
+
+        The model check comes first, so a group that could not run yet never
+        occupies a worker; a parked group is picked up by the worker that
+        frees its model's slot. Blocks while max_concurrency groups are in
+        flight, so a saturated pool leaves further requests waiting in
+        request_queue (backpressure).
+        """
+        model = self._group_model(group)
+        with self.lock:
+            limit = max(1, self.model_limits.get(model, self.max_concurrency))
+            if self._model_active.get(model, 0) >= limit:
+                self._model_backlog.setdefault(model, deque()).append(group)
+                return
+            self._model_active[model] = self._model_active.get(model, 0) + 1
+
+        self._dispatch_slots.acquire()
+        try:
+            self.executor.submit(self._run_groups, group)
+        except Exception:
+            self._dispatch_slots.release()
+            with self.lock:
+                self._model_active[model] -= 1
+            raise
+
+    def _next_for_model(self, model: str) -> Optional[BatchGroup]:
+        """The model's next parked group, keeping its slot; else free the slot"""
+        with self.lock:
+            backlog = self._model_backlog.get(model)
+            if backlog:
+                return backlog.popleft()
+            self._model_active[model] -= 1
+            return None
+
+    def _run_groups(self, group: BatchGroup):
+        """Worker: run the group, then any groups parked for the same model"""
+        model = self._group_model(group)
+        try:
+            while group is not None:
+                self._run_group(group)
+                group = self._next_for_model(model)
+        finally:
+            self._dispatch_slots.release()
+
+    def _run_group(self, group: BatchGroup):
+        """Process one group and record its result (its model slot is already held)"""
+        try:
+            result = self._process_batch(group)
+
+            with self._journal_lock:
+                self._append_journal({'event': 'complete', 'batch_id': group.id,
+                                      'request_ids': [r.id for r in group.requests]})
+                with self.lock:
+                    self.processing_results[result.batch_id] = result
+                    for request in group.requests:
+                        self.request_index[request.id] = {'status': 'completed', 'request': request, 'result': result}
+
+                    # Notify batch complete
+                    if self.on_batch_complete:
+                        self.on_batch_complete(result)
+
+                    # Clean up
+                    del self.batch_groups[group.id]
+        except Exception as e:
+            print(f"Error processing batch {group.id}: {e}", file=sys.stderr)
+
     def _processing_loop(self):
-        """Main processing loop"""
+        """Main processing loop: collect requests, group them, dispatch every group"""
+        # Flush as soon as one batch is full; concurrency comes from the next
+        # collection overlapping the groups still running
+        collect_limit = self.max_batch_size
+
+        # Groups recovered from the journal were dispatched before a restart
+        with self.lock:
+            recovered = list(self.batch_groups.values())
+        for group in sorted(recovered, key=lambda g: -g.priority):
+            self._dispatch(group)
+
         while self.is_running:
             try:
-                # Collect pending requests
+                # Collect pending requests until the earliest deadline among them
                 pending_requests = []
-                batch_start_time = time.time()
+                flush_at = math.inf
 
-                while len(pending_requests) < self.max_batch_size:
+                while len(pending_requests) < collect_limit and self.is_running:
                     try:
                         # Wait for requests with timeout
+                        request = self.request_queue.get(timeout=max(0.0, min(1.0, flush_at - time.time())))
                         with self.lock:
-                            request = self.request_queue.get(timeout=1.0)
+                            # Out of the scheduler: drop its ticket, which a rebase may reuse
+                            self.request_index[request.id] = {'status': 'collecting', 'request': request}
                         pending_requests.append(request)
+                        flush_at = min(flush_at, self.request_queue.deadline(request))
 
                         # Check if we've waited too long or have enough requests
-                        if (time.time() - batch_start_time > self.max_wait_time or
-                            len(pending_requests) >= self.max_batch_size):
+                        if time.time() >= flush_at or len(pending_requests) >= collect_limit:
                             break
 
                     except Empty:
                         # No more requests, check if we should process what we have
-                        if pending_requests and time.time() - batch_start_time > self.max_wait_time:
+                        if pending_requests and time.time() >= flush_at:
                             break
                         continue
 
+                if pending_requests and not self.is_running:
+                    # Stopping: leave them queued (their submit events are journaled)
+                    with self.lock:
+                        for request in pending_requests:
+                            self._enqueue(request)
+                    break
+
                 if pending_requests:
                     # Group similar requests
                     batch_groups = self._group_similar_requests(pending_requests)
 
-                    with self.lock:
-                        for group in batch_groups:
-                            self.batch_groups[group.id] = group
-
-                            # Notify batch ready
-                            if self.on_batch_ready:
-                                self.on_batch_ready(group)
-
-                        # Process batch
-                        result = self._process_batch(group)
-                        self.processing_results[result.batch_id] = result
+                    with self._journal_lock:
+                        self._append_journal({'event': 'dispatch',
+                                              'groups': [self._group_to_dict(g) for g in batch_groups]})
+                        with self.lock:
+                            for group in batch_groups:
+                                self._register_group(group)
 
-                        # Notify batch complete
-                        if self.on_batch_complete:
-                            self.on_batch_complete(result)
+                                # Notify batch ready
+                                if self.on_batch_ready:
+                                    self.on_batch_ready(group)
 
-                        # Clean up
-                        del self.batch_groups[group.id]
+                    # Highest priority first when the pool is saturated
+                    for group in sorted(batch_groups, key=lambda g: -g.priority):
+                        self._dispatch(group)
 
-                    self._save_state()
+                    if self._journal_events >= self.compact_every:
+                        self._save_state()
 
             except Exception as e:
                 print(f"Error in processing loop: {e}", file=sys.stderr)
@@ -426,6 +919,8 @@ class BatchProcessor:
             return
 
         self.is_running = True
+        self.executor = ThreadPoolExecutor(max_workers=self.max_concurrency,
+                                           thread_name_prefix='batch-worker')
         self.processing_thread = threading.Thread(target=self._processing_loop, daemon=True)
         self.processing_thread.start()
         print("✅ Batch processing system started")
@@ -435,6 +930,10 @@ class BatchProcessor:
         self.is_running = False
         if self.processing_thread:
             self.processing_thread.join(timeout=5.0)
+        if self.executor:
+            # Let dispatched groups finish so their results are recorded
+            self.executor.shutdown(wait=True)
+            self.executor = None
         self._save_state()
         print("🛑 Batch processing system stopped")
 
@@ -454,12 +953,14 @@ class BatchProcessor:
             'is_running': self.is_running,
             'queued_requests': self.request_queue.qsize(),
             'active_batches': len(self.batch_groups),
+            'max_concurrency': self.max_concurrency,
             'completed_batches': completed_batches,
             'total_requests_processed': sum(len(result.request_results) for result in self.processing_results.values()),
             'total_tokens_processed': total_tokens,
             'total_cost_saved': total_cost * 0.3,  # Estimate 30% savings from batching
             'avg_processing_time': round(avg_processing_time, 2),
-            'avg_batch_size': round(total_requests / completed_batches, 1) if completed_batches > 0 else 0
+            'avg_batch_size': round(total_requests / completed_batches, 1) if completed_batches > 0 else 0,
+            'queue_latency': self.request_queue.latency_stats()
         }
 
 def main():
@@ -468,16 +969,45 @@ def main():
                        help='Command to execute')
     parser.add_argument('--request-id', help='Request ID for status check')
     parser.add_argument('--prompt', help='Prompt for request submission')
-    parser.add_argument('--priority', type=int, default=1, choices=[1, 2, 3],
-                       help='Request priority (1=low, 2=medium, 3=high)')
+    parser.add_argument('--priority', type=int, default=1, choices=[1, 2, 3, 4, 5],
+                       help='Request priority (1=low ... 5=interactive)')
     parser.add_argument('--max-tokens', type=int, default=1000,
                        help='Maximum tokens for the request')
+    parser.add_argument('--model', help='Model to run the request on (default: claude-3-haiku)')
+    parser.add_argument('--concurrency', type=int, default=4,
+                       help='Maximum number of batches processed at once')
+    parser.add_argument('--model-limit', action='append', default=[], metavar='MODEL=N',
+                       help='Maximum concurrent batches for one model (repeatable)')
+    parser.add_argument('--fsync', action='store_true',
+                       help='fsync the batch journal after every append')
+    parser.add_argument('--agent', help='Submitting agent, used for fair queuing')
+    parser.add_argument('--fair-queuing', action='store_true',
+                       help='Share dispatch fairly between submitting agents')
+    parser.add_argument('--agent-weight', action='append', default=[], metavar='AGENT=W',
+                       help='Fair-queuing weight of one agent (repeatable, default 1)')
 
     args = parser.parse_args()
 
     # Initialize processor
     project_root = Path(__file__).parent.parent
-    processor = BatchProcessor(project_root)
+    model_limits = {}
+    for item in args.model_limit:
+        model, _, limit = item.partition('=')
+        if not limit.isdigit():
+            print(f"Error: --model-limit expects MODEL=N, got {item}")
+            sys.exit(1)
+        model_limits[model] = int(limit)
+    agent_weights = {}
+    for item in args.agent_weight:
+        agent, _, weight = item.partition('=')
+        try:
+            agent_weights[agent] = float(weight)
+        except ValueError:
+            print(f"Error: --agent-weight expects AGENT=W, got {item}")
+            sys.exit(1)
+    processor = BatchProcessor(project_root, max_concurrency=args.concurrency, model_limits=model_limits,
+                               fair_queuing=args.fair_queuing, agent_weights=agent_weights,
+                               journal_fsync=args.fsync)
 
     if args.command == 'submit':
         if not args.prompt:
@@ -487,7 +1017,9 @@ def main():
         request_id = processor.submit_request(
             prompt=args.prompt,
             priority=args.priority,
-            max_tokens=args.max_tokens
+            max_tokens=args.max_tokens,
+            metadata={name: value for name, value in (('model', args.model), ('agent', args.agent))
+                      if value is not None}
         )
         print(f"✅ Request submitted with ID: {request_id}")
 
@@ -499,7 +1031,9 @@ def main():
         status = processor.get_request_status(args.request_id)
         print(f"📊 Request Status: {status['status']}")
         if status['status'] == 'queued':
-            print(f"Queue position: {status['position']}")
+            print(f"Submitted ahead of it: {status['submitted_ahead']} (served by priority, not strictly in order)")
+        elif status['status'] == 'collecting':
+            print("Waiting to be grouped into the next batch")
         elif status['status'] == 'batching':
             print(f"Batch ID: {status['batch_id']}")
             print(f"Batch size: {status['batch_size']}")
@@ -522,6 +1056,9 @@ def main():
         print(f"Estimated Cost Saved: ${stats['total_cost_saved']:.4f}")
         print(f"Average Processing Time: {stats['avg_processing_time']}s")
         print(f"Average Batch Size: {stats['avg_batch_size']}")
+        for priority, latency in stats['queue_latency'].items():
+            print(f"Queue Wait (priority {priority}): p50 {latency['p50_ms']} ms, "
+                  f"p99 {latency['p99_ms']} ms over {latency['count']} requests")
 
     elif args.command == 'start':
         processor.start_processing()
@@ -0,0 +1,406 @@
+#!/usr/bin/env python3
+"""
+AI Cache Benchmark Suite
+Measures ai-cache.py at realistic scale on synthetic prompt corpora
+Tracks cold load, lookup latency, store throughput, cleanup cost and memory
+"""
+
+import json
+import sys
+import os
+import time
+import random
+import platform
+import resource
+import subprocess
+import tempfile
+from pathlib import Path
+from typing import Dict, List, Optional, Any, Tuple
+from datetime import datetime
+import argparse
+
+from ai_common import load_script, percentile
+
+DEFAULT_SIZES = (1_000, 10_000, 100_000)
+
+# Direction of each metric: +1 when higher is better, -1 when lower is better
+METRIC_DIRECTIONS = {
+    'cold_load_s': -1,
+    'store_bulk_per_s': 1,
+    'store_single_per_s': 1,
+    'hit_p50_ms': -1,
+    'hit_p95_ms': -1,
+    'hit_p99_ms': -1,
+    'miss_p50_ms': -1,
+    'miss_p95_ms': -1,
+    'miss_p99_ms': -1,
+    'cleanup_ms': -1,
+    'peak_rss_mb': -1,
+}
+
+# Smallest change that counts as a regression when the baseline value is zero
+# (a relative change from zero is undefined)
+ZERO_BASELINE_TOLERANCE = {
+    'cold_load_s': 0.01,
+    'store_bulk_per_s': 1.0,
+    'store_single_per_s': 1.0,
+    'hit_p50_ms': 0.01,
+    'hit_p95_ms': 0.01,
+    'hit_p99_ms': 0.01,
+    'miss_p50_ms': 0.01,
+    'miss_p95_ms': 0.01,
+    'miss_p99_ms': 0.01,
+    'cleanup_ms': 0.1,
+    'peak_rss_mb': 1.0,
+}
+
+# Share of the cache the timed cleanup has to evict, so it measures real work
+CLEANUP_EVICT_RATIO = 0.1
+
+# Word stems the synthetic prompts are built from (roughly a developer-chat vocabulary)
+STEMS = (
+    'add', 'api', 'async', 'auth', 'build', 'cache', 'catalog', 'check', 'class', 'client',
+    'config', 'context', 'controller', 'cors', 'css', 'data', 'debug', 'deploy', 'docker', 'dto',
+    'entity', 'error', 'event', 'fix', 'form', 'handler', 'header', 'index', 'query', 'layout',
+    'login', 'mapper', 'middleware', 'migration', 'model', 'module', 'order', 'page', 'payment',
+    'price', 'product', 'refactor', 'render', 'repository', 'request', 'route', 'schema', 'search',
+    'service', 'session', 'store', 'tenant', 'test', 'token', 'type', 'update', 'user', 'validate',
+    'view', 'vue', 'wolverine', 'write',
+)
+SUFFIXES = ('', 's', 'ed', 'ing', 'er', 'able', 'ion', 'ly')
+FILLERS = ('the', 'a', 'for', 'with', 'in', 'when', 'after', 'using', 'from', 'on')
+
+class CorpusGenerator:
+    """Deterministic synthetic prompts with controllable duplicates and paraphrases
+
+    Stored prompts are 10-16 words drawn from a fixed vocabulary. The query
+    stream mixes exact repeats of stored prompts (duplicate_ratio), reworded
+    stored prompts that only the similarity tier can answer (paraphrase_ratio),
+    and prompts that were never stored.
+    """
+
+    def __init__(self, seed: int = 42):
+        self.rng = random.Random(seed)
+        self.vocabulary = [stem + suffix for stem in STEMS for suffix in SUFFIXES]
+
+    def prompt(self) -> str:
+        words = self.rng.choices(self.vocabulary, k=self.rng.randint(10, 16))
+        # Sprinkle in stop words so paraphrasing has something to reorder
+        for _ in range(3):
+            words.insert(self.rng.randrange(len(words)), self.rng.choice(FILLERS))
+        return ' '.join(words)
+
+    def paraphrase(self, prompt: str) -> str:
+        """Reorder a stored prompt and drop one word (Jaccard stays near 0.9)"""
+        words = prompt.split()
+        del words[self.rng.randrange(len(words))]
+        i = self.rng.randrange(len(words) - 1)
+        words[i], words[i + 1] = words[i + 1], words[i]
+        return ' '.join(words).capitalize()
+
+    def records(self, count: int) -> List[Dict[str, Any]]:
+        """Entries ready for AICache.store_many"""
+        records = []
+        for i in range(count):
+            tokens = self.rng.randint(200, 4000)
+            records.append({
+                'prompt': self.prompt(),
+                'response': f"Response {i}: " + ' '.join(self.rng.choices(self.vocabulary, k=self.rng.randint(20, 120))),
+                'model': self.rng.choice(('gpt-4', 'gpt-4o-mini', 'claude-3-sonnet')),
+                'tokens_used': tokens,
+                'cost': round(tokens * 0.00003, 6),
+                'quality_score': round(self.rng.uniform(0.5, 1.0), 3),
+            })
+        return records
+
+    def queries(self, stored: List[str], count: int, duplicate_ratio: float,
+                paraphrase_ratio: float) -> List[Tuple[str, str]]:
+        """(kind, prompt) pairs where kind is 'duplicate', 'paraphrase' or 'novel'"""
+        queries = []
+        for _ in range(count):
+            roll = self.rng.random()
+            if roll < duplicate_ratio:
+                queries.append(('duplicate', self.rng.choice(stored)))
+            elif roll < duplicate_ratio + paraphrase_ratio:
+                queries.append(('paraphrase', self.paraphrase(self.rng.choice(stored))))
+            else:
+                queries.append(('novel', self.prompt()))
+        return queries
+
+def _peak_rss_mb() -> float:
+    """Peak resident set size of this process (ru_maxrss is KiB on Linux, bytes on macOS)"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+def run_single_size(scripts_dir: Path, size: int, queries: int, backend: str,
+                    duplicate_ratio: float, paraphrase_ratio: float,
+                    similarity_mode: str, seed: int) -> Dict[str, Any]:
+    """Benchmark one corpus size in this process and return its metrics"""
+    ai_cache = load_script('ai-cache.py', scripts_dir)
+    generator = CorpusGenerator(seed)
+    records = generator.records(size)
+    stored_prompts = [record['prompt'] for record in records]
+    single_records = generator.records(min(1000, max(size // 10, 100)))
+    query_stream = generator.queries(stored_prompts, queries, duplicate_ratio, paraphrase_ratio)
+
+    with tempfile.TemporaryDirectory(prefix='ai-cache-bench-') as tmp:
+        root = Path(tmp)
+
+        def open_cache():
+            cache = ai_cache.AICache(root, backend=backend, similarity_mode=similarity_mode)
+            cache.max_cache_size = size + len(single_records)
+            return cache
+
+        # Bulk store: the path migrate/import/batch take. Cleanup is measured
+        # separately, so it is switched off while the corpus is written.
+        cache = open_cache()
+        cache.auto_cleanup_enabled = False
+        start = time.perf_counter()
+        for offset in range(0, size, 1000):
+            cache.store_many(records[offset:offset + 1000])
+        bulk_seconds = time.perf_counter() - start
+
+        # Single stores with cleanup on, as the CLI and daemon do them
+        cache.auto_cleanup_enabled = True
+        start = time.perf_counter()
+        for record in single_records:
+            cache.store_response(**record)
+        single_seconds = time.perf_counter() - start
+        cache.close()
+
+        # Cold load: a fresh process opening an existing cache
+        start = time.perf_counter()
+        cache = open_cache()
+        cold_load = time.perf_counter() - start
+
+        hit_ms: List[float] = []
+        miss_ms: List[float] = []
+        outcomes = {'duplicate': [0, 0], 'paraphrase': [0, 0], 'novel': [0, 0]}
+        for kind, prompt in query_stream:
+            start = time.perf_counter()
+            result = cache.get_cached_response(prompt)
+            elapsed = (time.perf_counter() - start) * 1000
+            (hit_ms if result is not None else miss_ms).append(elapsed)
+            outcomes[kind][result is None] += 1
+
+        # Shrink the limit below the entry count so the cleanup has to evict
+        entries = len(cache.cache)
+        cache.max_cache_size = entries - max(1, int(entries * CLEANUP_EVICT_RATIO))
+        start = time.perf_counter()
+        cache._cleanup_cache()
+        cleanup_ms = (time.perf_counter() - start) * 1000
+        cleanup_evicted = entries - len(cache.cache)
+        cache.close()
+
+    return {
+        'size': size,
+        'queries': queries,
+        'cold_load_s': round(cold_load, 4),
+        'store_bulk_per_s': round(size / bulk_seconds, 1),
+        'store_single_per_s': round(len(single_records) / single_seconds, 1),
+        'hit_p50_ms': round(percentile(hit_ms, 50), 4),
+        'hit_p95_ms': round(percentile(hit_ms, 95), 4),
+        'hit_p99_ms': round(percentile(hit_ms, 99), 4),
+        'miss_p50_ms': round(percentile(miss_ms, 50), 4),
+        'miss_p95_ms': round(percentile(miss_ms, 95), 4),
+        'miss_p99_ms': round(percentile(miss_ms, 99), 4),
+        'cleanup_ms': round(cleanup_ms, 3),
+        'cleanup_evicted': cleanup_evicted,
+        'peak_rss_mb': _peak_rss_mb(),
+        'hit_rate': {kind: round(hits / (hits + misses), 3) if hits + misses else 0.0
+                     for kind, (hits, misses) in outcomes.items()},
+    }
+
+class CacheBenchmark:
+    """Runs every corpus size in its own process and manages result files"""
+
+    def __init__(self, project_root: Path):
+        self.project_root = project_root
+        self.scripts_dir = project_root / 'scripts'
+        self.results_dir = project_root / 'benchmark-results'
+        self.baseline_file = self.results_dir / 'ai-cache-baseline.json'
+
+    def run(self, sizes: List[int], queries: int, backend: str, duplicate_ratio: float,
+            paraphrase_ratio: float, similarity_mode: str, seed: int) -> Dict[str, Any]:
+        """Benchmark each size in a fresh interpreter so peak RSS is per size"""
+        results = []
+        for size in sizes:
+            print(f"📈 Benchmarking {size:,} entries ({backend})...", file=sys.stderr)
+            cmd = [sys.executable, str(Path(__file__).resolve()), 'run-size',
+                   '--size', str(size), '--queries', str(queries), '--backend', backend,
+                   '--duplicate-ratio', str(duplicate_ratio),
+                   '--paraphrase-ratio', str(paraphrase_ratio),
+                   '--similarity-mode', similarity_mode, '--seed', str(seed)]
+            proc = subprocess.run(cmd, capture_output=True, text=True)
+            if proc.returncode != 0:
+                raise RuntimeError(f"Benchmark of {size} entries failed:\n{proc.stderr}")
+            results.append(json.loads(proc.stdout))
+
+        return {
+            'benchmark_suite': 'AI Cache Benchmarks',
+            'timestamp': datetime.now().strftime('%Y%m%d_%H%M%S'),
+            'environment': {
+                'os': platform.system(),
+                'python': platform.python_version(),
+                'machine': platform.machine(),
+                'cpus': os.cpu_count(),
+            },
+            'config': {
+                'backend': backend,
+                'similarity_mode': similarity_mode,
+                'queries': queries,
+                'duplicate_ratio': duplicate_ratio,
+                'paraphrase_ratio': paraphrase_ratio,
+                'seed': seed,
+            },
+            'results': results,
+        }
+
+    def save(self, report: Dict[str, Any], path: Optional[Path] = None) -> Path:
+        self.results_dir.mkdir(parents=True, exist_ok=True)
+        path = path or self.results_dir / f"ai-cache-benchmark_{report['timestamp']}.json"
+        with open(path, 'w') as f:
+            json.dump(report, f, indent=2)
+        return path
+
+    def compare(self, report: Dict[str, Any], baseline: Dict[str, Any],
+                tolerance: float) -> List[Dict[str, Any]]:
+        """Metrics that got worse than the baseline by more than tolerance
+
+        Sizes are matched by entry count; sizes missing from either side are
+        skipped. A zero baseline has no relative change, so it is checked
+        against ZERO_BASELINE_TOLERANCE instead. A config mismatch is reported
+        but does not stop the check.
+        """
+        if report.get('config') != baseline.get('config'):
+            print("⚠️  Benchmark config differs from the baseline; comparison may be misleading",
+                  file=sys.stderr)
+
+        baseline_by_size = {result['size']: result for result in baseline.get('results', [])}
+        regressions = []
+        for result in report['results']:
+            previous = baseline_by_size.get(result['size'])
+            if previous is None:
+                continue
+            for metric, direction in METRIC_DIRECTIONS.items():
+                old, new = previous.get(metric), result.get(metric)
+                if old is None or new is None:
+                    continue
+                if old == 0:
+                    regressed = (new - old) * direction < -ZERO_BASELINE_TOLERANCE[metric]
+                    change_pct = None
+                else:
+                    change = (new - old) / old
+                    regressed = change * direction < -tolerance
+                    change_pct = round(change * 100, 1)
+                if regressed:
+                    regressions.append({
+                        'size': result['size'],
+                        'metric': metric,
+                        'baseline': old,
+                        'current': new,
+                        'change_pct': change_pct,
+                    })
+        return regressions
+
+def print_report(report: Dict[str, Any]):
+    print("🤖 AI Cache Benchmark")
+    print("=" * 40)
+    for result in report['results']:
+        print(f"{result['size']:,} entries:")
+        print(f"  Cold Load: {result['cold_load_s']:.3f} s")
+        print(f"  Store: {result['store_bulk_per_s']:,.0f}/s bulk, {result['store_single_per_s']:,.0f}/s single")
+        print(f"  Hit Latency: p50 {result['hit_p50_ms']:.3f} ms, p95 {result['hit_p95_ms']:.3f} ms, "
+              f"p99 {result['hit_p99_ms']:.3f} ms")
+        print(f"  Miss Latency: p50 {result['miss_p50_ms']:.3f} ms, p95 {result['miss_p95_ms']:.3f} ms, "
+              f"p99 {result['miss_p99_ms']:.3f} ms")
+        print(f"  Cleanup: {result['cleanup_ms']:.1f} ms ({result['cleanup_evicted']:,} evicted)")
+        print(f"  Peak RSS: {result['peak_rss_mb']:.1f} MB")
+        rates = result['hit_rate']
+        print(f"  Hit Rate: {rates['duplicate']:.1%} duplicate, {rates['paraphrase']:.1%} paraphrase, "
+              f"{rates['novel']:.1%} novel")
+
+def print_regressions(regressions: List[Dict[str, Any]], tolerance: float):
+    if not regressions:
+        print(f"✅ No regressions beyond {tolerance:.0%} against the baseline")
+        return
+    print(f"❌ {len(regressions)} regression(s) beyond {tolerance:.0%}:")
+    for item in regressions:
+        change = 'from zero' if item['change_pct'] is None else f"{item['change_pct']:+.1f}%"
+        print(f"  {item['size']:,} entries {item['metric']}: {item['baseline']} → {item['current']} "
+              f"({change})")
+
+def main():
+    parser = argparse.ArgumentParser(description='AI Cache Benchmark Suite')
+    parser.add_argument('command', choices=['run', 'compare', 'run-size'],
+                       help='run: benchmark and save; compare: check a saved result against the baseline')
+    parser.add_argument('--sizes', default=','.join(str(size) for size in DEFAULT_SIZES),
+                       help='Comma-separated corpus sizes (e.g. 1000,10000,100000,1000000)')
+    parser.add_argument('--size', type=int, help=argparse.SUPPRESS)
+    parser.add_argument('--queries', type=int, default=2000, help='Lookups per corpus size')
+    parser.add_argument('--backend', choices=['json', 'sqlite'], default='sqlite',
+                       help='Storage backend to benchmark (default: sqlite)')
+    parser.add_argument('--similarity-mode', choices=['exact', 'lsh'], default='exact',
+                       help='Similarity search mode to benchmark')
+    parser.add_argument('--duplicate-ratio', type=float, default=0.3,
+                       help='Share of lookups that repeat a stored prompt exactly')
+    parser.add_argument('--paraphrase-ratio', type=float, default=0.2,
+                       help='Share of lookups that reword a stored prompt')
+    parser.add_argument('--seed', type=int, default=42, help='Corpus random seed')
+    parser.add_argument('--baseline', help='Baseline file (default: benchmark-results/ai-cache-baseline.json)')
+    parser.add_argument('--result', help='Result file for compare (default: newest saved result)')
+    parser.add_argument('--save-baseline', action='store_true',
+                       help='Also store this run as the new baseline')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                       help='Allowed relative slowdown before a metric counts as a regression')
+
+    args = parser.parse_args()
+    if args.duplicate_ratio + args.paraphrase_ratio > 1:
+        parser.error('--duplicate-ratio plus --paraphrase-ratio must not exceed 1')
+
+    project_root = Path(__file__).parent.parent
+    benchmark = CacheBenchmark(project_root)
+    baseline_file = Path(args.baseline) if args.baseline else benchmark.baseline_file
+
+    if args.command == 'run-size':
+        result = run_single_size(benchmark.scripts_dir, args.size, args.queries, args.backend,
+                                 args.duplicate_ratio, args.paraphrase_ratio,
+                                 args.similarity_mode, args.seed)
+        print(json.dumps(result))
+        return
+
+    if args.command == 'run':
+        sizes = [int(size) for size in args.sizes.split(',') if size.strip()]
+        report = benchmark.run(sizes, args.queries, args.backend, args.duplicate_ratio,
+                               args.paraphrase_ratio, args.similarity_mode, args.seed)
+        path = benchmark.save(report)
+        print_report(report)
+        print(f"\n📊 Results saved to: {path}")
+        if args.save_baseline:
+            benchmark.save(report, baseline_file)
+            print(f"📌 Baseline updated: {baseline_file}")
+            return
+    else:
+        if args.result:
+            result_file = Path(args.result)
+        else:
+            saved = sorted(benchmark.results_dir.glob('ai-cache-benchmark_*.json'))
+            if not saved:
+                print("Error: no saved benchmark results; run the benchmark first")
+                sys.exit(1)
+            result_file = saved[-1]
+        with open(result_file, 'r') as f:
+            report = json.load(f)
+
+    if not baseline_file.exists():
+        print(f"No baseline at {baseline_file}; use --save-baseline to create one")
+        return
+    with open(baseline_file, 'r') as f:
+        baseline = json.load(f)
+    regressions = benchmark.compare(report, baseline, args.tolerance)
+    print_regressions(regressions, args.tolerance)
+    if regressions:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
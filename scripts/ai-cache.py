@@ -6,14 +6,53 @@ Part of the Agent Escalation System for cost-effective AI usage
 """
 
 import json
+import asyncio
+import logging
+import atexit
+import base64
+import gzip
+import os
+import tempfile
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 import hashlib
+import mmap
+import heapq
+import math
+import random
+import signal
+import socket
+import socketserver
+import struct
+from array import array
 import time
 from pathlib import Path
-from typing import Dict, List, Optional, Any, Tuple
-from dataclasses import dataclass, asdict
+from typing import Awaitable, Callable, Dict, List, Optional, Any, Sequence, Tuple
+from collections import OrderedDict, deque
+from dataclasses import dataclass, fields, replace
 from datetime import datetime, timedelta
 import argparse
+import sqlite3
 import sys
+import threading
+
+try:
+    import zstandard
+except ImportError:  # Optional: enables the zstd blob codec
+    zstandard = None
+
+try:
+    import numpy as np
+except ImportError:  # Optional: vectorized semantic search
+    np = None
+
+try:
+    import fcntl
+except ImportError:  # Not available on Windows: file locking becomes a no-op
+    fcntl = None
+
+logger = logging.getLogger('ai_cache')
 
 @dataclass
 class CachedResponse:
@@ -30,68 +69,2528 @@ class CachedResponse:
     access_count: int
     context_hash: Optional[str] = None
     metadata: Optional[Dict[str, Any]] = None
+    response_ref: Optional[str] = None  # SHA-256 of the body in the blob store
+    response_size: int = 0  # Uncompressed body size in bytes
+
+    @property
+    def created_ts(self) -> float:
+        return self.created_at.timestamp()
+
+    @property
+    def last_accessed_ts(self) -> float:
+        return self.last_accessed.timestamp()
+
+RESPONSE_FIELDS = tuple(f.name for f in fields(CachedResponse))
+
+def _column_property(index: int, decode: Optional[Callable] = None, encode: Optional[Callable] = None):
+    """Property reading/writing one ResponseTable column for a view's row"""
+    def fget(view):
+        table = view._table
+        value = table._columns[index][table._rows[view.prompt_hash]]
+        return decode(value) if decode else value
+
+    def fset(view, value):
+        table = view._table
+        table._columns[index][table._rows[view.prompt_hash]] = encode(value) if encode else value
+
+    return property(fget, fset)
+
+def _decode_quality(value: float) -> Optional[float]:
+    return None if math.isnan(value) else value
+
+def _encode_quality(value: Optional[float]) -> float:
+    return math.nan if value is None else value
+
+class ResponseView:
+    """Live view of one ResponseTable row with the CachedResponse attribute API
+
+    The view resolves its row by key on every access, so it stays valid when
+    rows are recycled and raises KeyError once its entry has been removed.
+    """
+
+    __slots__ = ('_table', 'prompt_hash')
+
+    def __init__(self, table: 'ResponseTable', prompt_hash: str):
+        self._table = table
+        self.prompt_hash = prompt_hash
+
+    prompt = _column_property(0)
+    response = _column_property(1)
+    model = _column_property(2, encode=sys.intern)
+    tokens_used = _column_property(3)
+    cost = _column_property(4)
+    quality_score = _column_property(5, _decode_quality, _encode_quality)
+    created_at = _column_property(6, datetime.fromtimestamp, datetime.timestamp)
+    last_accessed = _column_property(7, datetime.fromtimestamp, datetime.timestamp)
+    access_count = _column_property(8)
+    context_hash = _column_property(9)
+    metadata = _column_property(10, lambda value: value if value is not None else {})
+    response_ref = _column_property(11)
+    response_size = _column_property(12)
+    created_ts = _column_property(6)
+    last_accessed_ts = _column_property(7)
+
+    def detach(self) -> CachedResponse:
+        """Copy the row into a standalone CachedResponse"""
+        return self._table.record(self.prompt_hash)
+
+    def __repr__(self) -> str:
+        return f"ResponseView({self.prompt_hash!r})"
+
+class ResponseTable:
+    """Columnar in-memory store of cache entries, keyed by prompt hash
+
+    Timestamps are float epochs and counters are typed arrays rather than
+    per-entry datetime and int objects, model names are interned, empty
+    metadata is not stored, and rows of removed entries are recycled.
+    Indexing returns a ResponseView; the mapping API mirrors the dict it
+    replaces.
+    """
+
+    # Column order matches the ResponseView properties
+    COLUMNS = (
+        ('prompt', None), ('response', None), ('model', None),
+        ('tokens_used', 'I'), ('cost', 'd'), ('quality_score', 'd'),
+        ('created_at', 'd'), ('last_accessed', 'd'), ('access_count', 'I'),
+        ('context_hash', None), ('metadata', None), ('response_ref', None),
+        ('response_size', 'Q'),
+    )
+    OBJECT_COLUMNS = tuple(i for i, (_, typecode) in enumerate(COLUMNS) if typecode is None)
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        self._rows: Dict[str, int] = {}
+        self._free: List[int] = []
+        self._columns = [array(typecode) if typecode else [] for _, typecode in self.COLUMNS]
+
+    def put(self, key: str, prompt: str, response: Optional[str], model: str,
+            tokens_used: int, cost: float, quality_score: Optional[float],
+            created_at: float, last_accessed: float, access_count: int,
+            context_hash: Optional[str] = None, metadata: Optional[Dict[str, Any]] = None,
+            response_ref: Optional[str] = None, response_size: int = 0):
+        """Insert or overwrite an entry from raw column values (epoch timestamps)"""
+        values = (
+            prompt, response, sys.intern(model), tokens_used, cost,
+            math.nan if quality_score is None else quality_score,
+            created_at, last_accessed, access_count, context_hash,
+            metadata or None, response_ref, response_size
+        )
+        row = self._rows.get(key)
+        if row is None and not self._free:
+            self._rows[key] = len(self._columns[0])
+            for column, value in zip(self._columns, values):
+                column.append(value)
+            return
+        if row is None:
+            row = self._free.pop()
+            self._rows[key] = row
+        for column, value in zip(self._columns, values):
+            column[row] = value
+
+    def extend(self, keys: Sequence[str], columns: Sequence[Sequence[Any]]):
+        """Bulk-append entries given column-wise raw values (keys must be new)
+
+        Loads use this to fill each typed column with one C-level extend
+        instead of a Python loop per entry.
+        """
+        start = len(self._columns[0])
+        for column, values in zip(self._columns, columns):
+            column.extend(values)
+        self._rows.update(zip(keys, range(start, start + len(keys))))
+
+    def __setitem__(self, key: str, response: CachedResponse):
+        self.put(key, response.prompt, response.response, response.model,
+                 response.tokens_used, response.cost, response.quality_score,
+                 response.created_ts, response.last_accessed_ts, response.access_count,
+                 response.context_hash, response.metadata, response.response_ref,
+                 response.response_size)
+
+    def __getitem__(self, key: str) -> ResponseView:
+        if key not in self._rows:
+            raise KeyError(key)
+        return ResponseView(self, key)
+
+    def get(self, key: str, default: Any = None) -> Optional[ResponseView]:
+        return ResponseView(self, key) if key in self._rows else default
+
+    def __contains__(self, key: object) -> bool:
+        return key in self._rows
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def __iter__(self):
+        return iter(self._rows)
+
+    def keys(self):
+        return self._rows.keys()
+
+    def values(self):
+        return (ResponseView(self, key) for key in self._rows)
+
+    def items(self):
+        return ((key, ResponseView(self, key)) for key in self._rows)
+
+    def discard(self, key: str):
+        """Remove an entry if present, releasing its strings for reuse of the row"""
+        row = self._rows.pop(key, None)
+        if row is None:
+            return
+        for index in self.OBJECT_COLUMNS:
+            self._columns[index][row] = None
+        self._free.append(row)
+
+    def pop(self, key: str, *default: Any) -> Optional[CachedResponse]:
+        if key not in self._rows:
+            if default:
+                return default[0]
+            raise KeyError(key)
+        record = self.record(key)
+        self.discard(key)
+        return record
+
+    def update(self, other: 'ResponseTable'):
+        """Copy every row of another table (e.g. when merging shards)"""
+        columns = other._columns
+        if self._rows.keys().isdisjoint(other._rows):
+            rows = list(other._rows.values())
+            self.extend(list(other._rows), [[column[row] for row in rows] for column in columns])
+            return
+        for key, row in other._rows.items():
+            self.put(key, *(column[row] for column in columns))
+
+    def scan(self, *names: str):
+        """Yield (key, raw column values...) for every entry without building views
+
+        Timestamps come back as epochs and a missing quality score as NaN.
+        """
+        positions = [next(i for i, (column, _) in enumerate(self.COLUMNS) if column == name)
+                     for name in names]
+        columns = [self._columns[i] for i in positions]
+        for key, row in self._rows.items():
+            yield (key, *(column[row] for column in columns))
+
+    def record(self, key: str) -> CachedResponse:
+        """Build a standalone CachedResponse for an entry"""
+        row = self._rows[key]
+        values = [column[row] for column in self._columns]
+        return CachedResponse(
+            prompt_hash=key,
+            prompt=values[0],
+            response=values[1],
+            model=values[2],
+            tokens_used=values[3],
+            cost=values[4],
+            quality_score=_decode_quality(values[5]),
+            created_at=datetime.fromtimestamp(values[6]),
+            last_accessed=datetime.fromtimestamp(values[7]),
+            access_count=values[8],
+            context_hash=values[9],
+            metadata=values[10] if values[10] is not None else {},
+            response_ref=values[11],
+            response_size=values[12]
+        )
+
+def _response_to_json(response: CachedResponse, inline_blobs: bool = False) -> Dict[str, Any]:
+    """Serialize a CachedResponse (or ResponseView) into a JSON-compatible dict
+
+    Blob-backed bodies are written as a reference only, unless
+    ``inline_blobs`` is set (e.g. when sending a hit to a client).
+    """
+    data = {name: getattr(response, name) for name in RESPONSE_FIELDS}
+    if response.response_ref and not inline_blobs:
+        data['response'] = None
+    data['created_at'] = response.created_at.isoformat()
+    data['last_accessed'] = response.last_accessed.isoformat()
+    return data
+
+def _response_from_json(item: Dict[str, Any]) -> CachedResponse:
+    """Build a CachedResponse from its JSON representation"""
+    item = dict(item)
+    item['created_at'] = datetime.fromisoformat(item['created_at'])
+    item['last_accessed'] = datetime.fromisoformat(item['last_accessed'])
+    return CachedResponse(**item)
+
+class CacheStorage:
+    """Base class for AI cache persistence backends"""
+
+    name = 'base'
+
+    def load(self) -> Tuple[ResponseTable, Dict[str, List[str]]]:
+        """Load all entries and the prompt -> context index"""
+        raise NotImplementedError
+
+    def get(self, key: str) -> Optional[CachedResponse]:
+        """Read a single entry without loading the whole cache"""
+        return self.load()[0].get(key)
+
+    def prompts(self) -> List[Tuple[str, str, Optional[str]]]:
+        """(key, prompt, context_hash) of every entry, for building indexes"""
+        return list(self.load()[0].scan('prompt', 'context_hash'))
+
+    def upsert(self, response: CachedResponse, context_hashes: Optional[List[str]] = None):
+        """Insert or replace a single entry (and its index row)"""
+        raise NotImplementedError
+
+    def touch(self, response: CachedResponse):
+        """Persist updated access counters for an entry"""
+        raise NotImplementedError
+
+    def delete(self, keys: List[str]):
+        """Remove entries by key"""
+        raise NotImplementedError
+
+    def clear(self):
+        """Remove all entries"""
+        raise NotImplementedError
+
+    def apply_batch(self, upserts: List[Tuple[CachedResponse, Optional[List[str]]]],
+                    touches: List[CachedResponse], deletes: List[str]):
+        """Apply a batch of buffered mutations"""
+        self.delete(deletes)
+        for response, context_hashes in upserts:
+            self.upsert(response, context_hashes)
+        for response in touches:
+            self.touch(response)
+
+    def close(self):
+        """Release any resources held by the backend"""
+
+@contextmanager
+def _file_lock(lock_file: Path, shared: bool = False):
+    """Hold an advisory flock on lock_file for the duration of the block"""
+    if fcntl is None:
+        yield
+        return
+    with open(lock_file, 'a') as f:
+        fcntl.flock(f, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+def _atomic_write_json(path: Path, data: Any, indent: Optional[int] = None):
+    """Write JSON to a temp file in the same directory, then rename over path"""
+    fd, tmp_name = tempfile.mkstemp(dir=path.parent, prefix=path.name, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w') as f:
+            json.dump(data, f, indent=indent)
+        os.replace(tmp_name, path)
+    except BaseException:
+        os.unlink(tmp_name)
+        raise
+
+class JSONCacheStorage(CacheStorage):
+    """Legacy backend: responses.json / index.json rewritten per commit
+
+    Every commit re-reads the files under an exclusive advisory lock, applies
+    this process's changes and renames a temp file over the original. As a
+    result, concurrent writers never lose each other's entries and readers
+    never see a torn file.
+    """
+
+    name = 'json'
+
+    # Sidecar offset index: header (magic, size and mtime of the JSON file it
+    # describes), then records sorted by key so get() can binary-search an mmap
+    OFFSETS_MAGIC = b'AICIDX01'
+    OFFSETS_HEADER = struct.Struct('>8sQQ')
+    OFFSETS_RECORD = struct.Struct('>16sQI')
+
+    def __init__(self, cache_dir: Path):
+        self.cache_file = cache_dir / 'responses.json'
+        self.index_file = cache_dir / 'index.json'
+        self.offsets_file = cache_dir / 'responses.idx'
+        self.lock_file = cache_dir / 'responses.json.lock'
+
+    def _read_json(self, path: Path) -> Dict[str, Any]:
+        if not path.exists():
+            return {}
+        try:
+            with open(path, 'r') as f:
+                return json.load(f)
+        except ValueError as e:
+            # Never overwrite a file we could not parse: move it aside instead
+            corrupt = path.with_name(f"{path.name}.corrupt-{int(time.time())}")
+            path.rename(corrupt)
+            print(f"Warning: Could not parse {path.name} ({e}); moved to {corrupt.name}", file=sys.stderr)
+            return {}
+
+    def load(self) -> Tuple[ResponseTable, Dict[str, List[str]]]:
+        cache = ResponseTable()
+
+        with _file_lock(self.lock_file, shared=True):
+            data = self._read_json(self.cache_file)
+            index = self._read_json(self.index_file)
+
+        for key, item in data.items():
+            try:
+                cache[key] = _response_from_json(item)
+            except Exception as e:
+                print(f"Warning: Skipping cache entry {key}: {e}", file=sys.stderr)
+
+        return cache, index
+
+    def get(self, key: str) -> Optional[CachedResponse]:
+        """Point lookup through the mmap'd offset index (full load if it is stale)"""
+        with _file_lock(self.lock_file, shared=True):
+            location = self._locate(key)
+            if location is not None:
+                if not location:
+                    return None
+                offset, length = location
+                with open(self.cache_file, 'rb') as f:
+                    f.seek(offset)
+                    return _response_from_json(json.loads(f.read(length)))
+        return super().get(key)
+
+    def _locate(self, key: str):
+        """Return (offset, length) for key, () if absent, None if the index can't be used"""
+        try:
+            stat = self.cache_file.stat()
+            with open(self.offsets_file, 'rb') as f:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as view:
+                    magic, size, mtime_ns = self.OFFSETS_HEADER.unpack_from(view, 0)
+                    if magic != self.OFFSETS_MAGIC or (size, mtime_ns) != (stat.st_size, stat.st_mtime_ns):
+                        return None
+                    target = key.encode()
+                    base, record = self.OFFSETS_HEADER.size, self.OFFSETS_RECORD.size
+                    lo, hi = 0, (len(view) - base) // record
+                    while lo < hi:
+                        mid = (lo + hi) // 2
+                        found, offset, length = self.OFFSETS_RECORD.unpack_from(view, base + mid * record)
+                        if found == target:
+                            return offset, length
+                        if found < target:
+                            lo = mid + 1
+                        else:
+                            hi = mid
+                    return ()
+        except (OSError, ValueError, struct.error):
+            return None
+
+    def _write_data(self, data: Dict[str, Any]):
+        """Write responses.json one entry per line, plus its offset index"""
+        offsets = []
+        fd, tmp_name = tempfile.mkstemp(dir=self.cache_file.parent, prefix=self.cache_file.name, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(b'{')
+                for i, (key, item) in enumerate(data.items()):
+                    f.write(b'\n' if i == 0 else b',\n')
+                    f.write(json.dumps(key).encode() + b': ')
+                    encoded = json.dumps(item).encode()
+                    offsets.append((key.encode(), f.tell(), len(encoded)))
+                    f.write(encoded)
+                f.write(b'\n}\n')
+            stat = os.stat(tmp_name)
+            os.replace(tmp_name, self.cache_file)
+        except BaseException:
+            os.unlink(tmp_name)
+            raise
+
+        records = [self.OFFSETS_HEADER.pack(self.OFFSETS_MAGIC, stat.st_size, stat.st_mtime_ns)]
+        records.extend(self.OFFSETS_RECORD.pack(*entry) for entry in sorted(offsets)
+                       if len(entry[0]) == 16)
+        fd, tmp_name = tempfile.mkstemp(dir=self.offsets_file.parent, prefix=self.offsets_file.name, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(b''.join(records))
+        os.replace(tmp_name, self.offsets_file)
+
+    def _commit(self, upserts: List[Tuple[CachedResponse, Optional[List[str]]]],
+                deletes: List[str], clear: bool = False):
+        try:
+            with _file_lock(self.lock_file):
+                data = {} if clear else self._read_json(self.cache_file)
+                index = {} if clear else self._read_json(self.index_file)
+
+                for key in deletes:
+                    data.pop(key, None)
+                    index.pop(key, None)
+                for response, context_hashes in upserts:
+                    data[response.prompt_hash] = _response_to_json(response)
+                    if context_hashes:
+                        merged = index.setdefault(response.prompt_hash, [])
+                        merged.extend(h for h in context_hashes if h not in merged)
+
+                self._write_data(data)
+                _atomic_write_json(self.index_file, index, indent=2)
+
+        except Exception as e:
+            print(f"Error saving cache: {e}", file=sys.stderr)
+
+    def upsert(self, response: CachedResponse, context_hashes: Optional[List[str]] = None):
+        self._commit([(response, context_hashes)], [])
+
+    def touch(self, response: CachedResponse):
+        self._commit([(response, None)], [])
+
+    def delete(self, keys: List[str]):
+        if keys:
+            self._commit([], keys)
+
+    def clear(self):
+        self._commit([], [], clear=True)
+
+    def apply_batch(self, upserts: List[Tuple[CachedResponse, Optional[List[str]]]],
+                    touches: List[CachedResponse], deletes: List[str]):
+        self._commit(upserts + [(r, None) for r in touches], deletes)
+
+class SQLiteCacheStorage(CacheStorage):
+    """SQLite (WAL mode) backend with one row per cache entry"""
+
+    name = 'sqlite'
+    SCHEMA_VERSION = 2
+    COLUMNS = (
+        'prompt_hash', 'prompt', 'response', 'model', 'tokens_used', 'cost',
+        'quality_score', 'created_at', 'last_accessed', 'access_count',
+        'context_hash', 'metadata', 'response_ref', 'response_size'
+    )
+    UPSERT_SQL = (
+        f"INSERT OR REPLACE INTO entries ({', '.join(COLUMNS)}) "
+        f"VALUES ({', '.join('?' for _ in COLUMNS)})"
+    )
+    SELECT_SQL = f"SELECT {', '.join(COLUMNS)} FROM entries"
+
+    def __init__(self, cache_dir: Path, db_name: str = 'responses.db'):
+        self.cache_dir = cache_dir
+        self.db_file = cache_dir / db_name
+        self._lock = threading.RLock()
+        self.conn = sqlite3.connect(str(self.db_file), check_same_thread=False, timeout=30)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self._create_schema()
+
+    def _create_schema(self):
+        with self._lock, self.conn:
+            self.conn.executescript('''
+                CREATE TABLE IF NOT EXISTS entries (
+                    prompt_hash TEXT PRIMARY KEY,
+                    prompt TEXT NOT NULL,
+                    response TEXT NOT NULL,
+                    model TEXT NOT NULL,
+                    tokens_used INTEGER NOT NULL,
+                    cost REAL NOT NULL,
+                    quality_score REAL,
+                    created_at REAL NOT NULL,
+                    last_accessed REAL NOT NULL,
+                    access_count INTEGER NOT NULL,
+                    context_hash TEXT,
+                    metadata TEXT,
+                    response_ref TEXT,
+                    response_size INTEGER NOT NULL DEFAULT 0
+                );
+                CREATE TABLE IF NOT EXISTS context_index (
+                    prompt_hash TEXT NOT NULL,
+                    context_hash TEXT NOT NULL,
+                    PRIMARY KEY (prompt_hash, context_hash)
+                );
+                CREATE TABLE IF NOT EXISTS meta (
+                    key TEXT PRIMARY KEY,
+                    value TEXT
+                );
+            ''')
+            # Schema v1 -> v2: blob-store references
+            columns = {row[1] for row in self.conn.execute('PRAGMA table_info(entries)')}
+            if 'response_ref' not in columns:
+                self.conn.execute('ALTER TABLE entries ADD COLUMN response_ref TEXT')
+                self.conn.execute('ALTER TABLE entries ADD COLUMN response_size INTEGER NOT NULL DEFAULT 0')
+            self.conn.execute(
+                'INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)',
+                ('schema_version', str(self.SCHEMA_VERSION))
+            )
+
+    @staticmethod
+    def _row_values(response: CachedResponse) -> Tuple:
+        return (
+            response.prompt_hash, response.prompt,
+            '' if response.response_ref else response.response, response.model,
+            response.tokens_used, response.cost, response.quality_score,
+            response.created_ts, response.last_accessed_ts,
+            response.access_count, response.context_hash,
+            json.dumps(response.metadata) if response.metadata is not None else None,
+            response.response_ref, response.response_size
+        )
+
+    @staticmethod
+    def _row_to_response(row: Tuple) -> CachedResponse:
+        return CachedResponse(
+            prompt_hash=row[0],
+            prompt=row[1],
+            response=None if row[12] else row[2],
+            model=row[3],
+            tokens_used=row[4],
+            cost=row[5],
+            quality_score=row[6],
+            created_at=datetime.fromtimestamp(row[7]),
+            last_accessed=datetime.fromtimestamp(row[8]),
+            access_count=row[9],
+            context_hash=row[10],
+            metadata=json.loads(row[11]) if row[11] is not None else None,
+            response_ref=row[12],
+            response_size=row[13]
+        )
+
+    def load(self) -> Tuple[ResponseTable, Dict[str, List[str]]]:
+        cache = ResponseTable()
+        index: Dict[str, List[str]] = {}
+        with self._lock:
+            rows = self.conn.execute(self.SELECT_SQL).fetchall()
+            for prompt_hash, context_hash in self.conn.execute('SELECT prompt_hash, context_hash FROM context_index'):
+                index.setdefault(prompt_hash, []).append(context_hash)
+
+        # Rows go straight into the columns: no per-entry objects or datetimes
+        if rows:
+            c = list(zip(*rows))
+            cache.extend(c[0], (
+                c[1],
+                [None if ref else body for body, ref in zip(c[2], c[12])],
+                [sys.intern(model) for model in c[3]],
+                c[4], c[5],
+                [math.nan if quality is None else quality for quality in c[6]],
+                c[7], c[8], c[9], c[10],
+                [None if meta in (None, '{}') else json.loads(meta) for meta in c[11]],
+                c[12], c[13]
+            ))
+        return cache, index
+
+    def get(self, key: str) -> Optional[CachedResponse]:
+        with self._lock:
+            row = self.conn.execute(f"{self.SELECT_SQL} WHERE prompt_hash = ?", (key,)).fetchone()
+        return self._row_to_response(row) if row else None
+
+    def prompts(self) -> List[Tuple[str, str, Optional[str]]]:
+        with self._lock:
+            return self.conn.execute('SELECT prompt_hash, prompt, context_hash FROM entries').fetchall()
+
+    def upsert(self, response: CachedResponse, context_hashes: Optional[List[str]] = None):
+        with self._lock, self.conn:
+            self.conn.execute(
+                self.UPSERT_SQL,
+                self._row_values(response)
+            )
+            if context_hashes:
+                self.conn.executemany(
+                    'INSERT OR IGNORE INTO context_index (prompt_hash, context_hash) VALUES (?, ?)',
+                    [(response.prompt_hash, h) for h in context_hashes]
+                )
+
+    def touch(self, response: CachedResponse):
+        with self._lock, self.conn:
+            self.conn.execute(
+                'UPDATE entries SET last_accessed = ?, access_count = ? WHERE prompt_hash = ?',
+                (response.last_accessed_ts, response.access_count, response.prompt_hash)
+            )
+
+    def delete(self, keys: List[str]):
+        if not keys:
+            return
+        rows = [(k,) for k in keys]
+        with self._lock, self.conn:
+            self.conn.executemany('DELETE FROM entries WHERE prompt_hash = ?', rows)
+            self.conn.executemany('DELETE FROM context_index WHERE prompt_hash = ?', rows)
+
+    def clear(self):
+        with self._lock, self.conn:
+            self.conn.execute('DELETE FROM entries')
+            self.conn.execute('DELETE FROM context_index')
+
+    def apply_batch(self, upserts: List[Tuple[CachedResponse, Optional[List[str]]]],
+                    touches: List[CachedResponse], deletes: List[str]):
+        """Apply all buffered mutations in a single transaction"""
+        with self._lock, self.conn:
+            if deletes:
+                rows = [(k,) for k in deletes]
+                self.conn.executemany('DELETE FROM entries WHERE prompt_hash = ?', rows)
+                self.conn.executemany('DELETE FROM context_index WHERE prompt_hash = ?', rows)
+            self.conn.executemany(
+                self.UPSERT_SQL,
+                [self._row_values(r) for r, _ in upserts]
+            )
+            self.conn.executemany(
+                'INSERT OR IGNORE INTO context_index (prompt_hash, context_hash) VALUES (?, ?)',
+                [(r.prompt_hash, h) for r, hashes in upserts for h in (hashes or [])]
+            )
+            self.conn.executemany(
+                'UPDATE entries SET last_accessed = ?, access_count = ? WHERE prompt_hash = ?',
+                [(r.last_accessed_ts, r.access_count, r.prompt_hash) for r in touches]
+            )
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
+
+    def get_meta(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self.conn.execute('SELECT value FROM meta WHERE key = ?', (key,)).fetchone()
+        return row[0] if row else None
+
+    def set_meta(self, key: str, value: str):
+        with self._lock, self.conn:
+            self.conn.execute('INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)', (key, value))
+
+    def migrate_from_json(self, json_storage: JSONCacheStorage) -> int:
+        """One-time import of the legacy responses.json / index.json files
+
+        The JSON files are renamed with a ``.migrated`` suffix afterwards so
+        the import never runs twice. Returns the number of imported entries.
+        """
+        if not json_storage.cache_file.exists():
+            return 0
+
+        cache, index = json_storage.load()
+        with self._lock, self.conn:
+            self.conn.executemany(
+                self.UPSERT_SQL,
+                [self._row_values(r) for r in cache.values()]
+            )
+            self.conn.executemany(
+                'INSERT OR IGNORE INTO context_index (prompt_hash, context_hash) VALUES (?, ?)',
+                [(p, c) for p, contexts in index.items() for c in contexts]
+            )
+            self.conn.execute(
+                'INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)',
+                ('migrated_from_json', datetime.now().isoformat())
+            )
+
+        for path in (json_storage.cache_file, json_storage.index_file):
+            if path.exists():
+                path.rename(path.with_name(path.name + '.migrated'))
+
+        print(f"Migrated {len(cache)} cache entries from JSON to SQLite", file=sys.stderr)
+        return len(cache)
+
+class ShardedCacheStorage(CacheStorage):
+    """Splits entries across N JSON or SQLite shards by cache-key prefix
+
+    Each shard is a complete backend in ``shards/<nn>/`` with its own
+    locking, so writers to different shards never contend on one file.
+    JSON shards use flock + atomic rename; SQLite shards rely on SQLite's
+    own file locking. Shards are loaded in parallel at startup. The shard
+    count and backend are fixed in ``shards/layout.json`` on creation.
+    """
+
+    name = 'sharded'
+    SHARD_BACKENDS = {
+        'json': JSONCacheStorage,
+        'sqlite': SQLiteCacheStorage,
+    }
+
+    DEFAULT_SHARDS = 16
+
+    def __init__(self, cache_dir: Path, shards: Optional[int] = None, shard_backend: Optional[str] = None):
+        self.shard_dir = cache_dir / 'shards'
+        self.shard_dir.mkdir(parents=True, exist_ok=True)
+        layout_file = self.shard_dir / 'layout.json'
+
+        self.created = False
+        with _file_lock(self.shard_dir / 'layout.lock'):
+            if layout_file.exists():
+                with open(layout_file, 'r') as f:
+                    layout = json.load(f)
+                if shards not in (None, layout['shards']) or shard_backend not in (None, layout['backend']):
+                    print(f"Warning: using existing shard layout ({layout['shards']} x {layout['backend']})",
+                          file=sys.stderr)
+                shards, shard_backend = layout['shards'], layout['backend']
+            else:
+                shards = shards or self.DEFAULT_SHARDS
+                shard_backend = shard_backend or 'sqlite'
+                if shard_backend not in self.SHARD_BACKENDS:
+                    raise ValueError(f"Unknown shard backend: {shard_backend}")
+                _atomic_write_json(layout_file, {'shards': shards, 'backend': shard_backend})
+                self.created = True
+
+        self.shard_backend = shard_backend
+        self.shards: List[CacheStorage] = []
+        for i in range(shards):
+            path = self.shard_dir / f"{i:02x}"
+            path.mkdir(exist_ok=True)
+            self.shards.append(self.SHARD_BACKENDS[shard_backend](path))
+
+    def shard_for(self, key: str) -> CacheStorage:
+        return self.shards[int(key[:8], 16) % len(self.shards)]
+
+    def _group(self, items: List[Any], key_of) -> Dict[int, List[Any]]:
+        groups: Dict[int, List[Any]] = {}
+        for item in items:
+            groups.setdefault(int(key_of(item)[:8], 16) % len(self.shards), []).append(item)
+        return groups
+
+    def load(self) -> Tuple[ResponseTable, Dict[str, List[str]]]:
+        cache = ResponseTable()
+        index: Dict[str, List[str]] = {}
+        with ThreadPoolExecutor(max_workers=min(len(self.shards), os.cpu_count() or 4)) as pool:
+            for shard_cache, shard_index in pool.map(lambda shard: shard.load(), self.shards):
+                cache.update(shard_cache)
+                index.update(shard_index)
+        return cache, index
+
+    def get(self, key: str) -> Optional[CachedResponse]:
+        return self.shard_for(key).get(key)
+
+    def prompts(self) -> List[Tuple[str, str, Optional[str]]]:
+        return [row for shard in self.shards for row in shard.prompts()]
+
+    def upsert(self, response: CachedResponse, context_hashes: Optional[List[str]] = None):
+        self.shard_for(response.prompt_hash).upsert(response, context_hashes)
+
+    def touch(self, response: CachedResponse):
+        self.shard_for(response.prompt_hash).touch(response)
+
+    def delete(self, keys: List[str]):
+        for shard_id, shard_keys in self._group(keys, lambda k: k).items():
+            self.shards[shard_id].delete(shard_keys)
+
+    def clear(self):
+        for shard in self.shards:
+            shard.clear()
+
+    def apply_batch(self, upserts: List[Tuple[CachedResponse, Optional[List[str]]]],
+                    touches: List[CachedResponse], deletes: List[str]):
+        upsert_groups = self._group(upserts, lambda item: item[0].prompt_hash)
+        touch_groups = self._group(touches, lambda r: r.prompt_hash)
+        delete_groups = self._group(deletes, lambda k: k)
+        for shard_id in set(upsert_groups) | set(touch_groups) | set(delete_groups):
+            self.shards[shard_id].apply_batch(
+                upsert_groups.get(shard_id, []),
+                touch_groups.get(shard_id, []),
+                delete_groups.get(shard_id, [])
+            )
+
+    def close(self):
+        for shard in self.shards:
+            shard.close()
+
+    def import_from(self, source: CacheStorage) -> int:
+        """Copy every entry of a single-file backend into the shards"""
+        cache, index = source.load()
+        self.apply_batch([(r, index.get(k)) for k, r in cache.items()], [], [])
+        return len(cache)
+
+class BlobStore:
+    """Content-addressed, compressed store for response bodies
+
+    Bodies are keyed by SHA-256 so identical responses are stored once.
+    Each blob lives at ``<root>/<hash[:2]>/<hash>.<codec>`` and is written
+    via temp file + rename. The zstd codec is used only when the optional
+    ``zstandard`` package is installed; a dictionary at ``<root>/zstd.dict``
+    is picked up if present (it must not change once blobs use it).
+    """
+
+    CODEC_EXTENSIONS = {'zlib': 'z', 'zstd': 'zst'}
+
+    def __init__(self, root: Path, codec: str = 'zlib', level: int = 6):
+        if codec not in self.CODEC_EXTENSIONS:
+            raise ValueError(f"Unknown blob codec: {codec}")
+        if codec == 'zstd' and zstandard is None:
+            print("Warning: zstandard not installed, falling back to zlib blobs", file=sys.stderr)
+            codec = 'zlib'
+        self.root = root
+        self.codec = codec
+        self.level = level
+        self.root.mkdir(parents=True, exist_ok=True)
+
+        self._zstd_dict = None
+        dict_file = root / 'zstd.dict'
+        if codec == 'zstd' and dict_file.exists():
+            self._zstd_dict = zstandard.ZstdCompressionDict(dict_file.read_bytes())
+
+    @staticmethod
+    def content_hash(text: str) -> str:
+        return hashlib.sha256(text.encode()).hexdigest()
+
+    def _path(self, digest: str, codec: str) -> Path:
+        return self.root / digest[:2] / f"{digest}.{self.CODEC_EXTENSIONS[codec]}"
+
+    def _compress(self, data: bytes) -> bytes:
+        if self.codec == 'zstd':
+            return zstandard.ZstdCompressor(level=self.level, dict_data=self._zstd_dict).compress(data)
+        return zlib.compress(data, self.level)
+
+    def put(self, text: str) -> Tuple[str, int]:
+        """Store a body (deduplicated) and return (sha256, uncompressed size)"""
+        data = text.encode()
+        digest = hashlib.sha256(data).hexdigest()
+        if self.exists(digest):
+            return digest, len(data)
+
+        path = self._path(digest, self.codec)
+        path.parent.mkdir(exist_ok=True)
+        fd, tmp_name = tempfile.mkstemp(dir=path.parent, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(self._compress(data))
+        os.replace(tmp_name, path)
+        return digest, len(data)
+
+    def exists(self, digest: str) -> bool:
+        return any(self._path(digest, codec).exists() for codec in self.CODEC_EXTENSIONS)
+
+    def get(self, digest: str) -> str:
+        """Load and decompress a body by hash"""
+        path = self._path(digest, 'zlib')
+        if path.exists():
+            return zlib.decompress(path.read_bytes()).decode()
+        path = self._path(digest, 'zstd')
+        if zstandard is None:
+            raise RuntimeError(f"Blob {digest} needs the zstandard package")
+        return zstandard.ZstdDecompressor(dict_data=self._zstd_dict).decompress(path.read_bytes()).decode()
+
+    def gc(self, live: set) -> int:
+        """Delete blobs no longer referenced by any entry"""
+        removed = 0
+        for path in self.root.glob('*/*'):
+            # Temp files may belong to a writer that is still running
+            if path.suffix != '.tmp' and path.stem not in live:
+                path.unlink()
+                removed += 1
+        return removed
+
+STORAGE_BACKENDS = {
+    'json': JSONCacheStorage,
+    'sqlite': SQLiteCacheStorage,
+    'sharded': ShardedCacheStorage,
+}
+
+def _tokenize(text: str) -> frozenset:
+    """Split a prompt into the word set used for similarity matching"""
+    return frozenset(text.lower().split())
+
+# Words that do not change what a prompt asks for
+_FILLER_WORDS = frozenset((
+    'a', 'an', 'the', 'this', 'that', 'these', 'those', 'it', 'its', 'my', 'our', 'your',
+    'to', 'for', 'of', 'in', 'on', 'at', 'by', 'from', 'into', 'with', 'and', 'or',
+    'is', 'are', 'be', 'do', 'does', 'i', 'we', 'you', 'me', 'how', 'can', 'could',
+    'should', 'would', 'please', 'what', 'way',
+))
+
+def _content_words(text: str) -> frozenset:
+    """Crudely stemmed words of a prompt, without punctuation and filler words"""
+    words = set()
+    for word in text.lower().split():
+        word = word.strip('.,;:!?()[]{}"\'`')
+        if not word or word in _FILLER_WORDS:
+            continue
+        for suffix in ('ing', 'ed', 'es', 's'):
+            if word.endswith(suffix) and not word.endswith('ss') and len(word) - len(suffix) >= 3:
+                word = word[:-len(suffix)]
+                break
+        if word.endswith('e') and len(word) > 3:
+            word = word[:-1]
+        words.add(word)
+    return frozenset(words)
+
+def _content_overlap(query: str, stored: str) -> float:
+    """Fraction of the stored prompt's content words that the query also has
+
+    Rewordings, inflections and added filler keep the full 1.0. A query that
+    leaves out words of the stored prompt ("write unit tests" against "write
+    unit tests for the payment service") or swaps one for another scores less.
+    """
+    stored_words = _content_words(stored)
+    if not stored_words:
+        return 1.0
+    return len(stored_words & _content_words(query)) / len(stored_words)
+
+def _context_chunks(context: str, avg_lines: int = 8) -> List[str]:
+    """Split a context into content-defined chunks and hash each one
+
+    A chunk ends after any line whose CRC is divisible by avg_lines, so
+    boundaries depend only on nearby content: an edit changes the chunks
+    around it and leaves the rest of a large context recognizably identical.
+    """
+    chunks, current = [], []
+    for line in context.splitlines(keepends=True):
+        current.append(line)
+        if zlib.crc32(line.encode()) % avg_lines == 0:
+            chunks.append(''.join(current))
+            current = []
+    if current:
+        chunks.append(''.join(current))
+    return [hashlib.sha256(chunk.encode()).hexdigest()[:12] for chunk in chunks]
+
+class WriteBehindBuffer:
+    """Buffers storage mutations and flushes them in batches
+
+    Mutations are coalesced per key (the latest operation wins) and applied
+    through ``CacheStorage.apply_batch`` once ``max_pending`` keys are dirty
+    or ``flush_interval`` seconds have passed, from a background thread.
+    Entries are copied when they are queued, so the flush thread never reads
+    the live ResponseTable the caller keeps mutating. The buffer exposes the
+    same write methods as a storage backend, so AICache can use either
+    interchangeably.
+    """
+
+    def __init__(self, storage: CacheStorage, max_pending: int = 500, flush_interval: float = 2.0,
+                 max_retries: int = 3):
+        self.storage = storage
+        self.max_pending = max_pending
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self._pending: Dict[str, Tuple[str, Any]] = {}
+        self._failures: Dict[str, int] = {}  # Failed flush attempts per key
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, name='ai-cache-write-behind', daemon=True)
+        self._thread.start()
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    @staticmethod
+    def _snapshot(response: CachedResponse) -> CachedResponse:
+        """Standalone copy of an entry (or ResponseView) as it is right now"""
+        record = response.detach() if isinstance(response, ResponseView) else replace(response)
+        if record.metadata is not None:
+            record.metadata = dict(record.metadata)
+        return record
+
+    def _mark(self, key: str, op: str, payload: Any):
+        with self._lock:
+            previous = self._pending.get(key)
+            # A touch never downgrades a pending upsert; the upsert takes
+            # the newer copy with the latest counters instead
+            if op == 'touch' and previous is not None and previous[0] == 'upsert':
+                op, payload = 'upsert', (payload, previous[1][1])
+            self._pending[key] = (op, payload)
+            full = len(self._pending) >= self.max_pending
+        if full:
+            self._wakeup.set()
+
+    def upsert(self, response: CachedResponse, context_hashes: Optional[List[str]] = None):
+        context_hashes = list(context_hashes) if context_hashes is not None else None
+        self._mark(response.prompt_hash, 'upsert', (self._snapshot(response), context_hashes))
+
+    def touch(self, response: CachedResponse):
+        self._mark(response.prompt_hash, 'touch', self._snapshot(response))
+
+    def delete(self, keys: List[str]):
+        for key in keys:
+            self._mark(key, 'delete', None)
+
+    def apply_batch(self, upserts: List[Tuple[CachedResponse, Optional[List[str]]]],
+                    touches: List[CachedResponse], deletes: List[str]):
+        self.delete(deletes)
+        for response, context_hashes in upserts:
+            self.upsert(response, context_hashes)
+        for response in touches:
+            self.touch(response)
+
+    def clear(self):
+        with self._flush_lock:
+            with self._lock:
+                self._pending.clear()
+            self._failures.clear()
+            self.storage.clear()
+
+    def _apply(self, pending: Dict[str, Tuple[str, Any]]):
+        upserts, touches, deletes = [], [], []
+        for key, (op, payload) in pending.items():
+            if op == 'upsert':
+                upserts.append(payload)
+            elif op == 'touch':
+                touches.append(payload)
+            else:
+                deletes.append(key)
+        self.storage.apply_batch(upserts, touches, deletes)
+
+    def flush(self):
+        """Write all pending mutations to the storage backend
+
+        When the batch fails, its mutations are applied one at a time so a
+        single bad entry cannot take the others down. A mutation that still
+        fails is queued again, unless a newer one for its key has arrived
+        meanwhile, and dropped after max_retries failed flushes.
+        """
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+            if not pending:
+                return
+            try:
+                self._apply(pending)
+            except Exception:
+                logger.warning("Batched cache write of %d keys failed, retrying them one at a time",
+                               len(pending), exc_info=True)
+            else:
+                for key in pending:
+                    self._failures.pop(key, None)
+                return
+
+            for key, mutation in pending.items():
+                try:
+                    self._apply({key: mutation})
+                except Exception:
+                    self._retry(key, mutation)
+                else:
+                    self._failures.pop(key, None)
+
+    def _retry(self, key: str, mutation: Tuple[str, Any]):
+        attempts = self._failures.get(key, 0) + 1
+        if attempts >= self.max_retries:
+            self._failures.pop(key, None)
+            logger.error("Dropping cache %s of %s after %d failed flushes",
+                         mutation[0], key, attempts, exc_info=True)
+            return
+        self._failures[key] = attempts
+        logger.warning("Cache %s of %s failed, will retry", mutation[0], key, exc_info=True)
+        with self._lock:
+            newer = self._pending.get(key)
+            if newer is None:
+                self._pending[key] = mutation
+            elif newer[0] == 'touch' and mutation[0] == 'upsert':
+                self._pending[key] = ('upsert', (newer[1], mutation[1][1]))
+
+    def _run(self):
+        while not self._stopped:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+
+    def close(self):
+        """Stop the background thread after a final flush"""
+        self._stopped = True
+        self._wakeup.set()
+        self._thread.join()
+        self.flush()
+
+class TokenIndex:
+    """Inverted index from prompt token to cache keys for exact Jaccard search
+
+    Each entry's token set is computed once on insert. Queries use prefix
+    filtering: an entry can only reach Jaccard >= t if it shares at least one
+    of the query's ``q - ceil(t * q) + 1`` rarest tokens, so only those
+    posting lists are touched before the exact score is verified.
+    """
+
+    def __init__(self):
+        self.postings: Dict[str, set] = {}
+        self.token_sets: Dict[str, frozenset] = {}
+
+    def __len__(self) -> int:
+        return len(self.token_sets)
+
+    def add(self, key: str, prompt: str):
+        if key in self.token_sets:
+            self.remove(key)
+        tokens = _tokenize(prompt)
+        self.token_sets[key] = tokens
+        for token in tokens:
+            self.postings.setdefault(token, set()).add(key)
+
+    def remove(self, key: str):
+        tokens = self.token_sets.pop(key, None)
+        if not tokens:
+            return
+        for token in tokens:
+            keys = self.postings.get(token)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self.postings[token]
+
+    def clear(self):
+        self.postings.clear()
+        self.token_sets.clear()
+
+    def query(self, prompt: str, threshold: float, limit: Optional[int] = None) -> List[Tuple[str, float]]:
+        """Return (key, jaccard) pairs with similarity >= threshold, best first"""
+        query_tokens = _tokenize(prompt)
+        q = len(query_tokens)
+        if q == 0:
+            return []
+
+        if threshold > 0:
+            # Rarest tokens first keeps the candidate set as small as possible
+            ordered = sorted(query_tokens, key=lambda t: len(self.postings.get(t, ())))
+            probe = ordered[:q - math.ceil(threshold * q - 1e-9) + 1]
+            min_size, max_size = threshold * q, q / threshold
+        else:
+            probe = query_tokens
+            min_size, max_size = 0, float('inf')
+
+        candidates = set()
+        for token in probe:
+            candidates.update(self.postings.get(token, ()))
+
+        results = []
+        for key in candidates:
+            tokens = self.token_sets[key]
+            size = len(tokens)
+            if size < min_size or size > max_size:
+                continue
+            overlap = len(query_tokens & tokens)
+            similarity = overlap / (q + size - overlap)
+            if similarity >= threshold:
+                results.append((key, similarity))
+
+        results.sort(key=lambda item: item[1], reverse=True)
+        return results[:limit] if limit else results
+
+    def query_many(self, prompts: List[str], threshold: float,
+                   chunk_size: int = 4096) -> List[List[Tuple[str, float]]]:
+        """Exact Jaccard search for many prompts in one shared pass
+
+        Candidates from all queries are pooled and scored against every query
+        at once as a (queries x candidates) intersection matrix product over
+        the query vocabulary. Without NumPy this falls back to per-prompt
+        queries.
+        """
+        if np is None or len(prompts) < 2 or threshold <= 0:
+            return [self.query(p, threshold) for p in prompts]
+
+        queries = [_tokenize(p) for p in prompts]
+        vocab: Dict[str, int] = {}
+        for tokens in queries:
+            for token in tokens:
+                vocab.setdefault(token, len(vocab))
+        if not vocab:
+            return [[] for _ in prompts]
+
+        candidates = set()
+        for tokens in queries:
+            q = len(tokens)
+            if not q:
+                continue
+            ordered = sorted(tokens, key=lambda t: len(self.postings.get(t, ())))
+            for token in ordered[:q - math.ceil(threshold * q - 1e-9) + 1]:
+                candidates.update(self.postings.get(token, ()))
+        candidates = list(candidates)
+
+        query_matrix = np.zeros((len(queries), len(vocab)), dtype=np.float32)
+        for row, tokens in enumerate(queries):
+            query_matrix[row, [vocab[t] for t in tokens]] = 1.0
+        query_sizes = query_matrix.sum(axis=1, dtype=np.float64)
+
+        results: List[List[Tuple[str, float]]] = [[] for _ in prompts]
+        for start in range(0, len(candidates), chunk_size):
+            chunk = candidates[start:start + chunk_size]
+            candidate_matrix = np.zeros((len(chunk), len(vocab)), dtype=np.float32)
+            candidate_sizes = np.empty(len(chunk), dtype=np.float64)
+            for row, key in enumerate(chunk):
+                tokens = self.token_sets[key]
+                candidate_sizes[row] = len(tokens)
+                columns = [vocab[t] for t in tokens if t in vocab]
+                if columns:
+                    candidate_matrix[row, columns] = 1.0
+
+            overlap = (query_matrix @ candidate_matrix.T).astype(np.float64)
+            similarity = overlap / (query_sizes[:, None] + candidate_sizes[None, :] - overlap)
+            for row, col in zip(*np.nonzero(similarity >= threshold)):
+                results[row].append((chunk[col], float(similarity[row, col])))
+
+        for matches in results:
+            matches.sort(key=lambda item: item[1], reverse=True)
+        return results
+
+class MinHashLSH:
+    """MinHash signatures with banded LSH buckets for approximate Jaccard search
+
+    With ``bands`` bands of ``rows`` rows each, two prompts with Jaccard ``s``
+    collide in at least one bucket with probability ``1 - (1 - s**rows)**bands``.
+    The S-curve threshold sits near ``(1 / bands) ** (1 / rows)``: more rows
+    raise precision, more bands raise recall.
+    """
+
+    MERSENNE_PRIME = (1 << 61) - 1
+    MAX_HASH = (1 << 32) - 1
+
+    def __init__(self, bands: int = 16, rows: int = 4, seed: int = 1):
+        self.bands = bands
+        self.rows = rows
+        self.num_perm = bands * rows
+        self.seed = seed
+        rng = random.Random(seed)
+        self._perms = [
+            (rng.randint(1, self.MERSENNE_PRIME - 1), rng.randint(0, self.MERSENNE_PRIME - 1))
+            for _ in range(self.num_perm)
+        ]
+        self.signatures: Dict[str, array] = {}
+        self.buckets: List[Dict[bytes, set]] = [{} for _ in range(bands)]
+        self.dirty = False
+
+    def __len__(self) -> int:
+        return len(self.signatures)
+
+    def signature(self, tokens: frozenset) -> array:
+        """Compute the MinHash signature of a token set"""
+        if not tokens:
+            return array('I', [self.MAX_HASH] * self.num_perm)
+        hashed = [int.from_bytes(hashlib.blake2b(t.encode(), digest_size=4).digest(), 'little') for t in tokens]
+        prime, max_hash = self.MERSENNE_PRIME, self.MAX_HASH
+        return array('I', [
+            min(((a * x + b) % prime) & max_hash for x in hashed)
+            for a, b in self._perms
+        ])
+
+    def _band_keys(self, signature: array) -> List[bytes]:
+        raw = signature.tobytes()
+        width = self.rows * signature.itemsize
+        return [raw[i * width:(i + 1) * width] for i in range(self.bands)]
+
+    def add(self, key: str, tokens: frozenset, signature: Optional[array] = None):
+        if key in self.signatures:
+            self.remove(key)
+        signature = signature if signature is not None else self.signature(tokens)
+        self.signatures[key] = signature
+        for band, band_key in zip(self.buckets, self._band_keys(signature)):
+            band.setdefault(band_key, set()).add(key)
+        self.dirty = True
+
+    def remove(self, key: str):
+        signature = self.signatures.pop(key, None)
+        if signature is None:
+            return
+        for band, band_key in zip(self.buckets, self._band_keys(signature)):
+            keys = band.get(band_key)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del band[band_key]
+        self.dirty = True
+
+    def clear(self):
+        self.signatures.clear()
+        self.buckets = [{} for _ in range(self.bands)]
+        self.dirty = True
+
+    def candidates(self, tokens: frozenset) -> Tuple[array, set]:
+        """Return the query signature and all keys sharing at least one bucket"""
+        signature = self.signature(tokens)
+        found = set()
+        for band, band_key in zip(self.buckets, self._band_keys(signature)):
+            found.update(band.get(band_key, ()))
+        return signature, found
+
+    def estimate(self, signature: array, key: str) -> float:
+        """Estimate Jaccard similarity from the fraction of equal MinHash slots"""
+        other = self.signatures[key]
+        return sum(1 for a, b in zip(signature, other) if a == b) / self.num_perm
+
+    def save(self, path: Path):
+        """Persist signatures (buckets are rebuilt from them on load)"""
+        data = {
+            'bands': self.bands,
+            'rows': self.rows,
+            'seed': self.seed,
+            'signatures': {k: base64.b64encode(sig.tobytes()).decode() for k, sig in self.signatures.items()}
+        }
+        tmp_path = path.with_suffix(path.suffix + '.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump(data, f)
+        tmp_path.replace(path)
+        self.dirty = False
+
+    def load(self, path: Path) -> Dict[str, array]:
+        """Load persisted signatures if they were built with the same parameters"""
+        if not path.exists():
+            return {}
+        try:
+            with open(path, 'r') as f:
+                data = json.load(f)
+        except Exception as e:
+            print(f"Warning: Could not load LSH index: {e}", file=sys.stderr)
+            return {}
+        if (data.get('bands'), data.get('rows'), data.get('seed')) != (self.bands, self.rows, self.seed):
+            return {}
+        signatures = {}
+        for key, encoded in data.get('signatures', {}).items():
+            sig = array('I')
+            sig.frombytes(base64.b64decode(encoded))
+            signatures[key] = sig
+        return signatures
+
+class HashedNgramEmbedder:
+    """Local embedding function: hashed word and character n-gram counts
+
+    Words and their character trigrams are hashed (with a random sign, to
+    keep collisions unbiased) into a fixed number of dimensions and the
+    vector is L2-normalized. Trigrams make inflected forms and word order
+    changes land close together, which plain word Jaccard misses. No model
+    download or network access is needed.
+    """
+
+    def __init__(self, dim: int = 512, ngram: int = 3):
+        self.dim = dim
+        self.ngram = ngram
+        self.name = f"hashed-ngram-{dim}-{ngram}"
+
+    def _features(self, text: str) -> List[str]:
+        words = [w.strip('.,;:!?()[]{}"\'`') for w in text.lower().split()]
+        features = []
+        for word in words:
+            if not word:
+                continue
+            features.append(word)
+            padded = f"#{word}#"
+            features.extend(padded[i:i + self.ngram] for i in range(len(padded) - self.ngram + 1))
+        return features
+
+    def __call__(self, text: str) -> List[float]:
+        vector = [0.0] * self.dim
+        for feature in self._features(text):
+            h = int.from_bytes(hashlib.blake2b(feature.encode(), digest_size=8).digest(), 'little')
+            vector[h % self.dim] += 1.0 if (h >> 63) & 1 else -1.0
+        norm = math.sqrt(sum(v * v for v in vector))
+        return [v / norm for v in vector] if norm else vector
+
+class SemanticIndex:
+    """Cosine top-k search over prompt embeddings
+
+    With NumPy, embeddings live in one float32 matrix and a query is a single
+    matrix-vector product; without it a pure-Python dot product is used.
+    Removal swaps the last row into the freed slot, so it is O(dim).
+    """
+
+    def __init__(self, embedder: Callable[[str], Sequence[float]]):
+        self.embedder = embedder
+        self.name = getattr(embedder, 'name', None)
+        self.keys: List[str] = []
+        self.positions: Dict[str, int] = {}
+        self._rows: Any = None  # np.ndarray (capacity x dim) or list of lists
+        self.dirty = False
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def _embed(self, text: str) -> Any:
+        vector = self.embedder(text)
+        if np is not None:
+            vector = np.asarray(vector, dtype=np.float32)
+            norm = float(np.linalg.norm(vector))
+            return vector / norm if norm else vector
+        norm = math.sqrt(sum(v * v for v in vector))
+        return [v / norm for v in vector] if norm else list(vector)
+
+    def _append_row(self, vector: Any):
+        if np is None:
+            if self._rows is None:
+                self._rows = []
+            self._rows.append(vector)
+            return
+        if self._rows is None:
+            self._rows = np.zeros((64, len(vector)), dtype=np.float32)
+        elif len(self.keys) >= self._rows.shape[0]:
+            grown = np.zeros((self._rows.shape[0] * 2, self._rows.shape[1]), dtype=np.float32)
+            grown[:self._rows.shape[0]] = self._rows
+            self._rows = grown
+        self._rows[len(self.keys)] = vector
+
+    def add(self, key: str, text: str, vector: Any = None):
+        if key in self.positions:
+            self.remove(key)
+        self._append_row(vector if vector is not None else self._embed(text))
+        self.positions[key] = len(self.keys)
+        self.keys.append(key)
+        self.dirty = True
+
+    def remove(self, key: str):
+        position = self.positions.pop(key, None)
+        if position is None:
+            return
+        last = len(self.keys) - 1
+        if position != last:
+            moved = self.keys[last]
+            self._rows[position] = self._rows[last]
+            self.keys[position] = moved
+            self.positions[moved] = position
+        self.keys.pop()
+        if np is None:
+            self._rows.pop()
+        self.dirty = True
+
+    def clear(self):
+        self.keys.clear()
+        self.positions.clear()
+        self._rows = None
+        self.dirty = True
+
+    def query(self, text: str, threshold: float, limit: int = 5) -> List[Tuple[str, float]]:
+        """Return up to ``limit`` (key, cosine) pairs at or above threshold, best first"""
+        if not self.keys:
+            return []
+        vector = self._embed(text)
+        count = len(self.keys)
+
+        if np is not None:
+            scores = self._rows[:count] @ vector
+            if count > limit:
+                top = np.argpartition(-scores, limit)[:limit]
+            else:
+                top = np.arange(count)
+            results = [(self.keys[i], float(scores[i])) for i in top if scores[i] >= threshold]
+        else:
+            results = []
+            for key, row in zip(self.keys, self._rows):
+                score = sum(a * b for a, b in zip(row, vector))
+                if score >= threshold:
+                    results.append((key, score))
+
+        results.sort(key=lambda item: item[1], reverse=True)
+        return results[:limit]
+
+    def query_many(self, texts: List[str], threshold: float, limit: int = 5) -> List[List[Tuple[str, float]]]:
+        """Batched cosine top-k: one (entries x queries) matrix product"""
+        if np is None or len(texts) < 2 or not self.keys:
+            return [self.query(text, threshold, limit) for text in texts]
+
+        count = len(self.keys)
+        vectors = np.stack([self._embed(text) for text in texts])
+        scores = self._rows[:count] @ vectors.T
+        results = []
+        for column in range(len(texts)):
+            column_scores = scores[:, column]
+            if count > limit:
+                top = np.argpartition(-column_scores, limit)[:limit]
+            else:
+                top = np.arange(count)
+            matches = [(self.keys[i], float(column_scores[i])) for i in top if column_scores[i] >= threshold]
+            matches.sort(key=lambda item: item[1], reverse=True)
+            results.append(matches)
+        return results
+
+    def save(self, path: Path):
+        """Persist embeddings (NumPy only, named embedders only)"""
+        if np is None or self.name is None:
+            return
+        count = len(self.keys)
+        tmp_path = path.with_name(path.name + '.tmp.npz')
+        np.savez(tmp_path, keys=np.array(self.keys), rows=self._rows[:count] if count else np.zeros((0, 0)),
+                 name=np.array(self.name))
+        tmp_path.replace(path)
+        self.dirty = False
+
+    def load(self, path: Path) -> Dict[str, Any]:
+        """Return persisted key -> embedding for the same embedder, if any"""
+        if np is None or self.name is None or not path.exists():
+            return {}
+        try:
+            with np.load(path) as data:
+                if str(data['name']) != self.name:
+                    return {}
+                return dict(zip(data['keys'].tolist(), data['rows']))
+        except Exception as e:
+            print(f"Warning: Could not load semantic index: {e}", file=sys.stderr)
+            return {}
+
+class CountingBloomFilter:
+    """Counting Bloom filter over prompt tokens (shingles)
+
+    8-bit saturating counters allow removal when entries are evicted. It
+    answers "might any cached prompt contain this token?" without touching
+    the index, so misses that share too few tokens with every cached prompt
+    can be rejected up front. False positives only make the check more
+    conservative.
+    """
+
+    def __init__(self, capacity: int = 50000, error_rate: float = 0.01):
+        self.size = max(int(-capacity * math.log(error_rate) / (math.log(2) ** 2)), 8)
+        self.hash_count = max(int(round(self.size / capacity * math.log(2))), 1)
+        self.counters = bytearray(self.size)
+        self.dirty = False
+
+    def _positions(self, item: str) -> List[int]:
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hash_count)]
+
+    def add(self, items: frozenset):
+        for item in items:
+            for pos in self._positions(item):
+                if self.counters[pos] < 255:
+                    self.counters[pos] += 1
+        self.dirty = True
+
+    def remove(self, items: frozenset):
+        for item in items:
+            for pos in self._positions(item):
+                # Saturated counters are never decremented (their true count is unknown)
+                if 0 < self.counters[pos] < 255:
+                    self.counters[pos] -= 1
+        self.dirty = True
+
+    def __contains__(self, item: str) -> bool:
+        return all(self.counters[pos] for pos in self._positions(item))
+
+    def fill_ratio(self) -> float:
+        """Share of counters that are non-zero"""
+        return (self.size - self.counters.count(0)) / self.size
+
+    def estimated_fp_rate(self, items: Optional[int] = None) -> float:
+        """False-positive rate (1 - e^(-kn/m))^k for n distinct items
+
+        Without ``items``, n is estimated from the fill ratio as
+        -(m/k) * ln(1 - fill).
+        """
+        if items is None:
+            fill = self.fill_ratio()
+            if fill >= 1.0:
+                return 1.0
+            items = -self.size / self.hash_count * math.log(1.0 - fill)
+        return (1.0 - math.exp(-self.hash_count * items / self.size)) ** self.hash_count
+
+    def clear(self):
+        self.counters = bytearray(self.size)
+        self.dirty = True
+
+    def save(self, path: Path, fingerprint: str):
+        header = json.dumps({'size': self.size, 'hash_count': self.hash_count,
+                             'fingerprint': fingerprint}).encode()
+        tmp_path = path.with_name(path.name + '.tmp')
+        with open(tmp_path, 'wb') as f:
+            f.write(struct.pack('>I', len(header)) + header + bytes(self.counters))
+        tmp_path.replace(path)
+        self.dirty = False
+
+    def load(self, path: Path, fingerprint: str) -> bool:
+        """Load persisted counters if they were built from the same entries"""
+        if not path.exists():
+            return False
+        try:
+            with open(path, 'rb') as f:
+                (header_size,) = struct.unpack('>I', f.read(4))
+                header = json.loads(f.read(header_size))
+                counters = f.read()
+        except Exception as e:
+            print(f"Warning: Could not load Bloom filter: {e}", file=sys.stderr)
+            return False
+        if (header['size'], header['hash_count'], header['fingerprint']) != (self.size, self.hash_count, fingerprint):
+            return False
+        self.counters = bytearray(counters)
+        self.dirty = False
+        return True
+
+class NegativeCache:
+    """Short-lived memory of recent misses, keyed by lookup hash
+
+    Any store can turn an earlier miss into a hit, so callers must
+    ``invalidate()`` it whenever an entry is added.
+    """
+
+    def __init__(self, ttl_seconds: float = 60.0, max_entries: int = 10000):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._misses: OrderedDict = OrderedDict()  # key -> expiry (monotonic)
+
+    def __contains__(self, key: str) -> bool:
+        expiry = self._misses.get(key)
+        if expiry is None:
+            return False
+        if expiry < time.monotonic():
+            del self._misses[key]
+            return False
+        return True
+
+    def add(self, key: str):
+        self._misses[key] = time.monotonic() + self.ttl_seconds
+        self._misses.move_to_end(key)
+        while len(self._misses) > self.max_entries:
+            self._misses.popitem(last=False)
+
+    def invalidate(self):
+        self._misses.clear()
+
+class LatencyHistogram:
+    """HDR-style log-linear latency histogram (microsecond resolution)
+
+    Values are bucketed by power of two, with SUB_BUCKETS linear
+    sub-buckets per power, so every recorded value keeps about 6% relative
+    precision at a few hundred buckets regardless of range. Histograms
+    are plain counts, so they can be merged across runs by adding.
+    """
+
+    SUB_BUCKETS = 16
+
+    def __init__(self, counts: Optional[Dict[int, int]] = None):
+        self.counts: Dict[int, int] = dict(counts or {})
+
+    @classmethod
+    def _index(cls, micros: int) -> int:
+        if micros < cls.SUB_BUCKETS:
+            return micros
+        exponent = micros.bit_length() - 1
+        shift = exponent - int(math.log2(cls.SUB_BUCKETS))
+        return (shift + 1) * cls.SUB_BUCKETS + ((micros >> shift) - cls.SUB_BUCKETS)
+
+    @classmethod
+    def _upper_bound(cls, index: int) -> int:
+        """Largest microsecond value that falls into bucket ``index``"""
+        if index < cls.SUB_BUCKETS:
+            return index
+        shift = index // cls.SUB_BUCKETS - 1
+        sub = index % cls.SUB_BUCKETS + cls.SUB_BUCKETS
+        return ((sub + 1) << shift) - 1
+
+    def record(self, seconds: float):
+        index = self._index(max(int(seconds * 1e6), 0))
+        self.counts[index] = self.counts.get(index, 0) + 1
+
+    def merge(self, other: 'LatencyHistogram'):
+        for index, count in other.counts.items():
+            self.counts[index] = self.counts.get(index, 0) + count
+
+    @property
+    def total(self) -> int:
+        return sum(self.counts.values())
+
+    def percentile(self, pct: float) -> float:
+        """Upper bound of the bucket holding the pct-th percentile, in ms"""
+        total = self.total
+        if not total:
+            return 0.0
+        rank = max(math.ceil(total * pct / 100), 1)
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= rank:
+                return self._upper_bound(index) / 1000
+        return 0.0
+
+    def summary(self) -> Dict[str, float]:
+        return {
+            'count': self.total,
+            'p50_ms': self.percentile(50),
+            'p90_ms': self.percentile(90),
+            'p99_ms': self.percentile(99),
+            'max_ms': self.percentile(100),
+        }
+
+    def cumulative_buckets(self) -> List[Tuple[float, int]]:
+        """(upper bound in seconds, cumulative count) pairs for Prometheus"""
+        buckets = []
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            buckets.append(((self._upper_bound(index) + 1) / 1e6, seen))
+        return buckets
+
+class CacheMetrics:
+    """Real cache counters and latency histograms, persisted across runs
+
+    Totals are the persisted snapshot plus this session's deltas. save()
+    re-reads metrics.json under a file lock and adds only the session deltas,
+    so concurrent processes do not overwrite each other's counts.
+    """
+
+    COUNTERS = (
+        'exact_hits', 'context_hits', 'similarity_hits', 'semantic_hits', 'misses',
+        'evictions_capacity', 'evictions_expired', 'evictions_low_quality',
+        'prechecked_negative_cache', 'prechecked_bloom',
+        'coalesced_requests', 'stale_served',
+        'admission_admitted', 'admission_rejected', 'admission_rejected_bytes',
+        'bytes_read', 'bytes_written', 'dollars_saved', 'tokens_saved',
+    )
+    HISTOGRAMS = ('lookup', 'similarity_scan', 'save')
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.lock_file = path.with_name(path.name + '.lock')
+        self.persisted = self._empty()
+        self.session = self._empty()
+        self._lock = threading.Lock()
+        self.persisted = self._read()
+
+    def _empty(self) -> Dict[str, Any]:
+        return {
+            'counters': {name: 0 for name in self.COUNTERS},
+            'histograms': {name: LatencyHistogram() for name in self.HISTOGRAMS},
+        }
+
+    def _read(self, locked: bool = False) -> Dict[str, Any]:
+        data = self._empty()
+        if not self.path.exists():
+            return data
+        try:
+            if locked:
+                # Caller already holds the exclusive lock (flock is per open file)
+                with open(self.path, 'r') as f:
+                    raw = json.load(f)
+            else:
+                with _file_lock(self.lock_file, shared=True):
+                    with open(self.path, 'r') as f:
+                        raw = json.load(f)
+        except Exception as e:
+            print(f"Warning: Could not load cache metrics: {e}", file=sys.stderr)
+            return data
+        data['counters'].update(raw.get('counters', {}))
+        for name, counts in raw.get('histograms', {}).items():
+            data['histograms'][name] = LatencyHistogram({int(k): v for k, v in counts.items()})
+        return data
+
+    def inc(self, name: str, value: float = 1):
+        with self._lock:
+            self.session['counters'][name] += value
+
+    def observe(self, name: str, seconds: float):
+        with self._lock:
+            self.session['histograms'][name].record(seconds)
+
+    @contextmanager
+    def timer(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start)
+
+    def counter(self, name: str) -> float:
+        return self.persisted['counters'].get(name, 0) + self.session['counters'].get(name, 0)
+
+    def histogram(self, name: str) -> LatencyHistogram:
+        merged = LatencyHistogram(self.persisted['histograms'][name].counts)
+        merged.merge(self.session['histograms'][name])
+        return merged
+
+    def save(self):
+        """Add this session's deltas to metrics.json"""
+        with self._lock:
+            session, self.session = self.session, self._empty()
+        try:
+            with _file_lock(self.lock_file):
+                current = self._read(locked=True)
+                for name, value in session['counters'].items():
+                    current['counters'][name] = current['counters'].get(name, 0) + value
+                for name, histogram in session['histograms'].items():
+                    current['histograms'][name].merge(histogram)
+                _atomic_write_json(self.path, {
+                    'counters': current['counters'],
+                    'histograms': {name: h.counts for name, h in current['histograms'].items()},
+                    'updated_at': datetime.now().isoformat(),
+                })
+            self.persisted = current
+        except Exception as e:
+            print(f"Error saving cache metrics: {e}", file=sys.stderr)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'counters': {name: self.counter(name) for name in self.COUNTERS},
+            'latency': {name: self.histogram(name).summary() for name in self.HISTOGRAMS},
+        }
+
+    def to_prometheus(self, prefix: str = 'ai_cache') -> str:
+        """Render counters and histograms in the Prometheus text format"""
+        lines = []
+        for name in self.COUNTERS:
+            metric = f"{prefix}_{name}_total"
+            lines.append(f"# TYPE {metric} counter")
+            lines.append(f"{metric} {self.counter(name)}")
+        for name in self.HISTOGRAMS:
+            metric = f"{prefix}_{name}_seconds"
+            histogram = self.histogram(name)
+            lines.append(f"# TYPE {metric} histogram")
+            for bound, count in histogram.cumulative_buckets():
+                lines.append(f'{metric}_bucket{{le="{bound:.6f}"}} {count}')
+            lines.append(f'{metric}_bucket{{le="+Inf"}} {histogram.total}')
+            lines.append(f"{metric}_count {histogram.total}")
+        return "\n".join(lines) + "\n"
+
+def _response_size(response: CachedResponse) -> int:
+    """Body size without loading a blob-backed response"""
+    return response.response_size if response.response_ref else len(response.response)
+
+class EvictionPolicy:
+    """Base class for capacity eviction policies
+
+    Policies see every insert, access and removal so that choosing a
+    victim never requires scanning or sorting the whole cache.
+    """
+
+    name = 'base'
+
+    def record_insert(self, response: CachedResponse):
+        raise NotImplementedError
+
+    def record_access(self, response: CachedResponse):
+        raise NotImplementedError
+
+    def remove(self, key: str):
+        raise NotImplementedError
+
+    def pop_victim(self) -> Optional[str]:
+        """Remove and return the key that should be evicted next"""
+        raise NotImplementedError
+
+    def peek_victim(self) -> Optional[str]:
+        """Return the key that would be evicted next, without removing it"""
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+class LRUEvictionPolicy(EvictionPolicy):
+    """Least recently used, O(1) via an ordered linked hash map"""
+
+    name = 'lru'
+
+    def __init__(self):
+        self._order: OrderedDict = OrderedDict()
+
+    def record_insert(self, response: CachedResponse):
+        self._order[response.prompt_hash] = None
+        self._order.move_to_end(response.prompt_hash)
+
+    def record_access(self, response: CachedResponse):
+        if response.prompt_hash in self._order:
+            self._order.move_to_end(response.prompt_hash)
+
+    def remove(self, key: str):
+        self._order.pop(key, None)
+
+    def pop_victim(self) -> Optional[str]:
+        if not self._order:
+            return None
+        key, _ = self._order.popitem(last=False)
+        return key
+
+    def peek_victim(self) -> Optional[str]:
+        return next(iter(self._order), None)
+
+    def clear(self):
+        self._order.clear()
+
+class HeapEvictionPolicy(EvictionPolicy):
+    """Min-heap of priorities with lazy invalidation, O(log n) per update
+
+    Superseded heap items are skipped when popped; the heap is rebuilt once
+    stale items outnumber live ones so memory stays bounded.
+    """
+
+    def __init__(self):
+        self._heap: List[Tuple[float, int, str]] = []
+        self._live: Dict[str, int] = {}  # key -> sequence number of its current heap item
+        self._seq = 0
+
+    def priority(self, response: CachedResponse) -> Any:
+        """Lower priority is evicted first"""
+        raise NotImplementedError
+
+    def _push(self, response: CachedResponse):
+        self._seq += 1
+        self._live[response.prompt_hash] = self._seq
+        heapq.heappush(self._heap, (self.priority(response), self._seq, response.prompt_hash))
+        if len(self._heap) > 2 * len(self._live) + 64:
+            self._heap = [item for item in self._heap if self._live.get(item[2]) == item[1]]
+            heapq.heapify(self._heap)
+
+    def record_insert(self, response: CachedResponse):
+        self._push(response)
+
+    def record_access(self, response: CachedResponse):
+        if response.prompt_hash in self._live:
+            self._push(response)
+
+    def remove(self, key: str):
+        self._live.pop(key, None)
+
+    def _pop(self) -> Optional[Tuple[Any, str]]:
+        while self._heap:
+            priority, seq, key = heapq.heappop(self._heap)
+            if self._live.get(key) == seq:
+                del self._live[key]
+                return priority, key
+        return None
+
+    def pop_victim(self) -> Optional[str]:
+        popped = self._pop()
+        return popped[1] if popped else None
+
+    def peek_victim(self) -> Optional[str]:
+        # Drop superseded items from the top so heap[0] is the live minimum
+        while self._heap and self._live.get(self._heap[0][2]) != self._heap[0][1]:
+            heapq.heappop(self._heap)
+        return self._heap[0][2] if self._heap else None
+
+    def clear(self):
+        self._heap.clear()
+        self._live.clear()
+
+class LFUEvictionPolicy(HeapEvictionPolicy):
+    """Least frequently used, ties broken by recency"""
+
+    name = 'lfu'
+
+    def priority(self, response: CachedResponse) -> Any:
+        return (response.access_count, response.last_accessed_ts)
+
+class TTLEvictionPolicy(HeapEvictionPolicy):
+    """Evict the entries closest to expiry (oldest creation time) first"""
+
+    name = 'ttl'
+
+    def priority(self, response: CachedResponse) -> Any:
+        return response.created_ts
+
+class GreedyDualSizePolicy(HeapEvictionPolicy):
+    """Cost-aware GreedyDual-Size-Frequency
+
+    H = L + frequency * value / size, where value is the dollar cost of
+    regenerating the response (plus a small per-token weight so free
+    responses still rank by tokens_used) and size is the stored kilobytes.
+    L is raised to the H of each evicted entry, which ages out entries that
+    were valuable once but are no longer accessed.
+    """
+
+    name = 'gdsf'
+
+    def __init__(self, token_value: float = 1e-6):
+        super().__init__()
+        self.token_value = token_value
+        self.inflation = 0.0
+
+    def priority(self, response: CachedResponse) -> Any:
+        value = response.cost + response.tokens_used * self.token_value
+        size_kb = max((len(response.prompt) + _response_size(response)) / 1024, 1.0)
+        return self.inflation + response.access_count * value / size_kb
+
+    def pop_victim(self) -> Optional[str]:
+        popped = self._pop()
+        if popped is None:
+            return None
+        self.inflation = popped[0]
+        return popped[1]
+
+    def clear(self):
+        super().clear()
+        self.inflation = 0.0
+
+EVICTION_POLICIES = {
+    'lru': LRUEvictionPolicy,
+    'lfu': LFUEvictionPolicy,
+    'ttl': TTLEvictionPolicy,
+    'gdsf': GreedyDualSizePolicy,
+}
+
+class ExpiryIndex:
+    """Min-heap of entry expiry times (epoch seconds) with lazy invalidation
+
+    Uses the same scheme as HeapEvictionPolicy: replaced or removed keys
+    leave stale heap items that are skipped when they surface, and the heap
+    is compacted once stale items outnumber live ones. Finding what is due
+    costs O(log n) per expired entry instead of a walk over the cache.
+    """
+
+    def __init__(self):
+        self._heap: List[Tuple[float, int, str]] = []
+        self._live: Dict[str, int] = {}  # key -> sequence number of its current heap item
+        self._seq = 0
+
+    def __len__(self) -> int:
+        return len(self._live)
+
+    def add(self, key: str, expires_at: float):
+        self._seq += 1
+        self._live[key] = self._seq
+        heapq.heappush(self._heap, (expires_at, self._seq, key))
+        if len(self._heap) > 2 * len(self._live) + 64:
+            self._heap = [item for item in self._heap if self._live.get(item[2]) == item[1]]
+            heapq.heapify(self._heap)
+
+    def remove(self, key: str):
+        self._live.pop(key, None)
+
+    def _discard_stale(self):
+        while self._heap and self._live.get(self._heap[0][2]) != self._heap[0][1]:
+            heapq.heappop(self._heap)
+
+    def next_due(self) -> Optional[float]:
+        """Earliest expiry time, or None when nothing is tracked"""
+        self._discard_stale()
+        return self._heap[0][0] if self._heap else None
+
+    def pop_due(self, now: float, limit: Optional[int] = None) -> List[str]:
+        """Remove and return the keys that expired at or before now"""
+        due = []
+        while limit is None or len(due) < limit:
+            self._discard_stale()
+            if not self._heap or self._heap[0][0] > now:
+                break
+            _, _, key = heapq.heappop(self._heap)
+            del self._live[key]
+            due.append(key)
+        return due
+
+    def clear(self):
+        self._heap.clear()
+        self._live.clear()
+
+class FrequencySketch:
+    """Count-min sketch of recent access frequencies (the TinyLFU histogram)
+
+    4-bit saturating counters, depth rows of width counters each. After
+    sample_factor * width increments every counter is halved, so the
+    estimates follow recent popularity rather than all-time totals.
+    """
+
+    MAGIC = b'AICFS001'
+    HEADER = struct.Struct('>8sIIQ')
+    SEEDS = (0x9E3779B97F4A7C15, 0xC2B2AE3D27D4EB4F, 0x165667B19E3779F9, 0xD6E8FEB86659FD93)
+    _HALVE = bytes(i >> 1 for i in range(256))
+
+    def __init__(self, width: int = 1 << 16, depth: int = 4, sample_factor: int = 10):
+        if width & (width - 1) or not 1 <= depth <= len(self.SEEDS):
+            raise ValueError("width must be a power of two and depth at most 4")
+        self.width = width
+        self.depth = depth
+        self.shift = 64 - width.bit_length() + 1
+        self.sample_size = sample_factor * width
+        self.table = bytearray(width * depth)
+        self.additions = 0
+        self.dirty = False
+
+    def _indexes(self, key: str) -> List[int]:
+        h = int(key[:16], 16)
+        return [row * self.width + (((h * self.SEEDS[row]) & 0xFFFFFFFFFFFFFFFF) >> self.shift)
+                for row in range(self.depth)]
+
+    def increment(self, key: str):
+        for index in self._indexes(key):
+            if self.table[index] < 15:
+                self.table[index] += 1
+        self.additions += 1
+        if self.additions >= self.sample_size:
+            self.table = bytearray(self.table.translate(self._HALVE))
+            self.additions //= 2
+        self.dirty = True
+
+    def estimate(self, key: str) -> int:
+        return min(self.table[index] for index in self._indexes(key))
+
+    def save(self, path: Path):
+        tmp_path = path.with_name(path.name + '.tmp')
+        with open(tmp_path, 'wb') as f:
+            f.write(self.HEADER.pack(self.MAGIC, self.width, self.depth, self.additions) + bytes(self.table))
+        tmp_path.replace(path)
+        self.dirty = False
+
+    def load(self, path: Path) -> bool:
+        if not path.exists():
+            return False
+        try:
+            with open(path, 'rb') as f:
+                magic, width, depth, additions = self.HEADER.unpack(f.read(self.HEADER.size))
+                table = f.read()
+        except Exception as e:
+            print(f"Warning: Could not load frequency sketch: {e}", file=sys.stderr)
+            return False
+        if (magic, width, depth, len(table)) != (self.MAGIC, self.width, self.depth, self.width * self.depth):
+            return False
+        self.table = bytearray(table)
+        self.additions = additions
+        self.dirty = False
+        return True
+
+class AdmissionPolicy:
+    """Base class for admission policies: does a new entry deserve a slot?
+
+    Every lookup is reported through record_access(); admit() sees the
+    candidate and, when the cache is full, the entry eviction would remove
+    to make room for it.
+    """
+
+    name = 'base'
+
+    def record_access(self, key: str):
+        pass
+
+    def admit(self, entry: CachedResponse, victim: Optional[CachedResponse]) -> bool:
+        raise NotImplementedError
+
+    def save(self, path: Path):
+        pass
+
+    def load(self, path: Path):
+        pass
+
+class AlwaysAdmitPolicy(AdmissionPolicy):
+    """Admit everything (capacity is left to the eviction policy)"""
+
+    name = 'always'
+
+    def admit(self, entry: CachedResponse, victim: Optional[CachedResponse]) -> bool:
+        return True
+
+class ThresholdAdmissionPolicy(AdmissionPolicy):
+    """Reject entries below fixed quality, cost or token thresholds
+
+    The default quality floor matches the low-quality cleanup rule, so such
+    entries are no longer written only to be deleted again.
+    """
+
+    name = 'threshold'
+
+    def __init__(self, min_quality: float = 0.3, min_cost: float = 0.0, min_tokens: int = 0):
+        self.min_quality = min_quality
+        self.min_cost = min_cost
+        self.min_tokens = min_tokens
+
+    def admit(self, entry: CachedResponse, victim: Optional[CachedResponse]) -> bool:
+        if entry.quality_score is not None and entry.quality_score < self.min_quality:
+            return False
+        return entry.cost >= self.min_cost and entry.tokens_used >= self.min_tokens
+
+class TinyLFUAdmissionPolicy(ThresholdAdmissionPolicy):
+    """Thresholds plus a cost-weighted TinyLFU duel with the eviction victim
+
+    When the cache is full, the candidate is admitted only if
+    (recent frequency + 1) * value is at least the victim's (a tie goes to
+    the newer entry, so a full cache of equals still turns over), where value is the
+    regeneration cost in dollars plus a small per-token weight. One-off cheap
+    answers therefore cannot push out expensive, frequently reused ones.
+    """
+
+    name = 'tinylfu'
+
+    def __init__(self, token_value: float = 1e-6, **thresholds):
+        super().__init__(**thresholds)
+        self.token_value = token_value
+        self.sketch = FrequencySketch()
+
+    def record_access(self, key: str):
+        self.sketch.increment(key)
+
+    def _score(self, response: CachedResponse) -> float:
+        value = response.cost + response.tokens_used * self.token_value
+        return (self.sketch.estimate(response.prompt_hash) + 1) * value
+
+    def admit(self, entry: CachedResponse, victim: Optional[CachedResponse]) -> bool:
+        if not super().admit(entry, victim):
+            return False
+        return victim is None or self._score(entry) >= self._score(victim)
+
+    def save(self, path: Path):
+        if self.sketch.dirty:
+            self.sketch.save(path)
+
+    def load(self, path: Path):
+        self.sketch.load(path)
+
+ADMISSION_POLICIES = {
+    'always': AlwaysAdmitPolicy,
+    'threshold': ThresholdAdmissionPolicy,
+    'tinylfu': TinyLFUAdmissionPolicy,
+}
+
+class AICache:
+    """Intelligent AI response caching system"""
+
+    # Snapshot: gzip'd text, a JSON header line, then one "<sha256> <json>" line
+    # per entry (self-contained: blob bodies inlined), then a JSON trailer with
+    # the entry count and a digest over all entry hashes
+    SNAPSHOT_FORMAT = 'ai-cache-snapshot'
+    SNAPSHOT_VERSION = 1
+
+    # on_conflict rules for import: should the snapshot entry replace ours?
+    SNAPSHOT_CONFLICT_RULES = {
+        'quality': lambda current, incoming: (
+            (incoming.quality_score if incoming.quality_score is not None else -1.0, incoming.created_ts) >
+            (current.quality_score if current.quality_score is not None else -1.0, current.created_ts)),
+        'newest': lambda current, incoming: incoming.created_ts > current.created_ts,
+        'keep': lambda current, incoming: False,
+        'replace': lambda current, incoming: True,
+    }
+
+    def __init__(self, project_root: Path, cache_dir: Optional[Path] = None,
+                 backend: str = 'sqlite', similarity_mode: str = 'exact',
+                 lsh_bands: int = 16, lsh_rows: int = 4, lsh_rerank: bool = False,
+                 eviction_policy: str = 'lfu', admission_policy: str = 'always',
+                 write_behind: bool = False,
+                 blob_threshold: Optional[int] = 2048, blob_codec: str = 'zlib',
+                 shards: Optional[int] = None, shard_backend: Optional[str] = None,
+                 semantic: bool = False,
+                 embedder: Optional[Callable[[str], Sequence[float]]] = None,
+                 lazy_load: bool = False):
+        self.project_root = project_root
+        self.cache_dir = cache_dir or project_root / '.ai' / 'cache'
+        self.cache_file = self.cache_dir / 'responses.json'
+        self.index_file = self.cache_dir / 'index.json'
+        self.lsh_file = self.cache_dir / 'minhash-lsh.json'
+        self.semantic_file = self.cache_dir / 'semantic-index.npz'
+        self.bloom_file = self.cache_dir / 'token-bloom.bin'
+
+        # Miss pre-checks: recent misses, and a Bloom filter of cached tokens
+        self.negative_cache = NegativeCache()
+        self.bloom = CountingBloomFilter()
+
+        # Similarity search: 'exact' (inverted index) or 'lsh' (MinHash buckets)
+        if similarity_mode not in ('exact', 'lsh'):
+            raise ValueError(f"Unknown similarity mode: {similarity_mode}")
+        self.similarity_mode = similarity_mode
+        self.lsh_rerank = lsh_rerank
+        self.lsh = MinHashLSH(bands=lsh_bands, rows=lsh_rows) if similarity_mode == 'lsh' else None
+
+        # Optional semantic tier, consulted after the lexical search misses
+        self.semantic = SemanticIndex(embedder or HashedNgramEmbedder()) if semantic else None
+
+        if eviction_policy not in EVICTION_POLICIES:
+            raise ValueError(f"Unknown eviction policy: {eviction_policy}")
+        self.eviction_policy = EVICTION_POLICIES[eviction_policy]()
+
+        if admission_policy not in ADMISSION_POLICIES:
+            raise ValueError(f"Unknown admission policy: {admission_policy}")
+        self.admission = ADMISSION_POLICIES[admission_policy]()
+
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.admission_file = self.cache_dir / 'admission-sketch.bin'
+        self.admission.load(self.admission_file)
+        self.metrics = CacheMetrics(self.cache_dir / 'metrics.json')
+
+        # Responses of at least blob_threshold bytes live in the blob store
+        # and are only read on a hit (None keeps every body inline)
+        self.blob_threshold = blob_threshold
+        self.blobs = BlobStore(self.cache_dir / 'blobs', codec=blob_codec)
+
+        self.storage = self._create_storage(backend, shards=shards, shard_backend=shard_backend)
+
+        # Expiry: max_age_days unless the entry's metadata ('ttl_days'), its
+        # task type or its model has an override (see _ttl_days)
+        self.expiry = ExpiryIndex()
+        self._max_age_days = 30  # Maximum age of cached responses
+        self.model_ttl_days: Dict[str, float] = {}
+        self.task_ttl_days: Dict[str, float] = {}
+        # Keys whose quality has not yet been checked by _cleanup_cache
+        self._quality_pending: List[str] = []
+
+        # With lazy_load, lookups are served by point reads from storage (see
+        # _cold_lookup) and the full in-memory state is only built once
+        # something else needs it
+        self._loaded = False
+        self._cold_indexes_cache = None
+        if not lazy_load:
+            self._ensure_loaded()
+
+        # All mutations go through self.writer: the backend itself
+        # (write-through) or a buffer flushed from a background thread
+        self.writer = WriteBehindBuffer(self.storage) if write_behind else self.storage
+        self._closed = False
+        atexit.register(self.close)
+
+        # Cache configuration
+        self.max_cache_size = 1000  # Maximum number of cached responses
+        self.similarity_threshold = 0.85  # Minimum similarity for cache hits
+        self.context_similarity_threshold = 0.9  # Minimum context chunk overlap for the same prompt
+        self.semantic_threshold = 0.8  # Minimum cosine similarity for semantic hits
+        # Minimum _content_overlap for a semantic hit. The local hashed n-gram
+        # embedder scores a swapped word ("pricing" for "payment") as high as
+        # a synonym, so by default every content word of the stored prompt
+        # must be in the query; with a model embedder that separates synonyms,
+        # lower it (e.g. to 0.5) so "order a list" can hit "sort a list".
+        # 0 disables the check.
+        self.semantic_min_overlap = 1.0
+        self.auto_cleanup_enabled = True
+
+    def _create_storage(self, backend: str, shards: Optional[int],
+                        shard_backend: Optional[str]) -> CacheStorage:
+        """Instantiate the storage backend, migrating legacy files once"""
+        if backend not in STORAGE_BACKENDS:
+            raise ValueError(f"Unknown cache backend: {backend}")
+
+        if backend == 'sharded':
+            storage = ShardedCacheStorage(self.cache_dir, shards=shards, shard_backend=shard_backend)
+            if storage.created:
+                self._migrate_into_shards(storage)
+            return storage
+
+        storage = STORAGE_BACKENDS[backend](self.cache_dir)
+        if isinstance(storage, SQLiteCacheStorage):
+            storage.migrate_from_json(JSONCacheStorage(self.cache_dir))
+        return storage
+
+    def _migrate_into_shards(self, storage: ShardedCacheStorage):
+        """Import a single-file SQLite or JSON cache into a new shard layout"""
+        db_file = self.cache_dir / 'responses.db'
+        if db_file.exists():
+            source = SQLiteCacheStorage(self.cache_dir)
+            legacy_files = [db_file]
+        else:
+            source = JSONCacheStorage(self.cache_dir)
+            legacy_files = [source.cache_file, source.index_file]
+
+        imported = storage.import_from(source)
+        source.close()
+        if imported:
+            for path in legacy_files:
+                if path.exists():
+                    path.rename(path.with_name(path.name + '.migrated'))
+            print(f"Migrated {imported} cache entries into {len(storage.shards)} shards", file=sys.stderr)
+
+    @property
+    def max_age_days(self) -> float:
+        return self._max_age_days
+
+    @max_age_days.setter
+    def max_age_days(self, days: float):
+        self._max_age_days = days
+        self._reindex_expiry()
+
+    def set_ttl(self, days: float, model: Optional[str] = None, task_type: Optional[str] = None):
+        """Override the TTL for one model or task type (neither: the default)
+
+        A 'ttl_days' entry in an entry's metadata still takes precedence.
+        Existing entries are re-scheduled under the new setting.
+        """
+        if task_type is not None:
+            self.task_ttl_days[task_type] = days
+        elif model is not None:
+            self.model_ttl_days[model] = days
+        else:
+            self._max_age_days = days
+        self._reindex_expiry()
 
-class AICache:
-    """Intelligent AI response caching system"""
+    def _ttl_days(self, model: str, metadata: Optional[Dict[str, Any]]) -> float:
+        """Lifetime of an entry: metadata ttl_days, then task type, then model
 
-    def __init__(self, project_root: Path, cache_dir: Optional[Path] = None):
-        self.project_root = project_root
-        self.cache_dir = cache_dir or project_root / '.ai' / 'cache'
-        self.cache_file = self.cache_dir / 'responses.json'
-        self.index_file = self.cache_dir / 'index.json'
+        The max_age_days default keeps its historical whole-days meaning (an
+        entry expires once it is more than max_age_days whole days old);
+        explicit overrides are exact.
+        """
+        metadata = metadata or {}
+        if metadata.get('ttl_days') is not None:
+            return float(metadata['ttl_days'])
+        task_type = metadata.get('task_type')
+        if task_type in self.task_ttl_days:
+            return self.task_ttl_days[task_type]
+        if model in self.model_ttl_days:
+            return self.model_ttl_days[model]
+        return self._max_age_days + 1
 
-        self.cache_dir.mkdir(parents=True, exist_ok=True)
-        self._load_cache()
+    def _expires_at(self, response: CachedResponse) -> float:
+        return response.created_ts + self._ttl_days(response.model, response.metadata) * 86400
 
-        # Cache configuration
-        self.max_cache_size = 1000  # Maximum number of cached responses
-        self.max_age_days = 30  # Maximum age of cached responses
-        self.similarity_threshold = 0.85  # Minimum similarity for cache hits
-        self.auto_cleanup_enabled = True
+    def _reindex_expiry(self):
+        """Recompute every expiry time after a TTL setting changed"""
+        if not getattr(self, '_loaded', False):
+            return
+        self.expiry.clear()
+        for key, created_at, model, metadata in self.cache.scan('created_at', 'model', 'metadata'):
+            self.expiry.add(key, created_at + self._ttl_days(model, metadata) * 86400)
+
+    def _ensure_loaded(self):
+        """Build the in-memory cache and indexes on first use"""
+        if not self._loaded:
+            self._loaded = True
+            self._cold_indexes_cache = None
+            self._load_cache()
 
     def _load_cache(self):
         """Load cache from disk"""
-        self.cache: Dict[str, CachedResponse] = {}
-        self.index: Dict[str, List[str]] = {}  # prompt_hash -> [context_hashes]
+        self.cache: ResponseTable
+        self.index: Dict[str, List[str]]  # prompt_hash -> [context_hashes]
+        self.cache, self.index = self.storage.load()
 
-        if self.cache_file.exists():
-            try:
-                with open(self.cache_file, 'r') as f:
-                    data = json.load(f)
-                    for key, item in data.items():
-                        # Convert datetime strings back to datetime objects
-                        item['created_at'] = datetime.fromisoformat(item['created_at'])
-                        item['last_accessed'] = datetime.fromisoformat(item['last_accessed'])
-                        self.cache[key] = CachedResponse(**item)
-            except Exception as e:
-                print(f"Warning: Could not load cache: {e}", file=sys.stderr)
+        self.token_index = TokenIndex()
+        loaded_bytes = 0
+        for key, response in self.cache.items():
+            self.token_index.add(key, response.prompt)
+            self.eviction_policy.record_insert(response)
+            loaded_bytes += len(response.prompt) + (len(response.response) if response.response else 0)
+        self.metrics.inc('bytes_read', loaded_bytes)
 
-        if self.index_file.exists():
-            try:
-                with open(self.index_file, 'r') as f:
-                    self.index = json.load(f)
-            except Exception as e:
-                print(f"Warning: Could not load index: {e}", file=sys.stderr)
+        # Second-level keys: prompt-only hash -> entries stored with a context
+        self.prompt_index: Dict[str, List[str]] = {}
+        for key, prompt, context_hash in self.cache.scan('prompt', 'context_hash'):
+            if context_hash:
+                self.prompt_index.setdefault(self._generate_prompt_hash(prompt), []).append(key)
 
-    def _save_cache(self):
-        """Save cache to disk"""
-        try:
-            # Convert datetime objects to ISO strings for JSON serialization
-            cache_data = {}
+        self._reindex_expiry()
+        self._quality_pending = [key for key, quality_score in self.cache.scan('quality_score')
+                                 if quality_score < 0.3]
+
+        if not self.bloom.load(self.bloom_file, self._bloom_fingerprint()):
+            for tokens in self.token_index.token_sets.values():
+                self.bloom.add(tokens)
+
+        if self.lsh is not None:
+            persisted = self.lsh.load(self.lsh_file)
+            for key, tokens in self.token_index.token_sets.items():
+                self.lsh.add(key, tokens, persisted.get(key))
+            # Only rewrite the sidecar file if entries were missing or stale
+            self.lsh.dirty = persisted.keys() != self.cache.keys()
+
+        if self.semantic is not None:
+            persisted = self.semantic.load(self.semantic_file)
             for key, response in self.cache.items():
-                data = asdict(response)
-                data['created_at'] = response.created_at.isoformat()
-                data['last_accessed'] = response.last_accessed.isoformat()
-                cache_data[key] = data
+                self.semantic.add(key, response.prompt, persisted.get(key))
+            self.semantic.dirty = persisted.keys() != self.cache.keys()
 
-            with open(self.cache_file, 'w') as f:
-                json.dump(cache_data, f, indent=2)
+    def _bloom_fingerprint(self) -> str:
+        """Order-independent digest of the cached keys"""
+        combined = 0
+        for key in self.cache:
+            combined ^= int(key[:16], 16)
+        return f"{len(self.cache)}:{combined:016x}"
 
-            with open(self.index_file, 'w') as f:
-                json.dump(self.index, f, indent=2)
+    def _save_cache(self):
+        """Persist every entry (used after bulk changes)"""
+        self._ensure_loaded()
+        for response in self.cache.values():
+            self.writer.upsert(response, self.index.get(response.prompt_hash))
 
-        except Exception as e:
-            print(f"Error saving cache: {e}", file=sys.stderr)
+    def _remove_entries(self, keys: List[str]):
+        """Remove entries from memory, the index and the storage backend"""
+        self._forget_entries(keys)
+        with self.metrics.timer('save'):
+            self.writer.delete(keys)
+
+    def _forget_entries(self, keys: List[str]):
+        """Remove entries from memory and every in-memory index"""
+        for key in keys:
+            cached = self.cache.get(key)
+            if cached is not None and cached.context_hash:
+                self._unindex_prompt(self._generate_prompt_hash(cached.prompt), key)
+            self.cache.discard(key)
+            self.index.pop(key, None)
+            tokens = self.token_index.token_sets.get(key)
+            if tokens:
+                self.bloom.remove(tokens)
+            self.token_index.remove(key)
+            self.eviction_policy.remove(key)
+            self.expiry.remove(key)
+            if self.lsh is not None:
+                self.lsh.remove(key)
+            if self.semantic is not None:
+                self.semantic.remove(key)
+
+    def _unindex_prompt(self, prompt_only_hash: str, key: str):
+        keys = self.prompt_index.get(prompt_only_hash)
+        if keys and key in keys:
+            keys.remove(key)
+            if not keys:
+                del self.prompt_index[prompt_only_hash]
+
+    def flush(self):
+        """Write any buffered mutations and metrics to disk"""
+        if isinstance(self.writer, WriteBehindBuffer):
+            with self.metrics.timer('save'):
+                self.writer.flush()
+        self.metrics.save()
+
+    def close(self):
+        """Flush pending writes, persist side indexes and close the backend"""
+        if self._closed:
+            return
+        self._closed = True
+        atexit.unregister(self.close)
+        if isinstance(self.writer, WriteBehindBuffer):
+            self.writer.close()
+        self.metrics.save()
+        if self.lsh is not None and self.lsh.dirty:
+            self.lsh.save(self.lsh_file)
+        if self.semantic is not None and self.semantic.dirty:
+            self.semantic.save(self.semantic_file)
+        if self.bloom.dirty:
+            self.bloom.save(self.bloom_file, self._bloom_fingerprint())
+        self.admission.save(self.admission_file)
+        self.storage.close()
+
+    def __enter__(self) -> 'AICache':
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
 
     def _generate_prompt_hash(self, prompt: str, context: Optional[str] = None) -> str:
         """Generate a hash for the prompt and optional context"""
@@ -100,68 +2599,124 @@ class AICache:
             content += f"\n---CONTEXT---\n{context}"
         return hashlib.sha256(content.encode()).hexdigest()[:16]
 
-    def _calculate_similarity(self, prompt1: str, prompt2: str) -> float:
-        """Calculate similarity between two prompts (simple implementation)"""
-        # This is a basic implementation - could be enhanced with NLP
-        words1 = set(prompt1.lower().split())
-        words2 = set(prompt2.lower().split())
-
-        if not words1 or not words2:
-            return 0.0
-
-        intersection = words1.intersection(words2)
-        union = words1.union(words2)
+    def sweep_expired(self, now: Optional[float] = None, limit: Optional[int] = None) -> int:
+        """Remove the entries whose TTL has run out; returns how many
 
-        return len(intersection) / len(union)
+        Only due entries are visited (via the expiry heap), so a sweep with
+        nothing due is O(1). limit bounds the work done by a single call.
+        """
+        self._ensure_loaded()
+        expired = self.expiry.pop_due(time.time() if now is None else now, limit)
+        if expired:
+            self._remove_entries(expired)
+            self.metrics.inc('evictions_expired', len(expired))
+        return len(expired)
 
     def _cleanup_cache(self):
-        """Clean up old and low-quality cache entries"""
+        """Clean up expired and low-quality cache entries, then enforce max_cache_size
+
+        Amortized: expiry pops only what is due and the quality rule only
+        looks at entries added since the previous cleanup.
+        """
         if not self.auto_cleanup_enabled:
             return
 
-        current_time = datetime.now()
-        to_remove = []
-
-        for key, response in self.cache.items():
-            # Remove entries older than max_age_days
-            if (current_time - response.created_at).days > self.max_age_days:
-                to_remove.append(key)
-                continue
-
-            # Remove entries with very low quality scores
-            if response.quality_score is not None and response.quality_score < 0.3:
-                to_remove.append(key)
-                continue
+        expired = self.sweep_expired()
 
-            # Remove least accessed entries if cache is too large
-            if len(self.cache) > self.max_cache_size:
-                # Sort by access count and recency, remove oldest/least used
-                sorted_entries = sorted(
-                    self.cache.items(),
-                    key=lambda x: (x[1].access_count, x[1].last_accessed.timestamp())
-                )
-                to_remove.extend([k for k, _ in sorted_entries[:len(sorted_entries) - self.max_cache_size]])
+        # Remove entries with very low quality scores (NaN means unscored)
+        low_quality = [key for key in dict.fromkeys(self._quality_pending)
+                       if key in self.cache and self.cache[key].quality_score is not None
+                       and self.cache[key].quality_score < 0.3]
+        self._quality_pending = []
+        self._remove_entries(low_quality)
+        self.metrics.inc('evictions_low_quality', len(low_quality))
 
-        for key in set(to_remove):  # Remove duplicates
-            if key in self.cache:
-                del self.cache[key]
-                # Clean up index
-                if key in self.index:
-                    del self.index[key]
+        # Evict policy victims until the cache fits, O(log n) per victim
+        evicted = []
+        while len(self.cache) - len(evicted) > self.max_cache_size:
+            victim = self.eviction_policy.pop_victim()
+            if victim is None:
+                break
+            evicted.append(victim)
+        self._remove_entries(evicted)
+        self.metrics.inc('evictions_capacity', len(evicted))
 
-        if to_remove:
-            print(f"Cache cleanup: removed {len(set(to_remove))} entries", file=sys.stderr)
-            self._save_cache()
+        removed = expired + len(low_quality) + len(evicted)
+        if removed:
+            print(f"Cache cleanup: removed {removed} entries", file=sys.stderr)
 
     def store_response(self, prompt: str, response: str, model: str,
                       tokens_used: int, cost: float,
                       quality_score: Optional[float] = None,
                       context: Optional[str] = None,
-                      metadata: Optional[Dict[str, Any]] = None) -> str:
+                      metadata: Optional[Dict[str, Any]] = None) -> Optional[str]:
         """
         Store an AI response in the cache
 
-        Returns the cache key
+        Returns the cache key, or None when the admission policy turned the
+        response away (it is then not cached)
+        """
+        self._ensure_loaded()
+        entry = self._build_entry(
+            prompt, response, model, tokens_used, cost, quality_score, context, metadata)
+        if entry is None:
+            return None
+        cached_response = self._insert_entry(entry)
+
+        with self.metrics.timer('save'):
+            self.writer.upsert(cached_response, self.index.get(cached_response.prompt_hash))
+        self._cleanup_cache()
+
+        return cached_response.prompt_hash
+
+    def store_many(self, records: List[Dict[str, Any]]) -> List[Optional[str]]:
+        """
+        Store many responses and commit them in a single storage batch
+
+        Each record takes the keyword arguments of store_response. Records
+        with the same prompt and context are deduplicated (the last one wins),
+        and each is subject to the admission policy. Returns the cache key of
+        every record in input order, None where the admission policy rejected
+        it (as store_response does).
+        """
+        self._ensure_loaded()
+        keys = [self._generate_prompt_hash(r['prompt'], r.get('context')) for r in records]
+        latest = {key: record for key, record in zip(keys, records)}
+
+        entries = []
+        for record in latest.values():
+            entry = self._build_entry(
+                prompt=record['prompt'],
+                response=record['response'],
+                model=record['model'],
+                tokens_used=record['tokens_used'],
+                cost=record['cost'],
+                quality_score=record.get('quality_score'),
+                context=record.get('context'),
+                metadata=record.get('metadata')
+            )
+            if entry is not None:
+                entries.append(self._insert_entry(entry))
+
+        admitted = {entry.prompt_hash for entry in entries}
+        keys = [key if key in admitted else None for key in keys]
+        if not entries:
+            return keys
+        with self.metrics.timer('save'):
+            self.writer.apply_batch([(e, self.index.get(e.prompt_hash)) for e in entries], [], [])
+        self._cleanup_cache()
+
+        return keys
+
+    def _build_entry(self, prompt: str, response: str, model: str,
+                     tokens_used: int, cost: float,
+                     quality_score: Optional[float] = None,
+                     context: Optional[str] = None,
+                     metadata: Optional[Dict[str, Any]] = None) -> Optional[CachedResponse]:
+        """Create a new entry, moving a large body into the blob store
+
+        Returns None when the admission policy rejects the entry; that check
+        runs first so a rejected body is never written to the blob store.
         """
         prompt_hash = self._generate_prompt_hash(prompt, context)
         context_hash = self._generate_prompt_hash(context) if context else None
@@ -178,22 +2733,75 @@ class AICache:
             last_accessed=datetime.now(),
             access_count=1,
             context_hash=context_hash,
-            metadata=metadata or {}
+            metadata=dict(metadata or {})
         )
+        if context:
+            # Lets a later lookup recognize the same prompt under an edited context
+            cached_response.metadata['context_chunks'] = _context_chunks(context)
+
+        if not self._admit(cached_response):
+            return None
 
-        self.cache[prompt_hash] = cached_response
+        if self.blob_threshold is not None and len(response) >= self.blob_threshold:
+            cached_response.response_ref, cached_response.response_size = self.blobs.put(response)
+            cached_response.response = None
+
+        self.metrics.inc('bytes_written', len(prompt.encode()) + len(response.encode()))
+        return cached_response
+
+    def _admit(self, entry: CachedResponse) -> bool:
+        """Ask the admission policy whether a new entry may take a slot
+
+        Replacing an existing key or filling free capacity displaces nothing;
+        otherwise the candidate is weighed against the next eviction victim.
+        """
+        victim = None
+        if entry.prompt_hash not in self.cache and len(self.cache) >= self.max_cache_size:
+            victim_key = self.eviction_policy.peek_victim()
+            victim = self.cache.get(victim_key) if victim_key is not None else None
+
+        if self.admission.admit(entry, victim):
+            self.metrics.inc('admission_admitted')
+            return True
+        self.metrics.inc('admission_rejected')
+        self.metrics.inc('admission_rejected_bytes', len(entry.prompt.encode()) + len(entry.response.encode()))
+        return False
+
+    def _insert_entry(self, entry: CachedResponse) -> ResponseView:
+        """Add an entry to memory and every in-memory index (no storage write)
+
+        Returns the live view of the stored row, which is what the writer
+        must hold so later counter updates reach storage.
+        """
+        prompt_hash = entry.prompt_hash
+        context_hash = entry.context_hash
+
+        # The storage upsert replaces the old row, so only memory needs clearing
+        if prompt_hash in self.cache:
+            self._forget_entries([prompt_hash])
+        self.cache[prompt_hash] = entry
+        cached_response = self.cache[prompt_hash]
+        self.token_index.add(prompt_hash, entry.prompt)
+        self.bloom.add(self.token_index.token_sets[prompt_hash])
+        self.negative_cache.invalidate()
+        self.eviction_policy.record_insert(cached_response)
+        self.expiry.add(prompt_hash, self._expires_at(cached_response))
+        if entry.quality_score is not None and entry.quality_score < 0.3:
+            self._quality_pending.append(prompt_hash)
+        if self.lsh is not None:
+            self.lsh.add(prompt_hash, self.token_index.token_sets[prompt_hash])
+        if self.semantic is not None:
+            self.semantic.add(prompt_hash, entry.prompt)
 
         # Update index
         if context_hash:
+            self.prompt_index.setdefault(self._generate_prompt_hash(entry.prompt), []).append(prompt_hash)
             if prompt_hash not in self.index:
                 self.index[prompt_hash] = []
             if context_hash not in self.index[prompt_hash]:
                 self.index[prompt_hash].append(context_hash)
 
-        self._cleanup_cache()
-        self._save_cache()
-
-        return prompt_hash
+        return cached_response
 
     def get_cached_response(self, prompt: str, context: Optional[str] = None,
                            min_quality: Optional[float] = None) -> Optional[CachedResponse]:
@@ -202,97 +2810,459 @@ class AICache:
 
         Returns None if no suitable cached response is found
         """
+        with self.metrics.timer('lookup'):
+            return self._lookup(prompt, context, min_quality)
+
+    def get_many(self, prompts: List[str], contexts: Optional[List[Optional[str]]] = None,
+                 min_quality: Optional[float] = None) -> List[Optional[CachedResponse]]:
+        """
+        Retrieve cached responses for many prompts at once
+
+        Identical (prompt, context) pairs are looked up once, all similarity
+        searches share one batched pass, and access-counter updates are
+        committed in a single storage batch. Returns one result per prompt.
+        """
+        self._ensure_loaded()
+        if self.auto_cleanup_enabled:
+            self.sweep_expired()
+        contexts = contexts if contexts is not None else [None] * len(prompts)
+        if len(contexts) != len(prompts):
+            raise ValueError("prompts and contexts must have the same length")
+
+        start = time.perf_counter()
+        unique = list(dict.fromkeys(zip(prompts, contexts)))
+        found: Dict[Tuple[str, Optional[str]], Optional[CachedResponse]] = {}
+        touches: List[CachedResponse] = []
+        pending = []
+
+        context_keys = {context: (self._generate_prompt_hash(context) if context else None,
+                                  frozenset(_context_chunks(context)) if context else frozenset())
+                        for context in set(contexts)}
+
+        for query in unique:
+            prompt, context = query
+            prompt_hash = self._generate_prompt_hash(prompt, context)
+            self.admission.record_access(prompt_hash)
+            cached = self.cache.get(prompt_hash)
+            if cached is not None and self._meets_quality(cached, min_quality):
+                found[query] = self._record_hit(cached, 'exact_hits', touches)
+            elif f"{prompt_hash}:{min_quality}" in self.negative_cache:
+                self.metrics.inc('prechecked_negative_cache')
+                found[query] = None
+            else:
+                cached = self._context_match(prompt, context_keys[context][1], min_quality) if context else None
+                if cached is not None:
+                    found[query] = self._record_hit(cached, 'context_hits', touches)
+                else:
+                    pending.append((query, f"{prompt_hash}:{min_quality}"))
+
+        if pending and self.similarity_threshold > 0:
+            lexical = []
+            for item in pending:
+                if self._may_match_lexically(item[0][0]):
+                    lexical.append(item)
+                else:
+                    self.metrics.inc('prechecked_bloom')
+            with self.metrics.timer('similarity_scan'):
+                if self.lsh is None:
+                    candidate_lists = self.token_index.query_many(
+                        [query[0] for query, _ in lexical], self.similarity_threshold)
+                else:
+                    candidate_lists = [self._similar_candidates(query[0]) for query, _ in lexical]
+            for (query, _), candidates in zip(lexical, candidate_lists):
+                for key, _similarity in candidates:
+                    if self._accepts(self.cache[key], min_quality, *context_keys[query[1]]):
+                        found[query] = self._record_hit(self.cache[key], 'similarity_hits', touches)
+                        break
+            pending = [item for item in pending if item[0] not in found]
+
+        if pending and self.semantic is not None:
+            with self.metrics.timer('similarity_scan'):
+                candidate_lists = self.semantic.query_many(
+                    [query[0] for query, _ in pending], self.semantic_threshold)
+            for (query, _), candidates in zip(pending, candidate_lists):
+                for key, _similarity in candidates:
+                    if (_content_overlap(query[0], self.cache[key].prompt) >= self.semantic_min_overlap
+                            and self._accepts(self.cache[key], min_quality, *context_keys[query[1]])):
+                        found[query] = self._record_hit(self.cache[key], 'semantic_hits', touches)
+                        break
+            pending = [item for item in pending if item[0] not in found]
+
+        for query, miss_key in pending:
+            self.negative_cache.add(miss_key)
+            self.metrics.inc('misses')
+            found[query] = None
+
+        if touches:
+            with self.metrics.timer('save'):
+                self.writer.apply_batch([], touches, [])
+
+        # Record the amortized per-lookup latency so batch and single lookups compare
+        per_lookup = (time.perf_counter() - start) / max(len(unique), 1)
+        for _ in unique:
+            self.metrics.observe('lookup', per_lookup)
+
+        return [found[query] for query in zip(prompts, contexts)]
+
+    def _lookup(self, prompt: str, context: Optional[str],
+                min_quality: Optional[float]) -> Optional[CachedResponse]:
         prompt_hash = self._generate_prompt_hash(prompt, context)
+        self.admission.record_access(prompt_hash)
+
+        # Cold (lazy) cache: answer from storage without the full load
+        if not self._loaded:
+            return self._cold_lookup(prompt, context, min_quality, prompt_hash)
+
+        # Expire anything that came due, so expired entries are never served
+        if self.auto_cleanup_enabled:
+            self.sweep_expired()
 
         # Direct hash match
         if prompt_hash in self.cache:
             cached = self.cache[prompt_hash]
-            if min_quality is None or (cached.quality_score and cached.quality_score >= min_quality):
-                cached.last_accessed = datetime.now()
-                cached.access_count += 1
-                self._save_cache()
-                return cached
+            if self._meets_quality(cached, min_quality):
+                return self._record_hit(cached, 'exact_hits')
+
+        # Recently missed with the same inputs and nothing stored since
+        miss_key = f"{prompt_hash}:{min_quality}"
+        if miss_key in self.negative_cache:
+            self.metrics.inc('prechecked_negative_cache')
+            return None
+
+        # Same prompt stored under a near-identical context
+        context_hash = self._generate_prompt_hash(context) if context else None
+        query_chunks = frozenset(_context_chunks(context)) if context else frozenset()
+        if context:
+            cached = self._context_match(prompt, query_chunks, min_quality)
+            if cached is not None:
+                return self._record_hit(cached, 'context_hits')
 
-        # Similarity-based search
+        # Similarity-based search via the inverted token index (or LSH buckets)
         if self.similarity_threshold > 0:
-            best_match = None
-            best_similarity = 0.0
+            if self._may_match_lexically(prompt):
+                with self.metrics.timer('similarity_scan'):
+                    candidates = self._similar_candidates(prompt)
+                for key, _similarity in candidates:
+                    if self._accepts(self.cache[key], min_quality, context_hash, query_chunks):
+                        return self._record_hit(self.cache[key], 'similarity_hits')
+            else:
+                self.metrics.inc('prechecked_bloom')
+
+        # Semantic tier: catches paraphrases that share few exact words
+        if self.semantic is not None:
+            with self.metrics.timer('similarity_scan'):
+                candidates = self.semantic.query(prompt, self.semantic_threshold)
+            for key, _similarity in candidates:
+                if (_content_overlap(prompt, self.cache[key].prompt) >= self.semantic_min_overlap
+                        and self._accepts(self.cache[key], min_quality, context_hash, query_chunks)):
+                    return self._record_hit(self.cache[key], 'semantic_hits')
+
+        self.negative_cache.add(miss_key)
+        self.metrics.inc('misses')
+        return None
+
+    def _cold_lookup(self, prompt: str, context: Optional[str], min_quality: Optional[float],
+                     prompt_hash: str) -> Optional[CachedResponse]:
+        """_lookup for a lazy cache that has not been loaded yet
+
+        The exact match is a point read. The context, lexical and semantic
+        tiers search indexes built from the stored prompts alone (see
+        _cold_indexes) and point-read only their candidates, so a miss does
+        not materialize the response table. LSH mode uses the exact token
+        index here, and expired entries are skipped rather than swept.
+        """
+        now = time.time()
+
+        def fetch(key: str) -> Optional[CachedResponse]:
+            cached = self.storage.get(key)
+            if cached is None or self._expires_at(cached) <= now:
+                return None
+            self.metrics.inc('bytes_read', len(cached.prompt) + len(cached.response or ''))
+            return cached
 
-            for cached_response in self.cache.values():
-                similarity = self._calculate_similarity(prompt, cached_response.prompt)
+        cached = fetch(prompt_hash)
+        if cached is not None and self._meets_quality(cached, min_quality):
+            return self._record_hit(cached, 'exact_hits')
 
-                if similarity >= self.similarity_threshold and similarity > best_similarity:
-                    if min_quality is None or (cached_response.quality_score and cached_response.quality_score >= min_quality):
-                        best_match = cached_response
-                        best_similarity = similarity
+        miss_key = f"{prompt_hash}:{min_quality}"
+        if miss_key in self.negative_cache:
+            self.metrics.inc('prechecked_negative_cache')
+            return None
 
-            if best_match:
-                best_match.last_accessed = datetime.now()
-                best_match.access_count += 1
-                self._save_cache()
-                return best_match
+        token_index, prompt_index, semantic = self._cold_indexes()
+        context_hash = self._generate_prompt_hash(context) if context else None
+        query_chunks = frozenset(_context_chunks(context)) if context else frozenset()
+        if context:
+            cached = self._context_match(prompt, query_chunks, min_quality, prompt_index, fetch)
+            if cached is not None:
+                return self._record_hit(cached, 'context_hits')
+
+        if self.similarity_threshold > 0:
+            with self.metrics.timer('similarity_scan'):
+                candidates = token_index.query(prompt, self.similarity_threshold)
+            for key, _similarity in candidates:
+                cached = fetch(key)
+                if cached is not None and self._accepts(cached, min_quality, context_hash, query_chunks):
+                    return self._record_hit(cached, 'similarity_hits')
 
+        if semantic is not None:
+            with self.metrics.timer('similarity_scan'):
+                candidates = semantic.query(prompt, self.semantic_threshold)
+            for key, _similarity in candidates:
+                cached = fetch(key)
+                if (cached is not None
+                        and _content_overlap(prompt, cached.prompt) >= self.semantic_min_overlap
+                        and self._accepts(cached, min_quality, context_hash, query_chunks)):
+                    return self._record_hit(cached, 'semantic_hits')
+
+        self.negative_cache.add(miss_key)
+        self.metrics.inc('misses')
         return None
 
+    def _cold_indexes(self) -> Tuple[TokenIndex, Dict[str, List[str]], Optional[SemanticIndex]]:
+        """Token, prompt -> context-keys and semantic indexes over the stored
+        prompts, built once for a cold lazy cache (dropped by the full load)"""
+        if self._cold_indexes_cache is None:
+            token_index = TokenIndex()
+            prompt_index: Dict[str, List[str]] = {}
+            semantic = SemanticIndex(self.semantic.embedder) if self.semantic is not None else None
+            persisted = semantic.load(self.semantic_file) if semantic is not None else {}
+            loaded_bytes = 0
+            for key, prompt, context_hash in self.storage.prompts():
+                token_index.add(key, prompt)
+                if context_hash:
+                    prompt_index.setdefault(self._generate_prompt_hash(prompt), []).append(key)
+                if semantic is not None:
+                    semantic.add(key, prompt, persisted.get(key))
+                loaded_bytes += len(prompt)
+            self.metrics.inc('bytes_read', loaded_bytes)
+            self._cold_indexes_cache = (token_index, prompt_index, semantic)
+        return self._cold_indexes_cache
+
+    def _context_match(self, prompt: str, query_chunks: frozenset, min_quality: Optional[float],
+                       prompt_index: Optional[Dict[str, List[str]]] = None,
+                       fetch: Optional[Callable[[str], Optional[CachedResponse]]] = None
+                       ) -> Optional[CachedResponse]:
+        """Second-level lookup: the entry for this exact prompt whose context
+        chunks overlap the query's most, if at least context_similarity_threshold
+
+        prompt_index and fetch default to the in-memory index and table.
+        """
+        prompt_index = self.prompt_index if prompt_index is None else prompt_index
+        fetch = fetch or self.cache.get
+        keys = prompt_index.get(self._generate_prompt_hash(prompt))
+        if not keys or self.context_similarity_threshold <= 0:
+            return None
+
+        best, best_similarity = None, self.context_similarity_threshold
+        for key in keys:
+            cached = fetch(key)
+            if cached is None:
+                continue
+            similarity = self._context_similarity(cached, query_chunks)
+            if similarity >= best_similarity and self._meets_quality(cached, min_quality):
+                best, best_similarity = cached, similarity
+        return best
+
+    @staticmethod
+    def _context_similarity(cached: CachedResponse, query_chunks: frozenset) -> float:
+        """Jaccard overlap of the stored and query context chunk hashes"""
+        stored = cached.metadata.get('context_chunks')
+        if not stored or not query_chunks:
+            return 0.0
+        stored = set(stored)
+        return len(query_chunks & stored) / len(query_chunks | stored)
+
+    def _accepts(self, cached: CachedResponse, min_quality: Optional[float],
+                 context_hash: Optional[str], query_chunks: frozenset) -> bool:
+        """A similar-prompt candidate must meet min_quality and have been
+        stored under the same (or a near-identical) context"""
+        if not self._meets_quality(cached, min_quality):
+            return False
+        if cached.context_hash == context_hash:
+            return True
+        return (self.context_similarity_threshold > 0 and
+                self._context_similarity(cached, query_chunks) >= self.context_similarity_threshold)
+
+    def _may_match_lexically(self, prompt: str) -> bool:
+        """Bloom pre-check for the similarity search
+
+        Jaccard >= t needs an overlap of at least ceil(t * q) of the q query
+        tokens, so if fewer query tokens than that occur in any cached prompt
+        no entry can reach the threshold.
+        """
+        tokens = _tokenize(prompt)
+        if not tokens:
+            return False
+        needed = math.ceil(self.similarity_threshold * len(tokens) - 1e-9)
+        present = 0
+        for token in tokens:
+            if token in self.bloom:
+                present += 1
+                if present >= needed:
+                    return True
+        return False
+
+    @staticmethod
+    def _meets_quality(cached: CachedResponse, min_quality: Optional[float]) -> bool:
+        return min_quality is None or bool(cached.quality_score and cached.quality_score >= min_quality)
+
+    def _record_hit(self, cached: CachedResponse, kind: str,
+                    touches: Optional[List[CachedResponse]] = None) -> CachedResponse:
+        """Update access counters and savings for a hit, return the materialized entry
+
+        When ``touches`` is given the storage update is collected there so the
+        caller can commit a whole batch at once.
+        """
+        cached.last_accessed = datetime.now()
+        cached.access_count += 1
+        self.eviction_policy.record_access(cached)
+        self.metrics.inc(kind)
+        self.metrics.inc('dollars_saved', cached.cost)
+        self.metrics.inc('tokens_saved', cached.tokens_used)
+        if touches is not None:
+            touches.append(cached)
+        else:
+            with self.metrics.timer('save'):
+                self.writer.touch(cached)
+        return self._materialize(cached)
+
+    def _materialize(self, cached: CachedResponse) -> CachedResponse:
+        """Standalone copy of a hit with its response body loaded
+
+        Callers may keep the copy after the entry is evicted. A blob-backed
+        body is read into the copy only; the table keeps just the blob
+        reference, so bodies do not pile up in a long-running process.
+        """
+        record = cached.detach() if isinstance(cached, ResponseView) else cached
+        if record.response is None and record.response_ref:
+            record.response = self.blobs.get(record.response_ref)
+            self.metrics.inc('bytes_read', record.response_size)
+        return record
+
+    def _similar_candidates(self, prompt: str) -> List[Tuple[str, float]]:
+        """Return (key, similarity) pairs at or above the threshold, best first"""
+        if self.lsh is None:
+            return self.token_index.query(prompt, self.similarity_threshold)
+
+        tokens = _tokenize(prompt)
+        signature, keys = self.lsh.candidates(tokens)
+        results = []
+        for key in keys:
+            if self.lsh_rerank:
+                other = self.token_index.token_sets[key]
+                union = len(tokens | other)
+                similarity = len(tokens & other) / union if union else 0.0
+            else:
+                similarity = self.lsh.estimate(signature, key)
+            if similarity >= self.similarity_threshold:
+                results.append((key, similarity))
+
+        results.sort(key=lambda item: item[1], reverse=True)
+        return results
+
     def get_cache_stats(self) -> Dict[str, Any]:
-        """Get comprehensive cache statistics"""
-        if not self.cache:
-            return {
-                'total_entries': 0,
-                'total_cost_saved': 0.0,
-                'total_tokens_saved': 0,
-                'cache_hit_rate': 0.0,
-                'avg_quality_score': 0.0,
-                'oldest_entry': None,
-                'newest_entry': None
-            }
-
-        total_cost = sum(r.cost for r in self.cache.values())
-        total_tokens = sum(r.tokens_used for r in self.cache.values())
-        total_accesses = sum(r.access_count for r in self.cache.values())
-
-        quality_scores = [r.quality_score for r in self.cache.values() if r.quality_score is not None]
+        """Get comprehensive cache statistics from the real hit/miss counters"""
+        self._ensure_loaded()
+        metrics = self.metrics.to_dict()
+        counters = metrics['counters']
+        hits = (counters['exact_hits'] + counters['context_hits'] +
+                counters['similarity_hits'] + counters['semantic_hits'])
+        lookups = hits + counters['misses']
+
+        rows = list(self.cache.scan('quality_score', 'created_at', 'model', 'access_count'))
+        quality_scores = [row[1] for row in rows if not math.isnan(row[1])]
         avg_quality = sum(quality_scores) / len(quality_scores) if quality_scores else 0.0
 
-        created_dates = [r.created_at for r in self.cache.values()]
-        oldest = min(created_dates) if created_dates else None
-        newest = max(created_dates) if created_dates else None
+        stored_bytes = sum(len(prompt) + (size if ref else len(response))
+                           for _key, prompt, response, ref, size
+                           in self.cache.scan('prompt', 'response', 'response_ref', 'response_size'))
+        stored_mb = stored_bytes / (1024 * 1024)
+
+        next_due = self.expiry.next_due()
 
-        # Calculate potential savings (assuming 50% hit rate)
-        estimated_cache_hits = len(self.cache) * 0.5
-        estimated_cost_saved = total_cost * 0.5
-        estimated_tokens_saved = int(total_tokens * 0.5)
+        created_dates = [row[2] for row in rows]
+        oldest = datetime.fromtimestamp(min(created_dates)) if created_dates else None
+        newest = datetime.fromtimestamp(max(created_dates)) if created_dates else None
 
         return {
             'total_entries': len(self.cache),
-            'total_cost_saved': round(estimated_cost_saved, 4),
-            'total_tokens_saved': estimated_tokens_saved,
-            'cache_hit_rate': round(estimated_cache_hits / max(total_accesses, 1), 3),
+            'total_cost_saved': round(counters['dollars_saved'], 4),
+            'total_tokens_saved': int(counters['tokens_saved']),
+            'cache_hit_rate': round(hits / lookups, 3) if lookups else 0.0,
+            'hits': {
+                'exact': int(counters['exact_hits']),
+                'context': int(counters['context_hits']),
+                'similarity': int(counters['similarity_hits']),
+                'semantic': int(counters['semantic_hits']),
+            },
+            'misses': int(counters['misses']),
             'avg_quality_score': round(avg_quality, 3),
             'oldest_entry': oldest.isoformat() if oldest else None,
             'newest_entry': newest.isoformat() if newest else None,
-            'models_used': list(set(r.model for r in self.cache.values())),
-            'total_accesses': total_accesses
+            'models_used': sorted(set(row[3] for row in rows)),
+            'total_accesses': sum(row[4] for row in rows),
+            'eviction_policy': self.eviction_policy.name,
+            'next_expiry': datetime.fromtimestamp(next_due).isoformat() if next_due else None,
+            'evictions': {
+                'capacity': int(counters['evictions_capacity']),
+                'expired': int(counters['evictions_expired']),
+                'low_quality': int(counters['evictions_low_quality']),
+            },
+            'prechecked_misses': {
+                'negative_cache': int(counters['prechecked_negative_cache']),
+                'bloom': int(counters['prechecked_bloom']),
+            },
+            'bloom_filter': {
+                'tokens': len(self.token_index.postings),
+                'fill_ratio': round(self.bloom.fill_ratio(), 4),
+                'estimated_fp_rate': round(self.bloom.estimated_fp_rate(len(self.token_index.postings)), 6),
+            },
+            'admission': {
+                'policy': self.admission.name,
+                'admitted': int(counters['admission_admitted']),
+                'rejected': int(counters['admission_rejected']),
+                'rejected_bytes': int(counters['admission_rejected_bytes']),
+                'stored_mb': round(stored_mb, 3),
+                'hit_rate_per_mb': round((hits / lookups) / stored_mb, 3) if lookups and stored_mb else 0.0,
+            },
+            'coalesced_requests': int(counters['coalesced_requests']),
+            'stale_served': int(counters['stale_served']),
+            'bytes_read': int(counters['bytes_read']),
+            'bytes_written': int(counters['bytes_written']),
+            'latency': metrics['latency'],
         }
 
     def clear_cache(self, older_than_days: Optional[int] = None):
         """Clear cache entries, optionally only those older than specified days"""
+        self._ensure_loaded()
         if older_than_days is None:
+            removed = len(self.cache)
             self.cache.clear()
             self.index.clear()
+            self.prompt_index.clear()
+            self.token_index.clear()
+            self.eviction_policy.clear()
+            self.expiry.clear()
+            self._quality_pending = []
+            if self.lsh is not None:
+                self.lsh.clear()
+            if self.semantic is not None:
+                self.semantic.clear()
+            self.bloom.clear()
+            self.negative_cache.invalidate()
+            self.writer.clear()
         else:
-            cutoff_date = datetime.now() - timedelta(days=older_than_days)
-            to_remove = [k for k, v in self.cache.items() if v.created_at < cutoff_date]
-            for key in to_remove:
-                del self.cache[key]
-                if key in self.index:
-                    del self.index[key]
+            cutoff = (datetime.now() - timedelta(days=older_than_days)).timestamp()
+            to_remove = [k for k, created_at in self.cache.scan('created_at') if created_at < cutoff]
+            removed = len(to_remove)
+            self._remove_entries(to_remove)
 
-        self._save_cache()
-        print(f"Cleared {len(to_remove) if older_than_days else len(self.cache)} cache entries")
+        print(f"Cleared {removed} cache entries")
 
     def optimize_cache(self):
         """Optimize cache by removing duplicates and low-value entries"""
+        self._ensure_loaded()
         # Remove exact duplicates (same prompt, different responses)
         prompt_groups = {}
         for key, response in self.cache.items():
@@ -318,19 +3288,605 @@ class AICache:
                 for key, _ in sorted_responses[1:]:
                     to_remove.append(key)
 
-        for key in to_remove:
-            del self.cache[key]
-            if key in self.index:
-                del self.index[key]
+        self._remove_entries(to_remove)
+        self._cleanup_cache()
+
+        live_blobs = {r.response_ref for r in self.cache.values() if r.response_ref}
+        orphaned = self.blobs.gc(live_blobs)
+
+        print(f"Cache optimization: removed {len(to_remove)} duplicate/low-quality entries, "
+              f"{orphaned} orphaned blobs")
+
+    def export_snapshot(self, path: Path) -> int:
+        """Write every entry to a compressed, versioned snapshot; returns the entry count"""
+        self._ensure_loaded()
+        digest = hashlib.sha256()
+        count = 0
+        with gzip.open(path, 'wt', encoding='utf-8') as f:
+            f.write(json.dumps({
+                'format': self.SNAPSHOT_FORMAT,
+                'version': self.SNAPSHOT_VERSION,
+                'created_at': datetime.now().isoformat(),
+                'entries': len(self.cache),
+            }) + '\n')
+            for key, cached in self.cache.items():
+                entry = cached.detach()
+                if entry.response is None and entry.response_ref:
+                    entry.response = self.blobs.get(entry.response_ref)
+                record = _response_to_json(entry, inline_blobs=True)
+                record['response_ref'] = None
+                record['response_size'] = 0
+                record['contexts'] = self.index.get(key)
+                body = json.dumps(record, separators=(',', ':'))
+                entry_hash = hashlib.sha256(body.encode()).hexdigest()
+                digest.update(entry_hash.encode())
+                f.write(f"{entry_hash} {body}\n")
+                count += 1
+            f.write(json.dumps({'end': True, 'entries': count, 'digest': digest.hexdigest()}) + '\n')
+        return count
+
+    def _decode_snapshot_lines(self, lines: List[str]) -> Tuple[List[Dict[str, Any]], int]:
+        """Verify and parse snapshot entry lines; returns (records, corrupt count)
+
+        Runs on worker threads, so large bodies are compressed into the blob
+        store here rather than on the thread applying the records.
+        """
+        records, corrupt = [], 0
+        for line in lines:
+            entry_hash, _, body = line.rstrip('\n').partition(' ')
+            if hashlib.sha256(body.encode()).hexdigest() != entry_hash:
+                corrupt += 1
+                continue
+            record = json.loads(body)
+            response = record.get('response')
+            if self.blob_threshold is not None and response and len(response) >= self.blob_threshold:
+                record['response_ref'], record['response_size'] = self.blobs.put(response)
+                record['response'] = None
+            records.append(record)
+        return records, corrupt
+
+    def import_snapshot(self, path: Path, on_conflict: str = 'quality',
+                        workers: Optional[int] = None, batch_size: int = 1000) -> Dict[str, int]:
+        """
+        Stream a snapshot into the cache
+
+        Lines are read in batches; worker threads verify and parse batches
+        while earlier ones are applied, and each batch is committed as one
+        storage transaction. Entries whose hash does not match are skipped.
+        on_conflict picks the winner when a key already exists: 'quality'
+        (highest quality_score, then newest), 'newest', 'keep' or 'replace'.
+        """
+        if on_conflict not in self.SNAPSHOT_CONFLICT_RULES:
+            raise ValueError(f"Unknown conflict rule: {on_conflict}")
+        self._ensure_loaded()
+        replaces = self.SNAPSHOT_CONFLICT_RULES[on_conflict]
+        result = {'imported': 0, 'skipped': 0, 'corrupt': 0}
+        workers = workers or min(8, os.cpu_count() or 4)
+
+        def apply(records: List[Dict[str, Any]]):
+            upserts = []
+            for record in records:
+                contexts = record.pop('contexts', None)
+                incoming = _response_from_json(record)
+                current = self.cache.get(incoming.prompt_hash)
+                if current is not None and not replaces(current, incoming):
+                    result['skipped'] += 1
+                    continue
+                view = self._insert_entry(incoming)
+                for context_hash in contexts or []:
+                    merged = self.index.setdefault(incoming.prompt_hash, [])
+                    if context_hash not in merged:
+                        merged.append(context_hash)
+                upserts.append((view, self.index.get(incoming.prompt_hash)))
+            with self.metrics.timer('save'):
+                self.writer.apply_batch(upserts, [], [])
+            result['imported'] += len(upserts)
+
+        digest = hashlib.sha256()
+        trailer = None
+        with gzip.open(path, 'rt', encoding='utf-8') as f, ThreadPoolExecutor(max_workers=workers) as pool:
+            header = json.loads(f.readline() or '{}')
+            if header.get('format') != self.SNAPSHOT_FORMAT:
+                raise ValueError(f"{path} is not an AI cache snapshot")
+            if header.get('version', 0) > self.SNAPSHOT_VERSION:
+                raise ValueError(f"Snapshot version {header['version']} is newer than supported "
+                                 f"({self.SNAPSHOT_VERSION})")
+
+            in_flight = deque()
+
+            def drain(limit: int):
+                while len(in_flight) > limit:
+                    records, corrupt = in_flight.popleft().result()
+                    result['corrupt'] += corrupt
+                    apply(records)
+
+            batch = []
+            for line in f:
+                if line.startswith('{'):
+                    trailer = json.loads(line)
+                    break
+                digest.update(line[:64].encode())
+                batch.append(line)
+                if len(batch) >= batch_size:
+                    in_flight.append(pool.submit(self._decode_snapshot_lines, batch))
+                    batch = []
+                    # Bounded read-ahead keeps memory flat for large snapshots
+                    drain(workers * 2)
+            if batch:
+                in_flight.append(pool.submit(self._decode_snapshot_lines, batch))
+            drain(0)
+
+        if trailer is None:
+            print(f"Warning: {path} is truncated (no trailer); imported the complete entries", file=sys.stderr)
+        elif trailer.get('digest') != digest.hexdigest():
+            print(f"Warning: {path} digest mismatch; corrupt entries were skipped", file=sys.stderr)
 
         self._cleanup_cache()
-        self._save_cache()
+        return result
+
+    def warm(self, lines) -> Dict[str, int]:
+        """
+        Preload the cache from a prompt list or an interaction log
+
+        Each line is either a plain prompt, a JSON object with a prompt (and
+        optional context), or a logged interaction with prompt, response,
+        model, tokens_used and cost. Interactions are stored; prompts that are
+        already cached are marked as recently used so eviction keeps them
+        (blob bodies stay on disk until a hit reads them). Warming does not
+        count as cache hits.
+        """
+        self._ensure_loaded()
+        records, keys = [], []
+        for line in lines:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            if not line.startswith('{'):
+                keys.append(self._generate_prompt_hash(line))
+                continue
+            item = json.loads(line)
+            if item.get('response') is not None:
+                records.append({
+                    'prompt': item['prompt'], 'response': item['response'],
+                    'model': item.get('model', 'unknown'),
+                    'tokens_used': item.get('tokens_used', item.get('tokens', 0)),
+                    'cost': item.get('cost', 0.0), 'quality_score': item.get('quality_score'),
+                    'context': item.get('context'), 'metadata': item.get('metadata'),
+                })
+            else:
+                keys.append(self._generate_prompt_hash(item['prompt'], item.get('context')))
+
+        stored = sum(key is not None for key in self.store_many(records)) if records else 0
+        warmed = 0
+        for key in dict.fromkeys(keys):
+            cached = self.cache.get(key)
+            if cached is None:
+                continue
+            self.eviction_policy.record_access(cached)
+            warmed += 1
+        return {'stored': stored, 'warmed': warmed, 'missing': len(set(keys)) - warmed}
+
+class AsyncAICache:
+    """asyncio front-end for AICache with single-flight request coalescing
+
+    All AICache calls run on one dedicated worker thread, so the event loop
+    never blocks on storage and the (non thread-safe) cache sees one caller
+    at a time. Concurrent get_or_compute() calls for the same key share a
+    single in-flight producer call whose result is stored once.
+
+    With ``fresh_for`` set, hits older than that many seconds are stale:
+    if ``stale_while_revalidate`` is on they are served immediately while
+    one background refresh runs, otherwise they are recomputed first.
+    """
+
+    def __init__(self, cache: AICache, timeout: Optional[float] = 60.0,
+                 fresh_for: Optional[float] = None, stale_while_revalidate: bool = True):
+        self.cache = cache
+        self.timeout = timeout
+        self.fresh_for = fresh_for
+        self.stale_while_revalidate = stale_while_revalidate
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='ai-cache-async')
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._background: set = set()
+
+    async def _call(self, func: Callable, *args, **kwargs) -> Any:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, lambda: func(*args, **kwargs))
+
+    async def get(self, prompt: str, context: Optional[str] = None,
+                  min_quality: Optional[float] = None) -> Optional[CachedResponse]:
+        return await self._call(self.cache.get_cached_response, prompt, context, min_quality)
+
+    async def store(self, prompt: str, response: str, model: str, tokens_used: int, cost: float,
+                    quality_score: Optional[float] = None, context: Optional[str] = None,
+                    metadata: Optional[Dict[str, Any]] = None) -> Optional[str]:
+        return await self._call(self.cache.store_response, prompt, response, model, tokens_used,
+                                cost, quality_score, context, metadata)
+
+    def _is_stale(self, cached: CachedResponse) -> bool:
+        return self.fresh_for is not None and time.time() - cached.created_ts > self.fresh_for
+
+    async def get_or_compute(self, prompt: str, context: Optional[str],
+                             producer: Callable[[], Awaitable[Dict[str, Any]]],
+                             min_quality: Optional[float] = None,
+                             timeout: Optional[float] = None) -> CachedResponse:
+        """
+        Return the cached response, or compute, store and return it
+
+        ``producer`` is an async callable returning the store_response keyword
+        arguments (response, model, tokens_used, cost and optionally
+        quality_score and metadata). ``timeout`` (default: self.timeout) bounds
+        how long this caller waits; a waiter timing out does not cancel the
+        shared computation.
+        """
+        timeout = self.timeout if timeout is None else timeout
+        key = self.cache._generate_prompt_hash(prompt, context)
+
+        if key not in self._inflight:
+            cached = await self.get(prompt, context, min_quality)
+            if cached is not None and not self._is_stale(cached):
+                return cached
+            if cached is not None and self.stale_while_revalidate:
+                self.cache.metrics.inc('stale_served')
+                if key not in self._inflight:
+                    future = self._claim(key)
+                    task = asyncio.ensure_future(self._lead(key, future, prompt, context, producer, timeout))
+                    self._background.add(task)
+                    task.add_done_callback(self._background.discard)
+                    # A task cancelled before it started never reaches _lead's cleanup
+                    task.add_done_callback(lambda _: self._release(key, future))
+                    task.add_done_callback(self._log_refresh_failure)
+                return cached
+
+        future = self._inflight.get(key)
+        if future is not None:
+            self.cache.metrics.inc('coalesced_requests')
+            return await asyncio.wait_for(asyncio.shield(future), timeout)
+        return await self._lead(key, self._claim(key), prompt, context, producer, timeout)
+
+    @staticmethod
+    def _log_refresh_failure(task: asyncio.Task):
+        """Retrieve and log the error of a failed background refresh
+
+        Nobody awaits the task, so asyncio would otherwise report "Task
+        exception was never retrieved" when it is collected.
+        """
+        if not task.cancelled() and task.exception() is not None:
+            logger.warning("Background cache refresh failed", exc_info=task.exception())
+
+    def _claim(self, key: str) -> asyncio.Future:
+        """Register the in-flight future for key
+
+        Called synchronously, before the caller awaits anything, so every
+        later caller for the key finds it and waits instead of producing.
+        """
+        future = asyncio.get_running_loop().create_future()
+        # Nobody may be waiting when the producer fails; mark the error as seen
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        self._inflight[key] = future
+        return future
+
+    def _release(self, key: str, future: asyncio.Future):
+        if self._inflight.get(key) is future:
+            del self._inflight[key]
+        if not future.done():
+            future.cancel()
+
+    async def _lead(self, key: str, future: asyncio.Future, prompt: str, context: Optional[str],
+                    producer: Callable[[], Awaitable[Dict[str, Any]]],
+                    timeout: Optional[float]) -> CachedResponse:
+        """Run the producer once for key, store the result and resolve waiters"""
+        try:
+            result = await asyncio.wait_for(producer(), timeout)
+            await self.store(prompt=prompt, context=context, **result)
+            cached = await self._call(self._stored_entry, key, prompt, context, result)
+            future.set_result(cached)
+            return cached
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            self._release(key, future)
+
+    def _stored_entry(self, key: str, prompt: str, context: Optional[str],
+                      result: Dict[str, Any]) -> CachedResponse:
+        """The entry just stored, or a standalone copy if cleanup already evicted it"""
+        view = self.cache.cache.get(key)
+        if view is not None:
+            return self.cache._materialize(view)
+        now = datetime.now()
+        return CachedResponse(
+            prompt_hash=key, prompt=prompt, response=result['response'], model=result['model'],
+            tokens_used=result['tokens_used'], cost=result['cost'],
+            quality_score=result.get('quality_score'), created_at=now, last_accessed=now,
+            access_count=1, context_hash=self.cache._generate_prompt_hash(context) if context else None,
+            metadata=result.get('metadata') or {}
+        )
+
+    async def close(self):
+        """Wait for background refreshes, then close the underlying cache"""
+        if self._background:
+            await asyncio.gather(*self._background, return_exceptions=True)
+        await self._call(self.cache.close)
+        self._executor.shutdown(wait=True)
+
+# Daemon protocol: each message is a 4-byte big-endian length followed by
+# that many bytes of UTF-8 JSON. Requests carry an "op" field; responses
+# carry "ok" plus either the result fields or an "error" message.
+_FRAME_HEADER = struct.Struct('>I')
+MAX_FRAME_SIZE = 64 * 1024 * 1024
+
+def _send_frame(sock: socket.socket, payload: Dict[str, Any]):
+    data = json.dumps(payload, separators=(',', ':')).encode()
+    sock.sendall(_FRAME_HEADER.pack(len(data)) + data)
+
+def _recv_exact(sock: socket.socket, size: int) -> Optional[bytes]:
+    chunks = []
+    while size:
+        chunk = sock.recv(size)
+        if not chunk:
+            return None
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b''.join(chunks)
+
+def _recv_frame(sock: socket.socket) -> Optional[Dict[str, Any]]:
+    header = _recv_exact(sock, _FRAME_HEADER.size)
+    if header is None:
+        return None
+    (size,) = _FRAME_HEADER.unpack(header)
+    if size > MAX_FRAME_SIZE:
+        raise ValueError(f"Frame too large: {size} bytes")
+    data = _recv_exact(sock, size)
+    if data is None:
+        return None
+    return json.loads(data)
+
+class AICacheServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """Keeps an AICache resident and serves get/store/stats over a Unix socket"""
+
+    daemon_threads = True
+
+    def __init__(self, cache: AICache, socket_path: Path, sweep_interval: float = 60.0):
+        self.cache = cache
+        self.socket_path = socket_path
+        self.cache_lock = threading.Lock()
+        if socket_path.exists():
+            socket_path.unlink()
+        super().__init__(str(socket_path), _AICacheRequestHandler)
+
+        # Expire due entries in the background, so an idle daemon does not
+        # hold on to them until the next request
+        self.sweep_interval = sweep_interval
+        self._stop_sweeper = threading.Event()
+        self._sweeper = threading.Thread(target=self._sweep_loop, name='ai-cache-sweeper', daemon=True)
+        self._sweeper.start()
+
+    def _sweep_loop(self):
+        while not self._stop_sweeper.wait(self.sweep_interval):
+            try:
+                with self.cache_lock:
+                    self.cache.sweep_expired()
+            except Exception as e:
+                print(f"Warning: Expiry sweep failed: {e}", file=sys.stderr)
+
+    def handle_op(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        op = request.get('op')
+        with self.cache_lock:
+            if op == 'get':
+                cached = self.cache.get_cached_response(
+                    prompt=request['prompt'],
+                    context=request.get('context'),
+                    min_quality=request.get('min_quality')
+                )
+                return {'ok': True, 'hit': cached is not None,
+                        'entry': _response_to_json(cached, inline_blobs=True) if cached else None}
+            if op == 'store':
+                key = self.cache.store_response(
+                    prompt=request['prompt'],
+                    response=request['response'],
+                    model=request['model'],
+                    tokens_used=request['tokens_used'],
+                    cost=request['cost'],
+                    quality_score=request.get('quality_score'),
+                    context=request.get('context'),
+                    metadata=request.get('metadata')
+                )
+                return {'ok': True, 'key': key, 'admitted': key is not None}
+            if op == 'stats':
+                return {'ok': True, 'stats': self.cache.get_cache_stats()}
+            if op == 'warm':
+                return {'ok': True, 'result': self.cache.warm(request['lines'])}
+            if op == 'flush':
+                self.cache.flush()
+                return {'ok': True}
+            if op == 'ping':
+                return {'ok': True, 'entries': len(self.cache.cache)}
+        return {'ok': False, 'error': f"Unknown op: {op}"}
+
+    def server_close(self):
+        self._stop_sweeper.set()
+        super().server_close()
+        if self.socket_path.exists():
+            self.socket_path.unlink()
+
+class _AICacheRequestHandler(socketserver.BaseRequestHandler):
+    """Answers framed requests until the client disconnects"""
+
+    def handle(self):
+        while True:
+            try:
+                request = _recv_frame(self.request)
+            except (OSError, ValueError):
+                return
+            if request is None:
+                return
+            try:
+                response = self.server.handle_op(request)
+            except Exception as e:
+                response = {'ok': False, 'error': str(e)}
+            try:
+                _send_frame(self.request, response)
+            except OSError:
+                return
+
+class AICacheClient:
+    """Thin client for a running ``ai-cache.py serve`` daemon
+
+    Raises ConnectionError when no daemon is listening, so callers can fall
+    back to running the CLI.
+    """
+
+    def __init__(self, socket_path: Path, timeout: float = 5.0):
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self._sock: Optional[socket.socket] = None
+
+    def _connect(self) -> socket.socket:
+        if self._sock is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            try:
+                sock.connect(str(self.socket_path))
+            except OSError as e:
+                sock.close()
+                raise ConnectionError(f"AI cache daemon not reachable at {self.socket_path}: {e}") from e
+            self._sock = sock
+        return self._sock
+
+    def _call(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        sock = self._connect()
+        try:
+            _send_frame(sock, payload)
+            response = _recv_frame(sock)
+        except OSError as e:
+            self.close()
+            raise ConnectionError(f"AI cache daemon connection failed: {e}") from e
+        if response is None:
+            self.close()
+            raise ConnectionError("AI cache daemon closed the connection")
+        if not response.get('ok'):
+            raise RuntimeError(response.get('error', 'Unknown daemon error'))
+        return response
+
+    def ping(self) -> bool:
+        try:
+            self._call({'op': 'ping'})
+            return True
+        except (ConnectionError, RuntimeError):
+            return False
+
+    def get(self, prompt: str, context: Optional[str] = None,
+            min_quality: Optional[float] = None) -> Optional[CachedResponse]:
+        response = self._call({'op': 'get', 'prompt': prompt, 'context': context,
+                               'min_quality': min_quality})
+        return _response_from_json(response['entry']) if response['hit'] else None
+
+    def store(self, prompt: str, response: str, model: str, tokens_used: int, cost: float,
+              quality_score: Optional[float] = None, context: Optional[str] = None,
+              metadata: Optional[Dict[str, Any]] = None) -> Optional[str]:
+        """Store through the daemon; None when its admission policy rejected the response"""
+        return self._call({
+            'op': 'store', 'prompt': prompt, 'response': response, 'model': model,
+            'tokens_used': tokens_used, 'cost': cost, 'quality_score': quality_score,
+            'context': context, 'metadata': metadata
+        })['key']
+
+    def stats(self) -> Dict[str, Any]:
+        return self._call({'op': 'stats'})['stats']
+
+    def warm(self, lines: List[str]) -> Dict[str, int]:
+        return self._call({'op': 'warm', 'lines': lines})['result']
 
-        print(f"Cache optimization: removed {len(to_remove)} duplicate/low-quality entries")
+    def close(self):
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
+
+    def __enter__(self) -> 'AICacheClient':
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+def default_socket_path(project_root: Path) -> Path:
+    """Socket location used by ``serve`` and by default clients"""
+    return project_root / '.ai' / 'cache' / 'ai-cache.sock'
+
+def run_batch(cache: AICache, lines, out, chunk_size: int = 1000) -> int:
+    """
+    Process a JSONL stream of get/store requests and stream JSONL results
+
+    Each input line is {"op": "get"|"store", "id": ..., ...} with the same
+    fields as the daemon protocol. Consecutive requests of the same kind are
+    handed to get_many/store_many together, so input order is preserved.
+    Returns the number of failed lines.
+    """
+    failures = 0
+
+    def flush_run(run):
+        nonlocal failures
+        if not run:
+            return
+        op = run[0][1]['op']
+        try:
+            if op == 'get':
+                results = cache.get_many([r['prompt'] for _, r in run],
+                                         [r.get('context') for _, r in run],
+                                         min_quality=run[0][1].get('min_quality'))
+                replies = [{'id': rid, 'hit': cached is not None,
+                            'entry': _response_to_json(cached, inline_blobs=True) if cached else None}
+                           for (rid, _), cached in zip(run, results)]
+            else:
+                keys = cache.store_many([{
+                    'prompt': r['prompt'], 'response': r['response'], 'model': r['model'],
+                    'tokens_used': r['tokens_used'], 'cost': r['cost'],
+                    'quality_score': r.get('quality_score'), 'context': r.get('context'),
+                    'metadata': r.get('metadata')
+                } for _, r in run])
+                replies = [{'id': rid, 'key': key, 'admitted': key is not None}
+                           for (rid, _), key in zip(run, keys)]
+        except (KeyError, TypeError) as e:
+            failures += len(run)
+            replies = [{'id': rid, 'error': f"invalid request: {e}"} for rid, _ in run]
+        for reply in replies:
+            out.write(json.dumps(reply, default=str) + '\n')
+        out.flush()
+
+    run: List[Tuple[Any, Dict[str, Any]]] = []
+    run_kind = None
+    for line_number, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            request = json.loads(line)
+            if request.get('op') not in ('get', 'store'):
+                raise ValueError(f"unknown op: {request.get('op')!r}")
+        except (json.JSONDecodeError, ValueError, AttributeError) as e:
+            flush_run(run)
+            run, run_kind = [], None
+            failures += 1
+            out.write(json.dumps({'id': line_number, 'error': str(e)}) + '\n')
+            continue
+
+        # A get run shares one min_quality, so a change starts a new run
+        kind = (request['op'], request.get('min_quality') if request['op'] == 'get' else None)
+        if kind != run_kind or len(run) >= chunk_size:
+            flush_run(run)
+            run, run_kind = [], kind
+        run.append((request.get('id', line_number), request))
+    flush_run(run)
+
+    return failures
 
 def main():
     parser = argparse.ArgumentParser(description='AI Response Caching System')
-    parser.add_argument('command', choices=['stats', 'store', 'get', 'clear', 'optimize'],
+    parser.add_argument('command', choices=['stats', 'store', 'get', 'clear', 'optimize', 'migrate', 'serve',
+                                            'metrics', 'batch', 'export', 'import', 'warm'],
                        help='Command to execute')
     parser.add_argument('--prompt', help='Prompt for store/get operations')
     parser.add_argument('--response', help='Response for store operation')
@@ -339,25 +3895,97 @@ def main():
     parser.add_argument('--cost', type=float, help='Cost incurred')
     parser.add_argument('--quality', type=float, help='Quality score (0.0-1.0)')
     parser.add_argument('--context', help='Context for the prompt')
+    parser.add_argument('--ttl-days', type=float,
+                       help='Lifetime of a stored response in days (default: max_age_days)')
+    parser.add_argument('--task-type', help='Task type recorded with a stored response (selects its TTL)')
     parser.add_argument('--older-than', type=int, help='Clear entries older than N days')
+    parser.add_argument('--backend', choices=sorted(STORAGE_BACKENDS), default='sqlite',
+                       help='Cache storage backend (default: sqlite)')
+    parser.add_argument('--shards', type=int,
+                       help='Shard count for a new sharded cache (default: 16)')
+    parser.add_argument('--shard-backend', choices=sorted(ShardedCacheStorage.SHARD_BACKENDS),
+                       help='Storage used by each shard of a new sharded cache (default: sqlite)')
+    parser.add_argument('--similarity-mode', choices=['exact', 'lsh'], default='exact',
+                       help='Similarity search: exact Jaccard index or approximate MinHash/LSH')
+    parser.add_argument('--lsh-bands', type=int, default=16,
+                       help='LSH bands (more bands = higher recall)')
+    parser.add_argument('--lsh-rows', type=int, default=4,
+                       help='Rows per LSH band (more rows = higher precision)')
+    parser.add_argument('--lsh-rerank', action='store_true',
+                       help='Re-rank LSH candidates with exact Jaccard similarity')
+    parser.add_argument('--eviction-policy', choices=sorted(EVICTION_POLICIES), default='lfu',
+                       help='Capacity eviction policy (default: lfu)')
+    parser.add_argument('--admission-policy', choices=sorted(ADMISSION_POLICIES), default='always',
+                       help='Which new responses are cached at all (default: always)')
+    parser.add_argument('--write-behind', action='store_true',
+                       help='Buffer cache writes and flush them in batches')
+    parser.add_argument('--socket', help='Unix socket path for serve (default: .ai/cache/ai-cache.sock)')
+    parser.add_argument('--format', choices=['json', 'prometheus'], default='json',
+                       help='Output format for the metrics command')
+    parser.add_argument('--semantic', action='store_true',
+                       help='Enable the semantic (embedding) cache tier')
+    parser.add_argument('--semantic-threshold', type=float,
+                       help='Minimum cosine similarity for semantic hits (default: 0.8)')
+    parser.add_argument('--input', default='-',
+                       help='Input file for batch/import/warm (default: stdin)')
+    parser.add_argument('--output', help='Snapshot file for export')
+    parser.add_argument('--on-conflict', choices=sorted(AICache.SNAPSHOT_CONFLICT_RULES), default='quality',
+                       help='Which entry wins when import meets an existing key')
+    parser.add_argument('--workers', type=int, help='Worker threads for import')
+    parser.add_argument('--blob-codec', choices=sorted(BlobStore.CODEC_EXTENSIONS), default='zlib',
+                       help='Compression for large response blobs (zstd needs the zstandard package)')
 
     args = parser.parse_args()
 
-    # Initialize cache
     project_root = Path(__file__).parent.parent
-    cache = AICache(project_root)
+
+    def open_cache() -> AICache:
+        cache = AICache(project_root, backend=args.backend,
+                        similarity_mode=args.similarity_mode,
+                        lsh_bands=args.lsh_bands, lsh_rows=args.lsh_rows,
+                        lsh_rerank=args.lsh_rerank,
+                        eviction_policy=args.eviction_policy,
+                        admission_policy=args.admission_policy,
+                        # The daemon always batches writes; hits must not block on disk
+                        write_behind=args.write_behind or args.command == 'serve',
+                        blob_codec=args.blob_codec,
+                        shards=args.shards, shard_backend=args.shard_backend,
+                        semantic=args.semantic,
+                        # A one-shot lookup should not pay for loading the whole cache
+                        lazy_load=args.command == 'get')
+        if args.semantic_threshold is not None:
+            cache.semantic_threshold = args.semantic_threshold
+        return cache
+
+    # warm only opens a local cache if no daemon answers
+    cache = open_cache() if args.command != 'warm' else None
 
     if args.command == 'stats':
         stats = cache.get_cache_stats()
         print("🤖 AI Response Cache Statistics")
         print("=" * 40)
         print(f"Total Entries: {stats['total_entries']}")
-        print(f"Estimated Cost Saved: ${stats['total_cost_saved']}")
-        print(f"Estimated Tokens Saved: {stats['total_tokens_saved']:,}")
+        print(f"Cost Saved: ${stats['total_cost_saved']}")
+        print(f"Tokens Saved: {stats['total_tokens_saved']:,}")
         print(f"Cache Hit Rate: {stats['cache_hit_rate']:.1%}")
+        hits = stats['hits']
+        print(f"Hits: {hits['exact']} exact, {hits['context']} context, {hits['similarity']} similarity, "
+              f"{hits['semantic']} semantic / Misses: {stats['misses']}")
+        lookup = stats['latency']['lookup']
+        print(f"Lookup Latency: p50 {lookup['p50_ms']:.3f} ms, p99 {lookup['p99_ms']:.3f} ms")
         print(f"Average Quality Score: {stats['avg_quality_score']:.3f}")
         print(f"Models Used: {', '.join(stats['models_used'])}")
         print(f"Total Accesses: {stats['total_accesses']}")
+        evictions = stats['evictions']
+        print(f"Evictions ({stats['eviction_policy']}): {evictions['capacity']} capacity, "
+              f"{evictions['expired']} expired, {evictions['low_quality']} low quality")
+        admission = stats['admission']
+        print(f"Admission ({admission['policy']}): {admission['admitted']} admitted, "
+              f"{admission['rejected']} rejected ({admission['rejected_bytes']:,} bytes), "
+              f"{admission['hit_rate_per_mb']:.3f} hit rate per MB stored")
+        bloom = stats['bloom_filter']
+        print(f"Bloom Filter: {bloom['tokens']:,} tokens, {bloom['fill_ratio']:.1%} full, "
+              f"{bloom['estimated_fp_rate']:.4%} estimated false positives")
         if stats['oldest_entry']:
             print(f"Oldest Entry: {stats['oldest_entry']}")
         if stats['newest_entry']:
@@ -375,9 +4003,14 @@ def main():
             tokens_used=args.tokens,
             cost=args.cost,
             quality_score=args.quality,
-            context=args.context
+            context=args.context,
+            metadata={name: value for name, value in
+                      (('ttl_days', args.ttl_days), ('task_type', args.task_type)) if value is not None}
         )
-        print(f"✅ Stored response in cache with key: {key}")
+        if key is None:
+            print(f"⚠️  Response not cached: rejected by the {cache.admission.name} admission policy")
+        else:
+            print(f"✅ Stored response in cache with key: {key}")
 
     elif args.command == 'get':
         if not args.prompt:
@@ -408,5 +4041,79 @@ def main():
         cache.optimize_cache()
         print("✅ Cache optimized")
 
+    elif args.command == 'migrate':
+        # Opening the SQLite or sharded backend already performs the one-time import
+        if cache.storage.name == 'sqlite':
+            print(f"✅ Cache stored in {cache.storage.db_file} ({len(cache.cache)} entries)")
+        elif cache.storage.name == 'sharded':
+            print(f"✅ Cache stored in {cache.storage.shard_dir} "
+                  f"({len(cache.storage.shards)} shards, {len(cache.cache)} entries)")
+        else:
+            print("Error: migrate requires --backend sqlite or --backend sharded")
+            sys.exit(1)
+
+    elif args.command == 'metrics':
+        if args.format == 'prometheus':
+            print(cache.metrics.to_prometheus(), end='')
+        else:
+            print(json.dumps(cache.metrics.to_dict(), indent=2))
+
+    elif args.command == 'batch':
+        if args.input == '-':
+            failures = run_batch(cache, sys.stdin, sys.stdout)
+        else:
+            with open(args.input, encoding='utf-8') as f:
+                failures = run_batch(cache, f, sys.stdout)
+        if failures:
+            print(f"⚠️  {failures} batch request(s) failed", file=sys.stderr)
+
+    elif args.command == 'export':
+        if not args.output:
+            print("Error: --output required for export")
+            sys.exit(1)
+        count = cache.export_snapshot(Path(args.output))
+        print(f"✅ Exported {count} entries to {args.output}")
+
+    elif args.command == 'import':
+        if args.input == '-':
+            print("Error: --input required for import")
+            sys.exit(1)
+        result = cache.import_snapshot(Path(args.input), on_conflict=args.on_conflict, workers=args.workers)
+        print(f"✅ Imported {result['imported']} entries "
+              f"({result['skipped']} kept existing, {result['corrupt']} corrupt)")
+
+    elif args.command == 'warm':
+        if args.input == '-':
+            lines = sys.stdin.read().splitlines()
+        else:
+            with open(args.input, encoding='utf-8') as f:
+                lines = f.read().splitlines()
+        # Warm the resident daemon if one is running, otherwise this cache
+        socket_path = Path(args.socket) if args.socket else default_socket_path(project_root)
+        with AICacheClient(socket_path) as client:
+            if client.ping():
+                result = client.warm(lines)
+            else:
+                cache = open_cache()
+                result = cache.warm(lines)
+        print(f"✅ Warmed {result['warmed']} entries, stored {result['stored']}, "
+              f"{result['missing']} prompts not cached")
+
+    elif args.command == 'serve':
+        socket_path = Path(args.socket) if args.socket else default_socket_path(project_root)
+        server = AICacheServer(cache, socket_path)
+        # Exit through the finally/atexit path so buffered writes get flushed
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+        print(f"🚀 AI cache daemon listening on {socket_path} ({len(cache.cache)} entries)", file=sys.stderr)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+
+    if cache is not None:
+        cache.close()
+
 if __name__ == '__main__':
     main()
\ No newline at end of file
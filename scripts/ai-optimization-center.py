@@ -13,6 +13,8 @@ from datetime import datetime, timedelta
 import argparse
 import subprocess
 
+from ai_common import load_script
+
 class AIOptimizationCenter:
     """Central control system for AI optimization features"""
 
@@ -27,6 +29,54 @@ class AIOptimizationCenter:
         self.batch_script = self.scripts_dir / 'ai-batch-processor.py'
         self.selector_script = self.scripts_dir / 'ai-model-selector.py'
 
+        # Talk to a running `ai-cache.py serve` daemon when there is one,
+        # falling back to one CLI subprocess per cache operation otherwise.
+        # ai-cache.py is only imported and the daemon only probed on first use.
+        self.cache_client = None
+        self._cache_client_probed = False
+
+    def _daemon_client(self):
+        """Client of the cache daemon, connected on first use (None without a daemon)"""
+        if not self._cache_client_probed:
+            self._cache_client_probed = True
+            try:
+                cache_module = load_script('ai-cache.py', self.scripts_dir)
+                client = cache_module.AICacheClient(cache_module.default_socket_path(self.project_root))
+                if client.ping():
+                    self.cache_client = client
+            except Exception:
+                self.cache_client = None
+        return self.cache_client
+
+    def cache_lookup(self, prompt: str, context: Optional[str] = None) -> bool:
+        """Return True if the cache holds a response for the prompt"""
+        if self._daemon_client() is not None:
+            try:
+                return self.cache_client.get(prompt, context=context) is not None
+            except (ConnectionError, RuntimeError):
+                self.cache_client = None
+        args = ['get', '--prompt', prompt]
+        if context:
+            args += ['--context', context]
+        return 'Cache hit!' in self.run_command(self.cache_script, args)
+
+    def cache_store(self, prompt: str, response: str, model: str, tokens_used: int,
+                    cost: float, context: Optional[str] = None):
+        """Store a response in the cache"""
+        if self._daemon_client() is not None:
+            try:
+                self.cache_client.store(prompt, response, model, tokens_used, cost, context=context)
+                return
+            except (ConnectionError, RuntimeError):
+                self.cache_client = None
+        args = [
+            'store', '--prompt', prompt, '--response', response, '--model', model,
+            '--tokens', str(tokens_used), '--cost', str(cost)
+        ]
+        if context:
+            args += ['--context', context]
+        self.run_command(self.cache_script, args)
+
     def run_command(self, script: Path, args: List[str]) -> str:
         """Run a script command and return output"""
         try:
@@ -103,8 +153,7 @@ class AIOptimizationCenter:
         }
 
         # 1. Check cache first
-        cache_result = self.run_command(self.cache_script, ['get', '--prompt', prompt])
-        if 'Cache hit!' in cache_result:
+        if self.cache_lookup(prompt):
             optimization['processing_method'] = 'cache_hit'
             optimization['estimated_savings'] = 0.8  # 80% cost savings
             optimization['optimization_strategy']['cache'] = 'Response found in cache'
@@ -172,12 +221,12 @@ class AIOptimizationCenter:
             ])
 
             # Store in cache for future use
-            self.run_command(self.cache_script, [
-                'store', '--prompt', prompt, '--response', result['processing']['response'],
-                '--model', result['processing']['model'],
-                '--tokens', str(result['processing']['tokens_used']),
-                '--cost', str(result['processing']['cost'])
-            ])
+            self.cache_store(
+                prompt, result['processing']['response'],
+                model=result['processing']['model'],
+                tokens_used=result['processing']['tokens_used'],
+                cost=result['processing']['cost']
+            )
 
         # Evaluate quality
         quality_output = self.run_command(self.quality_script, [
@@ -0,0 +1,26 @@
+"""
+Shared helpers for the ai-*.py scripts
+The scripts have hyphenated file names, so they load one another through load_script
+"""
+
+import importlib.util
+from pathlib import Path
+from types import ModuleType
+from typing import List
+
+SCRIPTS_DIR = Path(__file__).resolve().parent
+
+def load_script(file_name: str, scripts_dir: Path = SCRIPTS_DIR) -> ModuleType:
+    """Import a script such as 'ai-cache.py' (hyphenated, so not importable by name)"""
+    module_name = Path(file_name).stem.replace('-', '_')
+    spec = importlib.util.spec_from_file_location(module_name, scripts_dir / file_name)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an unsorted list (0.0 when empty)"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
@@ -0,0 +1,35 @@
+"""
+Unit tests for the ai-*.py scripts
+Run from the repository root with: python -m pytest -q scripts/tests
+"""
+
+import sys
+import tempfile
+import unittest
+from functools import lru_cache
+from pathlib import Path
+
+SCRIPTS_DIR = Path(__file__).resolve().parent.parent
+if str(SCRIPTS_DIR) not in sys.path:
+    sys.path.insert(0, str(SCRIPTS_DIR))
+
+from ai_common import load_script
+
+@lru_cache(maxsize=None)
+def script(file_name: str):
+    """Load a script once per test run (see ai_common.load_script)"""
+    return load_script(file_name, SCRIPTS_DIR)
+
+class TempDirTestCase(unittest.TestCase):
+    """Test case with a fresh project root under self.root"""
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory(prefix='ai-scripts-test-')
+        self.addCleanup(self._tmp.cleanup)
+        self.root = Path(self._tmp.name)
+
+    def open_cache(self, **kwargs):
+        """AICache in the temp project root, closed again at teardown"""
+        cache = script('ai-cache.py').AICache(self.root, **kwargs)
+        self.addCleanup(cache.close)
+        return cache
@@ -0,0 +1,71 @@
+"""SimilarityClusterer: dense and prefix-filtered paths agree with brute force"""
+
+import random
+import unittest
+
+from tests import TempDirTestCase, script
+
+WORDS = ('explain', 'document', 'refactor', 'test', 'the', 'order', 'payment', 'user', 'service',
+         'api', 'repository', 'login', 'page', 'queue', 'schema', 'cache', 'retry', 'handler')
+
+class SimilarityClustererTest(unittest.TestCase):
+
+    def setUp(self):
+        self.batch = script('ai-batch-processor.py')
+        rng = random.Random(11)
+        self.prompts = [' '.join(rng.sample(WORDS, rng.randint(1, 6))) for _ in range(250)]
+        self.token_sets = [self.batch.SimilarityClusterer.tokenize(p) for p in self.prompts]
+
+    def brute_force(self, threshold):
+        result = [[] for _ in self.token_sets]
+        for i, a in enumerate(self.token_sets):
+            for j, b in enumerate(self.token_sets):
+                if i != j and len(a & b) / len(a | b) > threshold:
+                    result[i].append(j)
+        return result
+
+    def indexes(self, neighbors):
+        return [[j for _, j in matches] for matches in neighbors]
+
+    def test_both_paths_match_brute_force(self):
+        for threshold in (0.3, 0.6, 0.9):
+            expected = self.brute_force(threshold)
+            for dense_limit in (0, 10_000):
+                with self.subTest(threshold=threshold, dense=bool(dense_limit)):
+                    clusterer = self.batch.SimilarityClusterer(threshold, dense_limit=dense_limit, block_size=64)
+                    self.assertEqual(self.indexes(clusterer.neighbors(self.token_sets)), expected)
+
+    def test_reported_similarity_is_the_jaccard_score(self):
+        clusterer = self.batch.SimilarityClusterer(0.3)
+        for i, matches in enumerate(clusterer.neighbors(self.token_sets)[:20]):
+            for similarity, j in matches:
+                a, b = self.token_sets[i], self.token_sets[j]
+                self.assertAlmostEqual(similarity, len(a & b) / len(a | b), places=6)
+
+    def test_degenerate_inputs(self):
+        clusterer = self.batch.SimilarityClusterer(0.6)
+        self.assertEqual(clusterer.neighbors([]), [])
+        self.assertEqual(clusterer.neighbors([frozenset()]), [[]])
+        self.assertEqual(clusterer.neighbors([frozenset({'a'}), frozenset({'b'})]), [[], []])
+
+class GroupingTest(TempDirTestCase):
+
+    def test_groups_similar_prompts_of_one_model_up_to_the_batch_size(self):
+        batch = script('ai-batch-processor.py')
+        processor = batch.BatchProcessor(self.root, max_batch_size=3)
+        requests = [batch.BatchRequest(id=f"r{i}", prompt=prompt, metadata={'model': model})
+                    for i, (prompt, model) in enumerate([
+                        ('write unit tests for the order service', 'gpt-4'),
+                        ('write unit tests for the payment service', 'gpt-4'),
+                        ('write unit tests for the user service', 'gpt-4'),
+                        ('write unit tests for the login service', 'gpt-4'),
+                        ('write unit tests for the cart service', 'claude-3-haiku'),
+                        ('fix the login page layout', 'gpt-4'),
+                    ])]
+        groups = processor._group_similar_requests(requests)
+        self.assertEqual([[r.id for r in group.requests] for group in groups],
+                         [['r0', 'r1', 'r2'], ['r3'], ['r4'], ['r5']])
+        self.assertTrue(groups[0].common_prompt)
+
+if __name__ == '__main__':
+    unittest.main()
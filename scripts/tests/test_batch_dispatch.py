@@ -0,0 +1,58 @@
+"""BatchProcessor dispatch: a saturated model does not hold up other models"""
+
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+from tests import TempDirTestCase, script
+
+class PerModelDispatchTest(TempDirTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.batch = script('ai-batch-processor.py')
+        self.processor = self.batch.BatchProcessor(self.root, max_concurrency=2, model_limits={'slow': 1})
+        self.processor.executor = ThreadPoolExecutor(max_workers=2)
+        self.addCleanup(self.processor.executor.shutdown, wait=True)
+
+        self.started = {}
+        self.running = {'slow': 0, 'peak_slow': 0}
+        process = self.processor._process_batch
+        lock = threading.Lock()
+
+        def slow_process(group):
+            model = self.processor._group_model(group)
+            self.started[group.id] = time.monotonic()
+            if model == 'slow':
+                with lock:
+                    self.running['slow'] += 1
+                    self.running['peak_slow'] = max(self.running['peak_slow'], self.running['slow'])
+                time.sleep(0.2)
+                with lock:
+                    self.running['slow'] -= 1
+            return process(group)
+
+        self.processor._process_batch = slow_process
+
+    def group(self, group_id, model):
+        request = self.batch.BatchRequest(id=f"{group_id}-req", prompt=group_id, metadata={'model': model})
+        group = self.batch.BatchGroup(id=group_id, requests=[request])
+        with self.processor.lock:
+            self.processor._register_group(group)
+        return group
+
+    def test_other_model_is_not_blocked_by_a_saturated_one(self):
+        start = time.monotonic()
+        for i in range(3):
+            self.processor._dispatch(self.group(f"slow{i}", 'slow'))
+        self.processor._dispatch(self.group('fast', 'fast'))
+        self.processor.executor.shutdown(wait=True)
+
+        self.assertLess(self.started['fast'] - start, 0.1)
+        self.assertEqual(self.running['peak_slow'], 1)
+        self.assertEqual(len(self.processor.processing_results), 4)
+        self.assertEqual(self.processor._model_active, {'slow': 0, 'fast': 0})
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,39 @@
+"""BatchProcessor journal: state survives restarts, also after a torn write"""
+
+import unittest
+
+from tests import TempDirTestCase, script
+
+class JournalRecoveryTest(TempDirTestCase):
+
+    def open_processor(self):
+        return script('ai-batch-processor.py').BatchProcessor(self.root)
+
+    def pending_prompts(self, processor):
+        return sorted(request.prompt for request in processor.request_queue.snapshot())
+
+    def test_pending_requests_survive_a_restart(self):
+        processor = self.open_processor()
+        processor.submit_request('explain the order service')
+        processor.submit_request('document the payment api')
+        self.assertEqual(self.pending_prompts(self.open_processor()),
+                         ['document the payment api', 'explain the order service'])
+
+    def test_torn_tail_is_truncated_before_new_appends(self):
+        processor = self.open_processor()
+        processor.submit_request('explain the order service')
+        with open(processor.journal_file, 'a') as f:
+            f.write('{"event": "submit", "request": {"id": "req_torn", "pro')
+
+        processor = self.open_processor()
+        self.assertEqual(self.pending_prompts(processor), ['explain the order service'])
+        processor.submit_request('document the payment api')
+
+        processor = self.open_processor()
+        self.assertEqual(self.pending_prompts(processor),
+                         ['document the payment api', 'explain the order service'])
+        lines = processor.journal_file.read_text().splitlines()
+        self.assertTrue(all(line.endswith('}') for line in lines))
+
+if __name__ == '__main__':
+    unittest.main()
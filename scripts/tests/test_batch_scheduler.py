@@ -0,0 +1,77 @@
+"""PriorityScheduler: service order, submitted_ahead and ticket rebasing"""
+
+import unittest
+from datetime import datetime, timedelta
+
+from tests import script
+
+class PrioritySchedulerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.batch = script('ai-batch-processor.py')
+        self.scheduler = self.batch.PriorityScheduler(max_wait_time=3600)
+
+    def put(self, name, priority=1, age=0.0, scheduler=None):
+        request = self.batch.BatchRequest(id=name, prompt=name, priority=priority,
+                                          submitted_at=datetime.now() - timedelta(seconds=age))
+        return (scheduler or self.scheduler).put(request)
+
+    def drain(self, scheduler=None):
+        scheduler = scheduler or self.scheduler
+        served = []
+        while not scheduler.empty():
+            served.append(scheduler.get_nowait().id)
+        return served
+
+    def test_overdue_backlog_does_not_jump_urgent_work(self):
+        scheduler = self.batch.PriorityScheduler(max_wait_time=30)
+        for i in range(100):
+            self.put(f"bulk{i}", age=60, scheduler=scheduler)
+        self.put('urgent', priority=5, scheduler=scheduler)
+        self.assertEqual(self.drain(scheduler)[0], 'urgent')
+
+    def test_aging_still_lifts_a_long_waiting_backlog(self):
+        scheduler = self.batch.PriorityScheduler(max_wait_time=30)
+        self.put('bulk', age=200, scheduler=scheduler)
+        self.put('urgent', priority=5, scheduler=scheduler)
+        self.assertEqual(self.drain(scheduler), ['bulk', 'urgent'])
+
+    def test_overdue_request_goes_first_within_its_level(self):
+        scheduler = self.batch.PriorityScheduler(max_wait_time=30, fair_queuing=True)
+        # Agent b has used more than its share, so fair queuing alone would pick agent a
+        scheduler._agent_finish['b'] = 5.0
+        fresh = self.batch.BatchRequest(id='fresh', prompt='fresh', priority=2, metadata={'agent': 'a'})
+        overdue = self.batch.BatchRequest(id='overdue', prompt='overdue', priority=2, metadata={'agent': 'b'},
+                                          submitted_at=datetime.now() - timedelta(seconds=20))
+        scheduler.put(fresh)
+        scheduler.put(overdue)
+        self.assertEqual(self.drain(scheduler), ['overdue', 'fresh'])
+
+    def test_submitted_ahead_counts_submission_order(self):
+        tickets = [self.put(f"low{i}") for i in range(4)]
+        urgent = self.put('urgent', priority=5)
+        self.assertEqual(self.scheduler.submitted_ahead(urgent), 4)
+        self.assertEqual(self.scheduler.submitted_ahead(tickets[2]), 2)
+        # ...while the urgent request is served first
+        self.assertEqual(self.scheduler.get_nowait().id, 'urgent')
+        self.assertEqual(self.scheduler.submitted_ahead(urgent), 0)
+        self.assertEqual(self.scheduler.submitted_ahead(tickets[2]), 2)
+
+    def test_tickets_rebase_when_the_queue_drains(self):
+        for i in range(3000):
+            self.put(f"req{i}")
+        self.assertGreater(len(self.scheduler._tree), 3000)
+        self.assertEqual(len(self.drain()), 3000)
+        self.assertEqual(len(self.scheduler._tree), self.scheduler.TREE_SIZE)
+        self.assertEqual(self.put('next'), 1)
+
+    def test_rebase_does_not_revive_stale_entries(self):
+        for i in range(3):
+            self.put(f"old{i}", priority=3)
+        self.drain()
+        self.put('a')
+        self.put('b')
+        self.assertEqual(self.drain(), ['a', 'b'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,46 @@
+"""BatchProcessor request status across the queued -> collecting -> batching steps"""
+
+import time
+import unittest
+
+from tests import TempDirTestCase, script
+
+class RequestStatusTest(TempDirTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.processor = script('ai-batch-processor.py').BatchProcessor(self.root, max_wait_time=30)
+        self.addCleanup(self.processor.stop_processing)
+
+    def wait_for(self, request_id, status):
+        deadline = time.monotonic() + 5
+        while self.processor.get_request_status(request_id)['status'] != status:
+            self.assertLess(time.monotonic(), deadline, f"{request_id} never became {status}")
+            time.sleep(0.01)
+
+    def test_collected_request_reports_collecting_not_a_dead_ticket(self):
+        first = self.processor.submit_request('explain the order service')
+        self.assertEqual(self.processor.get_request_status(first)['status'], 'queued')
+
+        self.processor.start_processing()
+        self.wait_for(first, 'collecting')
+        # The queue drained, so the next request reuses the first ticket number
+        second = self.processor.submit_request('document the payment api')
+        self.wait_for(second, 'collecting')
+
+        status = self.processor.get_request_status(first)
+        self.assertEqual(status['status'], 'collecting')
+        self.assertNotIn('submitted_ahead', status)
+
+    def test_stopping_puts_collected_requests_back_in_the_queue(self):
+        self.processor.start_processing()
+        request_id = self.processor.submit_request('explain the order service')
+        self.wait_for(request_id, 'collecting')
+        self.processor.stop_processing()
+
+        status = self.processor.get_request_status(request_id)
+        self.assertEqual(status['status'], 'queued')
+        self.assertEqual(status['submitted_ahead'], 0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,81 @@
+"""Admission control: a full cache keeps turning over, rejections are reported"""
+
+import io
+import json
+import shutil
+import subprocess
+import sys
+import unittest
+
+from tests import SCRIPTS_DIR, TempDirTestCase, script
+
+class AdmissionTest(TempDirTestCase):
+
+    def fill(self, cache, count):
+        return [cache.store_response(f"question {i} about the catalog", f"answer {i}", 'gpt-4', 100, 0.01)
+                for i in range(count)]
+
+    def test_default_policy_admits_when_full(self):
+        cache = self.open_cache()
+        cache.max_cache_size = 3
+        keys = self.fill(cache, 5)
+        self.assertEqual(cache.admission.name, 'always')
+        self.assertNotIn(None, keys)
+        self.assertIn(keys[-1], cache.cache)
+
+    def test_tinylfu_admits_ties_when_full(self):
+        cache = self.open_cache(admission_policy='tinylfu')
+        cache.max_cache_size = 3
+        keys = self.fill(cache, 5)
+        self.assertNotIn(None, keys)
+        self.assertIn(keys[-1], cache.cache)
+        self.assertEqual(len(cache.cache), 3)
+
+    def test_tinylfu_rejects_a_cheaper_candidate_when_full(self):
+        cache = self.open_cache(admission_policy='tinylfu')
+        cache.max_cache_size = 2
+        self.fill(cache, 2)
+        key = cache.store_response('one-off cheap question', 'short', 'gpt-4o-mini', 1, 0.0)
+        self.assertIsNone(key)
+        self.assertEqual(cache.get_cache_stats()['admission']['rejected'], 1)
+
+    def test_store_many_reports_rejected_records(self):
+        cache = self.open_cache(admission_policy='threshold')
+        keys = cache.store_many([
+            {'prompt': 'good answer', 'response': 'r', 'model': 'gpt-4', 'tokens_used': 10, 'cost': 0.01,
+             'quality_score': 0.9},
+            {'prompt': 'bad answer', 'response': 'r', 'model': 'gpt-4', 'tokens_used': 10, 'cost': 0.01,
+             'quality_score': 0.1},
+        ])
+        self.assertIn(keys[0], cache.cache)
+        self.assertIsNone(keys[1])
+        self.assertEqual(len(cache.cache), 1)
+
+    def test_batch_reply_flags_rejections(self):
+        cache = self.open_cache(admission_policy='threshold')
+        lines = [json.dumps({'op': 'store', 'id': rid, 'prompt': rid, 'response': 'r', 'model': 'gpt-4',
+                             'tokens_used': 10, 'cost': 0.01, 'quality_score': quality})
+                 for rid, quality in (('good', 0.9), ('bad', 0.1))]
+        out = io.StringIO()
+        self.assertEqual(script('ai-cache.py').run_batch(cache, lines, out), 0)
+        replies = {reply['id']: reply for reply in map(json.loads, out.getvalue().splitlines())}
+        self.assertTrue(replies['good']['admitted'])
+        self.assertIn(replies['good']['key'], cache.cache)
+        self.assertEqual(replies['bad'], {'id': 'bad', 'key': None, 'admitted': False})
+
+    def test_cli_reports_a_rejection(self):
+        scripts = self.root / 'scripts'
+        scripts.mkdir()
+        shutil.copy(SCRIPTS_DIR / 'ai-cache.py', scripts)
+        base = [sys.executable, str(scripts / 'ai-cache.py'), 'store', '--model', 'gpt-4',
+                '--tokens', '100', '--cost', '0.01', '--admission-policy', 'threshold']
+        stored = subprocess.run(base + ['--prompt', 'good', '--response', 'r', '--quality', '0.9'],
+                                capture_output=True, text=True, check=True)
+        rejected = subprocess.run(base + ['--prompt', 'bad', '--response', 'r', '--quality', '0.1'],
+                                  capture_output=True, text=True, check=True)
+        self.assertIn('Stored response', stored.stdout)
+        self.assertIn('not cached', rejected.stdout)
+        self.assertNotIn('Stored response', rejected.stdout)
+
+if __name__ == '__main__':
+    unittest.main()
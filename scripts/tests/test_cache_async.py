@@ -0,0 +1,83 @@
+"""AsyncAICache: one producer run per key, also for stale reads"""
+
+import asyncio
+import gc
+import unittest
+
+from tests import TempDirTestCase, script
+
+class SingleFlightTest(TempDirTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.calls = 0
+
+    async def producer(self):
+        self.calls += 1
+        await asyncio.sleep(0.05)
+        return {'response': f"answer {self.calls}", 'model': 'gpt-4', 'tokens_used': 10, 'cost': 0.01}
+
+    def run_async(self, coro_factory, **kwargs):
+        async def main():
+            front = script('ai-cache.py').AsyncAICache(self.open_cache(), **kwargs)
+            try:
+                return await coro_factory(front)
+            finally:
+                await front.close()
+        return asyncio.run(main())
+
+    def test_concurrent_misses_share_one_producer_call(self):
+        async def scenario(front):
+            return await asyncio.gather(*(front.get_or_compute('summarize the api', None, self.producer)
+                                          for _ in range(10)))
+        results = self.run_async(scenario)
+        self.assertEqual(self.calls, 1)
+        self.assertEqual({result.response for result in results}, {'answer 1'})
+
+    def test_concurrent_stale_reads_refresh_once(self):
+        async def scenario(front):
+            await front.get_or_compute('summarize the api', None, self.producer)
+            await asyncio.sleep(0.01)
+
+            # Reads that finish without yielding: every caller gets past the
+            # in-flight check before any scheduled refresh has started
+            async def get(prompt, context=None, min_quality=None):
+                return front.cache.get_cached_response(prompt, context, min_quality)
+            front.get = get
+            results = await asyncio.gather(*(front.get_or_compute('summarize the api', None, self.producer)
+                                             for _ in range(10)))
+            while front._background:
+                await asyncio.gather(*front._background)
+            return results, dict(front._inflight)
+        (results, inflight) = self.run_async(scenario, fresh_for=0.001)
+        # The first reader gets the stale entry; the rest wait for its refresh
+        self.assertEqual(self.calls, 2)
+        self.assertEqual([result.response for result in results], ['answer 1'] + ['answer 2'] * 9)
+        self.assertEqual(inflight, {})
+
+    def test_failed_background_refresh_is_logged(self):
+        async def failing():
+            raise RuntimeError('provider unavailable')
+
+        loop_errors = []
+
+        async def scenario(front):
+            asyncio.get_running_loop().set_exception_handler(lambda loop, context: loop_errors.append(context))
+            await front.get_or_compute('summarize the api', None, self.producer)
+            await asyncio.sleep(0.01)
+            stale = await front.get_or_compute('summarize the api', None, failing)
+            # Let the refresh fail without anyone awaiting it
+            while front._background:
+                await asyncio.sleep(0.01)
+            gc.collect()
+            return stale
+
+        with self.assertLogs('ai_cache', level='WARNING') as logs:
+            stale = self.run_async(scenario, fresh_for=0.001)
+        self.assertEqual(stale.response, 'answer 1')
+        self.assertIn('Background cache refresh failed', logs.output[0])
+        self.assertIn('provider unavailable', logs.output[0])
+        self.assertEqual(loop_errors, [])
+
+if __name__ == '__main__':
+    unittest.main()
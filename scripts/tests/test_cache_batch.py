@@ -0,0 +1,77 @@
+"""Batch API: get_many/store_many agree with single calls, run_batch keeps order"""
+
+import io
+import json
+import unittest
+
+from tests import TempDirTestCase, script
+
+def record(prompt, response='answer', **extra):
+    return dict(prompt=prompt, response=response, model='gpt-4', tokens_used=10, cost=0.01, **extra)
+
+class BatchApiTest(TempDirTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.cache = self.open_cache()
+        self.cache.store_many([
+            record('explain how the order service retries failed payments', 'With backoff.'),
+            record('document the payment api', 'See the spec.'),
+            record('document the payment api', 'See the spec.', context='openapi.yaml'),
+        ])
+
+    def test_get_many_matches_single_lookups(self):
+        prompts = ['document the payment api', 'please explain how the order service retries failed payments',
+                   'rotate the signing keys', 'document the payment api']
+        contexts = [None, None, None, 'openapi.yaml']
+        batched = self.cache.get_many(prompts, contexts)
+
+        single = self.open_cache()
+        expected = [single.get_cached_response(p, c) for p, c in zip(prompts, contexts)]
+        self.assertEqual([r and r.prompt_hash for r in batched], [r and r.prompt_hash for r in expected])
+        self.assertIsNone(batched[2])
+        self.assertNotEqual(batched[0].prompt_hash, batched[3].prompt_hash)
+
+    def test_duplicate_inputs_are_looked_up_once(self):
+        results = self.cache.get_many(['document the payment api'] * 3)
+        self.assertEqual({r.response for r in results}, {'See the spec.'})
+        counters = self.cache.metrics.to_dict()['counters']
+        self.assertEqual(counters['exact_hits'], 1)
+        self.assertEqual(self.cache.cache[results[0].prompt_hash].access_count, 2)
+
+    def test_get_many_rejects_mismatched_contexts(self):
+        with self.assertRaises(ValueError):
+            self.cache.get_many(['a', 'b'], [None])
+
+    def test_store_many_keeps_the_last_duplicate_and_persists(self):
+        keys = self.cache.store_many([record('name the import job', 'Importer'),
+                                      record('name the import job', 'ImportJob')])
+        self.assertEqual(keys[0], keys[1])
+        self.assertEqual(self.cache.cache[keys[0]].response, 'ImportJob')
+        self.cache.close()
+        self.assertEqual(self.open_cache().get_cached_response('name the import job').response, 'ImportJob')
+
+    def test_run_batch_preserves_order_and_reports_bad_lines(self):
+        lines = [
+            json.dumps({'op': 'get', 'id': 1, 'prompt': 'document the payment api'}),
+            json.dumps({'op': 'store', 'id': 2, **record('name the import job')}),
+            'not json',
+            json.dumps({'op': 'get', 'id': 4, 'prompt': 'name the import job'}),
+            json.dumps({'op': 'store', 'id': 5, 'prompt': 'missing fields'}),
+            json.dumps({'op': 'get', 'id': 6, 'prompt': 'rotate the signing keys'}),
+        ]
+        out = io.StringIO()
+        failures = script('ai-cache.py').run_batch(self.cache, lines, out)
+        replies = [json.loads(line) for line in out.getvalue().splitlines()]
+
+        self.assertEqual(failures, 2)
+        self.assertEqual([reply['id'] for reply in replies], [1, 2, 3, 4, 5, 6])
+        self.assertEqual(replies[0]['entry']['response'], 'See the spec.')
+        self.assertTrue(replies[1]['admitted'])
+        self.assertIn('error', replies[2])
+        self.assertTrue(replies[3]['hit'])
+        self.assertIn('invalid request', replies[4]['error'])
+        self.assertFalse(replies[5]['hit'])
+
+if __name__ == '__main__':
+    unittest.main()
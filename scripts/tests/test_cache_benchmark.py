@@ -0,0 +1,82 @@
+"""AI cache benchmark: per-size metrics and the regression check against a baseline"""
+
+import contextlib
+import io
+import json
+import subprocess
+import sys
+import unittest
+
+from tests import SCRIPTS_DIR, TempDirTestCase, script
+
+def report(size=1000, config=None, **metrics):
+    values = {'size': size, 'cold_load_s': 0.5, 'store_bulk_per_s': 10000.0, 'hit_p99_ms': 2.0,
+              'cleanup_ms': 0.0}
+    values.update(metrics)
+    return {'config': config or {'backend': 'sqlite'}, 'results': [values]}
+
+class BaselineCompareTest(TempDirTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.bench = script('ai-cache-benchmark.py')
+        self.benchmark = self.bench.CacheBenchmark(self.root)
+
+    def compare(self, current, baseline=None, tolerance=0.2):
+        return self.benchmark.compare(current, baseline or report(), tolerance)
+
+    def test_changes_within_tolerance_pass(self):
+        self.assertEqual(self.compare(report(cold_load_s=0.55, store_bulk_per_s=9000.0)), [])
+
+    def test_slower_latency_and_lower_throughput_regress(self):
+        regressions = self.compare(report(hit_p99_ms=3.0, store_bulk_per_s=5000.0))
+        self.assertEqual({(item['metric'], item['change_pct']) for item in regressions},
+                         {('hit_p99_ms', 50.0), ('store_bulk_per_s', -50.0)})
+
+    def test_improvements_are_not_regressions(self):
+        self.assertEqual(self.compare(report(cold_load_s=0.1, hit_p99_ms=0.5, store_bulk_per_s=90000.0)), [])
+
+    def test_zero_baseline_uses_the_absolute_tolerance(self):
+        self.assertEqual(self.compare(report(cleanup_ms=0.05)), [])
+        regressions = self.compare(report(cleanup_ms=5.0))
+        self.assertEqual(regressions, [{'size': 1000, 'metric': 'cleanup_ms', 'baseline': 0.0,
+                                        'current': 5.0, 'change_pct': None}])
+
+    def test_sizes_missing_from_the_baseline_are_skipped(self):
+        self.assertEqual(self.compare(report(size=5000, hit_p99_ms=50.0)), [])
+
+    def test_config_mismatch_is_reported_but_compared(self):
+        stderr = io.StringIO()
+        with contextlib.redirect_stderr(stderr):
+            regressions = self.compare(report(config={'backend': 'json'}, hit_p99_ms=3.0))
+        self.assertIn('config differs', stderr.getvalue())
+        self.assertEqual([item['metric'] for item in regressions], ['hit_p99_ms'])
+
+    def test_compare_command_exit_status(self):
+        baseline, result = self.root / 'baseline.json', self.root / 'result.json'
+        baseline.write_text(json.dumps(report()))
+        command = [sys.executable, str(SCRIPTS_DIR / 'ai-cache-benchmark.py'), 'compare',
+                   '--baseline', str(baseline), '--result', str(result)]
+
+        result.write_text(json.dumps(report(hit_p99_ms=2.1)))
+        passed = subprocess.run(command, capture_output=True, text=True)
+        self.assertEqual(passed.returncode, 0, passed.stdout + passed.stderr)
+
+        result.write_text(json.dumps(report(hit_p99_ms=4.0)))
+        failed = subprocess.run(command, capture_output=True, text=True)
+        self.assertEqual(failed.returncode, 1)
+        self.assertIn('hit_p99_ms', failed.stdout)
+
+class SingleSizeRunTest(unittest.TestCase):
+
+    def test_small_run_reports_every_tracked_metric(self):
+        bench = script('ai-cache-benchmark.py')
+        result = bench.run_single_size(SCRIPTS_DIR, 300, 100, 'sqlite', 0.3, 0.2, 'exact', seed=1)
+        self.assertEqual(result['size'], 300)
+        for metric in bench.METRIC_DIRECTIONS:
+            self.assertIn(metric, result)
+        self.assertEqual(result['hit_rate']['duplicate'], 1.0)
+        self.assertGreater(result['cleanup_evicted'], 0)
+
+if __name__ == '__main__':
+    unittest.main()
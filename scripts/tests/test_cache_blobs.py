@@ -0,0 +1,38 @@
+"""Blob-backed responses: bodies stay on disk, hits get a standalone copy"""
+
+import unittest
+
+from tests import TempDirTestCase
+
+LARGE = 'Use a bounded channel between the producer and the consumers. ' * 100
+
+class BlobStoreTest(TempDirTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.cache = self.open_cache(blob_threshold=2048)
+        self.key = self.cache.store_response('design the import pipeline', LARGE, 'gpt-4', 900, 0.05)
+
+    def test_hit_returns_the_body_but_the_table_keeps_the_ref(self):
+        view = self.cache.cache[self.key]
+        self.assertIsNone(view.response)
+        self.assertTrue(view.response_ref)
+
+        for _ in range(2):
+            hit = self.cache.get_cached_response('design the import pipeline')
+            self.assertEqual(hit.response, LARGE)
+        self.assertIsNone(view.response)
+        self.assertTrue(view.response_ref)
+
+    def test_small_responses_stay_inline(self):
+        key = self.cache.store_response('name the import job', 'ImportJob', 'gpt-4', 10, 0.01)
+        self.assertEqual(self.cache.cache[key].response, 'ImportJob')
+        self.assertIsNone(self.cache.cache[key].response_ref)
+
+    def test_body_survives_a_restart(self):
+        self.cache.close()
+        cache = self.open_cache(blob_threshold=2048)
+        self.assertEqual(cache.get_cached_response('design the import pipeline').response, LARGE)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,38 @@
+"""CountingBloomFilter: the estimated false-positive rate tracks the measured one"""
+
+import math
+import unittest
+
+from tests import TempDirTestCase, script
+
+class BloomFilterTest(TempDirTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.bloom = script('ai-cache.py').CountingBloomFilter(capacity=1000, error_rate=0.01)
+
+    def test_empty_filter(self):
+        self.assertEqual(self.bloom.fill_ratio(), 0.0)
+        self.assertEqual(self.bloom.estimated_fp_rate(), 0.0)
+
+    def test_estimate_matches_formula_and_measurement(self):
+        self.bloom.add(frozenset(f"token{i}" for i in range(1000)))
+        m, k = self.bloom.size, self.bloom.hash_count
+        expected = (1 - math.exp(-k * 1000 / m)) ** k
+        self.assertAlmostEqual(self.bloom.estimated_fp_rate(1000), expected)
+        # At design capacity the filter is about half full and near its target rate
+        self.assertAlmostEqual(self.bloom.fill_ratio(), 0.5, delta=0.05)
+        self.assertAlmostEqual(self.bloom.estimated_fp_rate(), expected, delta=0.005)
+        measured = sum(f"absent{i}" in self.bloom for i in range(20000)) / 20000
+        self.assertAlmostEqual(measured, expected, delta=0.005)
+
+    def test_cache_stats_report_the_filter(self):
+        cache = self.open_cache()
+        cache.store_response('explain the order service', 'It routes orders.', 'gpt-4', 120, 0.01)
+        bloom = cache.get_cache_stats()['bloom_filter']
+        self.assertEqual(bloom['tokens'], 4)
+        self.assertGreater(bloom['fill_ratio'], 0)
+        self.assertLess(bloom['estimated_fp_rate'], 1e-6)
+
+if __name__ == '__main__':
+    unittest.main()
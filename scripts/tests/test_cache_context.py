@@ -0,0 +1,39 @@
+"""Context-aware keying: context lookups after clears and removals"""
+
+import unittest
+
+from tests import TempDirTestCase, script
+
+CONTEXT = '\n'.join(f"line {i} of OrderService.cs" for i in range(40))
+
+class ContextLookupTest(TempDirTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.ai_cache = script('ai-cache.py')
+        self.cache = self.open_cache()
+        self.cache.store_response('refactor this class', 'Split it.', 'gpt-4', 100, 0.01, context=CONTEXT)
+
+    def test_context_hit(self):
+        self.assertIsNotNone(self.cache.get_cached_response('refactor this class', context=CONTEXT))
+
+    def test_lookup_after_clear_is_a_miss(self):
+        self.cache.clear_cache()
+        self.assertEqual(self.cache.prompt_index, {})
+        self.assertIsNone(self.cache.get_cached_response('refactor this class', context=CONTEXT))
+        self.assertIsNone(self.cache.get_cached_response('refactor this class', context=CONTEXT + '\nchanged'))
+
+    def test_clear_resets_negative_cache(self):
+        self.assertIsNone(self.cache.get_cached_response('never stored prompt'))
+        self.assertTrue(self.cache.negative_cache._misses)
+        self.cache.clear_cache()
+        self.assertFalse(self.cache.negative_cache._misses)
+
+    def test_context_match_skips_missing_keys(self):
+        key = next(iter(self.cache.cache.keys()))
+        self.cache.cache.pop(key)
+        chunks = frozenset(self.ai_cache._context_chunks(CONTEXT))
+        self.assertIsNone(self.cache._context_match('refactor this class', chunks, None))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,106 @@
+"""Eviction policies: victim order per policy and capacity eviction in AICache"""
+
+import unittest
+from datetime import datetime, timedelta
+
+from tests import TempDirTestCase, script
+
+class EvictionPolicyTest(unittest.TestCase):
+
+    def setUp(self):
+        self.module = script('ai-cache.py')
+        self.now = datetime.now()
+
+    def entry(self, key, access_count=1, age=0.0, cost=0.01, tokens_used=100, size=100):
+        when = self.now - timedelta(seconds=age)
+        return self.module.CachedResponse(
+            prompt_hash=key, prompt=key, response='x' * size, model='gpt-4', tokens_used=tokens_used,
+            cost=cost, quality_score=None, created_at=when, last_accessed=when, access_count=access_count)
+
+    def drain(self, policy):
+        order = []
+        while True:
+            key = policy.pop_victim()
+            if key is None:
+                return order
+            order.append(key)
+
+    def test_lru_evicts_least_recently_used(self):
+        policy = self.module.LRUEvictionPolicy()
+        entries = {key: self.entry(key) for key in 'abc'}
+        for entry in entries.values():
+            policy.record_insert(entry)
+        policy.record_access(entries['a'])
+        self.assertEqual(policy.peek_victim(), 'b')
+        self.assertEqual(self.drain(policy), ['b', 'c', 'a'])
+
+    def test_lfu_evicts_least_frequent_then_least_recent(self):
+        policy = self.module.LFUEvictionPolicy()
+        policy.record_insert(self.entry('hot', access_count=9))
+        policy.record_insert(self.entry('old', access_count=2, age=60))
+        policy.record_insert(self.entry('new', access_count=2))
+        self.assertEqual(self.drain(policy), ['old', 'new', 'hot'])
+
+    def test_access_reprioritizes_and_removal_is_skipped(self):
+        policy = self.module.LFUEvictionPolicy()
+        entries = {key: self.entry(key) for key in 'abc'}
+        for entry in entries.values():
+            policy.record_insert(entry)
+        entries['a'].access_count = 5
+        policy.record_access(entries['a'])
+        policy.remove('b')
+        self.assertEqual(self.drain(policy), ['c', 'a'])
+
+    def test_ttl_evicts_oldest_created_first(self):
+        policy = self.module.TTLEvictionPolicy()
+        for key, age in (('day', 86400), ('hour', 3600), ('week', 7 * 86400)):
+            policy.record_insert(self.entry(key, age=age))
+        self.assertEqual(self.drain(policy), ['week', 'day', 'hour'])
+
+    def test_gdsf_keeps_expensive_small_frequent_entries(self):
+        policy = self.module.GreedyDualSizePolicy()
+        policy.record_insert(self.entry('cheap', cost=0.001))
+        policy.record_insert(self.entry('large', cost=0.1, size=50_000))
+        policy.record_insert(self.entry('frequent', cost=0.01, access_count=20))
+        policy.record_insert(self.entry('expensive', cost=0.5))
+        self.assertEqual(self.drain(policy), ['cheap', 'large', 'frequent', 'expensive'])
+
+    def test_gdsf_inflation_ages_out_idle_entries(self):
+        policy = self.module.GreedyDualSizePolicy()
+        policy.record_insert(self.entry('idle', cost=0.02))
+        policy.record_insert(self.entry('cheap', cost=0.01))
+        self.assertEqual(policy.pop_victim(), 'cheap')
+        self.assertGreater(policy.inflation, 0)
+        # A new entry starts at the inflated baseline, above the idle one
+        policy.record_insert(self.entry('new', cost=0.015))
+        self.assertEqual(policy.pop_victim(), 'idle')
+
+    def test_heap_stays_bounded_under_repeated_access(self):
+        policy = self.module.LFUEvictionPolicy()
+        entry = self.entry('a')
+        policy.record_insert(entry)
+        for count in range(1000):
+            entry.access_count = count
+            policy.record_access(entry)
+        self.assertLess(len(policy._heap), 100)
+        self.assertEqual(self.drain(policy), ['a'])
+
+class CapacityEvictionTest(TempDirTestCase):
+
+    def test_cache_evicts_the_policy_victim_at_capacity(self):
+        # prompt 0 is the only one read again, but it is also the cheapest
+        for name, evicted in (('lru', 'prompt 1'), ('lfu', 'prompt 1'), ('gdsf', 'prompt 0')):
+            with self.subTest(policy=name):
+                cache = self.open_cache(cache_dir=self.root / name, eviction_policy=name)
+                cache.max_cache_size = 3
+                for i, cost in enumerate((0.01, 0.03, 0.04)):
+                    cache.store_response(f"prompt {i}", 'answer', 'gpt-4', 100, cost)
+                cache.get_cached_response('prompt 0')
+                cache.store_response('prompt 3', 'answer', 'gpt-4', 100, 0.05)
+
+                prompts = {response.prompt for response in cache.cache.values()}
+                self.assertEqual(prompts, {f"prompt {i}" for i in range(4)} - {evicted})
+                self.assertEqual(cache.metrics.to_dict()['counters']['evictions_capacity'], 1)
+
+if __name__ == '__main__':
+    unittest.main()
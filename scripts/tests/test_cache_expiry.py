@@ -0,0 +1,103 @@
+"""Expiry: the TTL heap, per-entry/model/task TTLs and the sweeps that use them"""
+
+import time
+import unittest
+
+from tests import TempDirTestCase, script
+
+DAY = 86400
+
+class ExpiryIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        self.index = script('ai-cache.py').ExpiryIndex()
+
+    def test_pop_due_returns_expired_keys_in_order(self):
+        for key, expires_at in (('c', 30.0), ('a', 10.0), ('b', 20.0), ('later', 99.0)):
+            self.index.add(key, expires_at)
+        self.assertEqual(self.index.next_due(), 10.0)
+        self.assertEqual(self.index.pop_due(25.0, limit=1), ['a'])
+        self.assertEqual(self.index.pop_due(35.0), ['b', 'c'])
+        self.assertEqual(self.index.pop_due(35.0), [])
+        self.assertEqual(len(self.index), 1)
+
+    def test_rescheduled_and_removed_keys_are_skipped(self):
+        self.index.add('moved', 10.0)
+        self.index.add('removed', 11.0)
+        self.index.add('moved', 50.0)
+        self.index.remove('removed')
+        self.assertEqual(self.index.next_due(), 50.0)
+        self.assertEqual(self.index.pop_due(20.0), [])
+        self.assertEqual(self.index.pop_due(50.0), ['moved'])
+        self.assertIsNone(self.index.next_due())
+
+    def test_heap_stays_bounded_when_keys_are_rescheduled(self):
+        for i in range(1000):
+            self.index.add('key', float(i))
+        self.assertLess(len(self.index._heap), 100)
+
+class CacheTTLTest(TempDirTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.cache = self.open_cache()
+        self.now = time.time()
+
+    def store(self, prompt, model='gpt-4', **metadata):
+        return self.cache.store_response(prompt, 'answer', model, 10, 0.01, metadata=metadata or None)
+
+    def swept_after(self, days):
+        return self.cache.sweep_expired(now=self.now + days * DAY)
+
+    def test_metadata_task_and_model_overrides(self):
+        self.cache.set_ttl(2, model='gpt-4o-mini')
+        self.cache.set_ttl(5, task_type='review')
+        self.store('default entry')
+        self.store('mini entry', model='gpt-4o-mini')
+        self.store('review entry', model='gpt-4o-mini', task_type='review')
+        self.store('pinned entry', model='gpt-4o-mini', task_type='review', ttl_days=10)
+
+        self.assertEqual(self.swept_after(1), 0)
+        self.assertEqual(self.swept_after(3), 1)
+        self.assertEqual(self.swept_after(6), 1)
+        self.assertEqual(self.swept_after(11), 1)
+        self.assertEqual(self.swept_after(30.5), 0)
+        self.assertEqual(self.swept_after(31.5), 1)
+        self.assertEqual(self.cache.get_cache_stats()['evictions']['expired'], 4)
+
+    def test_changing_a_ttl_reschedules_existing_entries(self):
+        self.store('default entry')
+        self.assertEqual(self.swept_after(3), 0)
+        self.cache.max_age_days = 1
+        self.assertEqual(self.swept_after(3), 1)
+
+    def test_expired_entries_are_never_served(self):
+        self.store('short lived', ttl_days=0.1 / DAY)
+        self.assertIsNotNone(self.cache.get_cached_response('short lived'))
+        time.sleep(0.15)
+        self.assertIsNone(self.cache.get_cached_response('short lived'))
+        self.assertEqual(len(self.cache.cache), 0)
+
+    def test_ttl_survives_a_restart(self):
+        self.store('pinned entry', ttl_days=2)
+        self.cache.close()
+        cache = self.open_cache()
+        self.assertEqual(cache.sweep_expired(now=self.now + 1.5 * DAY), 0)
+        self.assertEqual(cache.sweep_expired(now=self.now + 2.5 * DAY), 1)
+
+class DaemonSweeperTest(TempDirTestCase):
+
+    def test_idle_daemon_expires_entries_in_the_background(self):
+        module = script('ai-cache.py')
+        cache = self.open_cache()
+        cache.store_response('short lived', 'answer', 'gpt-4', 10, 0.01, metadata={'ttl_days': 0.05 / DAY})
+        server = module.AICacheServer(cache, self.root / 'cache.sock', sweep_interval=0.02)
+        self.addCleanup(server.server_close)
+
+        deadline = time.monotonic() + 2
+        while len(cache.cache) and time.monotonic() < deadline:
+            time.sleep(0.02)
+        self.assertEqual(len(cache.cache), 0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,48 @@
+"""Lazy-loaded AICache: lookups are answered without building the table"""
+
+import unittest
+
+from tests import TempDirTestCase
+
+class LazyLoadTest(TempDirTestCase):
+
+    def setUp(self):
+        super().setUp()
+        cache = self.open_cache()
+        cache.store_response('explain the order service routing rules', 'It routes orders.', 'gpt-4', 120, 0.01)
+        cache.store_response('document the payment api', 'See the spec.', 'gpt-4', 80, 0.01)
+        cache.close()
+
+    def test_exact_hit_is_a_point_read(self):
+        cache = self.open_cache(lazy_load=True)
+        self.assertEqual(cache.get_cached_response('document the payment api').response, 'See the spec.')
+        self.assertFalse(cache._loaded)
+
+    def test_miss_does_not_materialize_the_table(self):
+        cache = self.open_cache(lazy_load=True)
+        self.assertIsNone(cache.get_cached_response('rotate the signing keys'))
+        self.assertIsNone(cache.get_cached_response('rotate the signing keys'))
+        self.assertFalse(cache._loaded)
+        self.assertFalse(hasattr(cache, 'cache'))
+
+    def test_similar_prompt_hits_without_loading(self):
+        cache = self.open_cache(lazy_load=True)
+        cache.similarity_threshold = 0.8
+        hit = cache.get_cached_response('explain the order service routing rules please')
+        self.assertIsNotNone(hit)
+        self.assertEqual(hit.response, 'It routes orders.')
+        self.assertFalse(cache._loaded)
+        self.assertEqual(cache.metrics.to_dict()['counters']['similarity_hits'], 1)
+
+    def test_sharded_miss_does_not_load(self):
+        cache = self.open_cache(backend='sharded', shards=2, lazy_load=True)
+        cache.store_response('list the catalog routes', 'GET /products', 'gpt-4', 50, 0.01)
+        cache.close()
+
+        cache = self.open_cache(backend='sharded', shards=2, lazy_load=True)
+        self.assertIsNone(cache.get_cached_response('rotate the signing keys'))
+        self.assertEqual(cache.get_cached_response('list the catalog routes').response, 'GET /products')
+        self.assertFalse(cache._loaded)
+
+if __name__ == '__main__':
+    unittest.main()
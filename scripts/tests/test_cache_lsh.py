@@ -0,0 +1,66 @@
+"""MinHashLSH: Jaccard estimates, bucket candidates and the persisted signatures"""
+
+import random
+import unittest
+
+from tests import TempDirTestCase, script
+
+def tokens(text):
+    return frozenset(text.split())
+
+class MinHashLSHTest(TempDirTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.lsh = script('ai-cache.py').MinHashLSH(bands=32, rows=4)
+
+    def test_estimate_tracks_jaccard(self):
+        rng = random.Random(3)
+        vocabulary = [f"w{i}" for i in range(60)]
+        for _ in range(20):
+            a, b = frozenset(rng.sample(vocabulary, 20)), frozenset(rng.sample(vocabulary, 20))
+            self.lsh.add('b', b)
+            signature, _ = self.lsh.candidates(a)
+            self.assertAlmostEqual(self.lsh.estimate(signature, 'b'), len(a & b) / len(a | b), delta=0.15)
+
+    def test_near_duplicates_share_a_bucket_and_unrelated_sets_do_not(self):
+        self.lsh.add('orders', tokens('explain how the order service retries failed payments'))
+        self.lsh.add('login', tokens('fix the layout of the login page on mobile'))
+
+        signature, found = self.lsh.candidates(tokens('explain how the order service retries failed payments now'))
+        self.assertIn('orders', found)
+        self.assertNotIn('login', found)
+        self.assertGreater(self.lsh.estimate(signature, 'orders'), 0.7)
+
+    def test_removed_keys_leave_no_buckets(self):
+        self.lsh.add('orders', tokens('explain the order service'))
+        self.lsh.remove('orders')
+        self.assertEqual(len(self.lsh), 0)
+        self.assertTrue(all(not band for band in self.lsh.buckets))
+        self.assertEqual(self.lsh.candidates(tokens('explain the order service'))[1], set())
+
+    def test_signatures_round_trip_only_with_the_same_parameters(self):
+        self.lsh.add('orders', tokens('explain the order service'))
+        path = self.root / 'lsh.json'
+        self.lsh.save(path)
+
+        module = script('ai-cache.py')
+        self.assertEqual(module.MinHashLSH(bands=32, rows=4).load(path), self.lsh.signatures)
+        self.assertEqual(module.MinHashLSH(bands=16, rows=4).load(path), {})
+
+class LSHModeTest(TempDirTestCase):
+
+    def test_lsh_mode_hits_and_reuses_persisted_signatures(self):
+        cache = self.open_cache(similarity_mode='lsh', lsh_rerank=True)
+        cache.store_response('explain how the order service retries failed payments', 'With backoff.',
+                             'gpt-4', 100, 0.01)
+        cache.close()
+
+        cache = self.open_cache(similarity_mode='lsh', lsh_rerank=True)
+        self.assertFalse(cache.lsh.dirty)
+        hit = cache.get_cached_response('please explain how the order service retries failed payments')
+        self.assertEqual(hit.response, 'With backoff.')
+        self.assertIsNone(cache.get_cached_response('fix the layout of the login page'))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,85 @@
+"""Cache metrics: real hit/miss counters, latency histograms and their persistence"""
+
+import random
+import unittest
+
+from tests import TempDirTestCase, script
+
+class LatencyHistogramTest(unittest.TestCase):
+
+    def setUp(self):
+        self.module = script('ai-cache.py')
+
+    def test_buckets_keep_relative_precision(self):
+        histogram_class = self.module.LatencyHistogram
+        for micros in (0, 1, 15, 16, 17, 100, 1234, 98765, 5_000_000):
+            with self.subTest(micros=micros):
+                upper = histogram_class._upper_bound(histogram_class._index(micros))
+                self.assertGreaterEqual(upper, micros)
+                self.assertLessEqual(upper - micros, micros / histogram_class.SUB_BUCKETS)
+
+    def test_percentiles_follow_the_recorded_values(self):
+        rng = random.Random(5)
+        values = sorted(rng.uniform(0.0001, 0.5) for _ in range(2000))
+        histogram = self.module.LatencyHistogram()
+        for seconds in values:
+            histogram.record(seconds)
+        for pct in (50, 90, 99):
+            exact_ms = values[int(len(values) * pct / 100) - 1] * 1000
+            self.assertAlmostEqual(histogram.percentile(pct), exact_ms, delta=exact_ms * 0.07)
+        self.assertEqual(histogram.summary()['count'], 2000)
+
+    def test_merge_adds_counts(self):
+        first, second, both = (self.module.LatencyHistogram() for _ in range(3))
+        for seconds in (0.001, 0.002, 0.5):
+            first.record(seconds)
+            both.record(seconds)
+        for seconds in (0.003, 0.004):
+            second.record(seconds)
+            both.record(seconds)
+        first.merge(second)
+        self.assertEqual(first.counts, both.counts)
+
+class CacheMetricsTest(TempDirTestCase):
+
+    def test_stats_report_real_hits_misses_and_savings(self):
+        cache = self.open_cache()
+        cache.store_response('explain the order service', 'It routes orders.', 'gpt-4', 120, 0.25)
+        cache.get_cached_response('explain the order service')
+        cache.get_cached_response('explain the order service')
+        cache.get_cached_response('rotate the signing keys')
+
+        stats = cache.get_cache_stats()
+        self.assertEqual(stats['hits']['exact'], 2)
+        self.assertEqual(stats['misses'], 1)
+        self.assertEqual(stats['cache_hit_rate'], 0.667)
+        self.assertEqual(stats['total_cost_saved'], 0.5)
+        self.assertEqual(stats['total_tokens_saved'], 240)
+        self.assertEqual(stats['latency']['lookup']['count'], 3)
+
+    def test_concurrent_sessions_add_their_deltas(self):
+        first, second = self.open_cache(), self.open_cache()
+        first.metrics.inc('misses', 3)
+        second.metrics.inc('misses', 4)
+        first.metrics.observe('lookup', 0.001)
+        second.metrics.observe('lookup', 0.002)
+        first.metrics.save()
+        second.metrics.save()
+        first.close()
+        second.close()
+
+        metrics = self.open_cache().metrics
+        self.assertEqual(metrics.counter('misses'), 7)
+        self.assertEqual(metrics.histogram('lookup').total, 2)
+
+    def test_prometheus_output(self):
+        metrics = self.open_cache().metrics
+        metrics.inc('exact_hits', 2)
+        metrics.observe('lookup', 0.001)
+        text = metrics.to_prometheus()
+        self.assertIn('# TYPE ai_cache_exact_hits_total counter\nai_cache_exact_hits_total 2\n', text)
+        self.assertIn('ai_cache_lookup_seconds_bucket{le="+Inf"} 1\n', text)
+        self.assertIn('ai_cache_lookup_seconds_count 1\n', text)
+
+if __name__ == '__main__':
+    unittest.main()
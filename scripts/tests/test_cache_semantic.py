@@ -0,0 +1,81 @@
+"""Semantic tier: rewordings hit, near-topic prompts do not"""
+
+import unittest
+
+from tests import TempDirTestCase, script
+
+STORED = (
+    'sort a list',
+    'write unit tests for the payment service',
+    'refactor the user repository to use async',
+    'how do I configure cors for the api gateway',
+    'fix the login page layout',
+)
+
+class SemanticTierTest(TempDirTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.cache = self.open_cache(semantic=True)
+        # Lexical search off, so every hit below comes from the semantic tier
+        self.cache.similarity_threshold = 0
+        for prompt in STORED:
+            self.cache.store_response(prompt, f"answer to {prompt}", 'gpt-4', 100, 0.01)
+
+    def hit(self, prompt):
+        cached = self.cache.get_cached_response(prompt)
+        return cached.prompt if cached is not None else None
+
+    def test_near_topic_prompts_miss(self):
+        for prompt in ('delete a file', 'reverse a list', 'sort a dict',
+                       'write unit tests for the pricing service',
+                       'refactor the product repository to use async'):
+            with self.subTest(prompt=prompt):
+                self.assertIsNone(self.hit(prompt))
+
+    def test_rewordings_hit(self):
+        self.assertEqual(self.hit('how to configure CORS in the API gateway'),
+                         'how do I configure cors for the api gateway')
+        self.assertEqual(self.hit('fix the layout of the login page'), 'fix the login page layout')
+
+    def test_batch_lookup_applies_the_same_guard(self):
+        results = self.cache.get_many(['sort a dict', 'fix the layout of the login page'])
+        self.assertIsNone(results[0])
+        self.assertEqual(results[1].prompt, 'fix the login page layout')
+
+class SemanticOverlapTest(TempDirTestCase):
+    """semantic_min_overlap: synonyms with a capable embedder, no generic-to-specific hits"""
+
+    def open_synonym_cache(self):
+        base = script('ai-cache.py').HashedNgramEmbedder()
+        # Stands in for a model embedder that places synonyms together
+        cache = self.open_cache(semantic=True, embedder=lambda text: base(text.replace('order', 'sort')))
+        cache.similarity_threshold = 0
+        cache.store_response('sort a list', 'use sorted()', 'gpt-4', 100, 0.01)
+        return cache
+
+    def test_synonym_misses_at_the_default_overlap(self):
+        self.assertIsNone(self.open_synonym_cache().get_cached_response('order a list'))
+
+    def test_synonym_hits_once_the_overlap_is_lowered(self):
+        cache = self.open_synonym_cache()
+        cache.semantic_min_overlap = 0.5
+        self.assertEqual(cache.get_cached_response('order a list').prompt, 'sort a list')
+
+    def test_generic_query_does_not_hit_a_more_specific_prompt(self):
+        cache = self.open_cache(semantic=True)
+        cache.similarity_threshold = 0
+        cache.semantic_threshold = 0.5
+        cache.store_response('write unit tests for the payment service', 'see tests/', 'gpt-4', 100, 0.01)
+        self.assertIsNone(cache.get_cached_response('write unit tests'))
+
+    def test_more_specific_query_hits_a_generic_prompt(self):
+        cache = self.open_cache(semantic=True)
+        cache.similarity_threshold = 0
+        cache.semantic_threshold = 0.5
+        cache.store_response('write unit tests', 'see tests/', 'gpt-4', 100, 0.01)
+        self.assertEqual(cache.get_cached_response('write unit tests for the payment service').prompt,
+                         'write unit tests')
+
+if __name__ == '__main__':
+    unittest.main()
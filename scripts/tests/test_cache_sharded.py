@@ -0,0 +1,66 @@
+"""Sharded storage: key routing, fixed layout, migration and concurrent writers"""
+
+import threading
+import unittest
+
+from tests import TempDirTestCase
+
+class ShardedStorageTest(TempDirTestCase):
+
+    def store(self, cache, count, prefix='prompt'):
+        return [cache.store_response(f"{prefix} {i}", f"answer {i}", 'gpt-4', 10, 0.01) for i in range(count)]
+
+    def test_entries_round_trip_through_their_shard(self):
+        for shard_backend in ('sqlite', 'json'):
+            with self.subTest(shard_backend=shard_backend):
+                cache_dir = self.root / shard_backend
+                cache = self.open_cache(cache_dir=cache_dir, backend='sharded', shards=4,
+                                        shard_backend=shard_backend)
+                keys = self.store(cache, 20)
+                for key in keys:
+                    shard = cache.storage.shard_for(key)
+                    self.assertEqual(shard.get(key).prompt_hash, key)
+                    self.assertEqual(sum(other.get(key) is not None for other in cache.storage.shards), 1)
+                cache.close()
+
+                cache = self.open_cache(cache_dir=cache_dir, backend='sharded')
+                self.assertEqual(len(cache.cache), 20)
+                self.assertEqual(cache.get_cached_response('prompt 7').response, 'answer 7')
+
+    def test_layout_is_fixed_on_creation(self):
+        cache = self.open_cache(backend='sharded', shards=4, shard_backend='json')
+        self.store(cache, 5)
+        cache.close()
+
+        cache = self.open_cache(backend='sharded', shards=8, shard_backend='sqlite')
+        self.assertEqual(len(cache.storage.shards), 4)
+        self.assertEqual(cache.storage.shard_backend, 'json')
+        self.assertEqual(len(cache.cache), 5)
+
+    def test_single_file_cache_migrates_into_shards(self):
+        cache = self.open_cache(backend='sqlite')
+        self.store(cache, 10)
+        cache.close()
+
+        cache = self.open_cache(backend='sharded', shards=4)
+        self.assertEqual(len(cache.cache), 10)
+        self.assertFalse((cache.cache_dir / 'responses.db').exists())
+        self.assertTrue((cache.cache_dir / 'responses.db.migrated').exists())
+
+    def test_concurrent_writers_do_not_lose_entries(self):
+        self.open_cache(backend='sharded', shards=4, shard_backend='json').close()
+        caches = [self.open_cache(backend='sharded') for _ in range(4)]
+        threads = [threading.Thread(target=self.store, args=(cache, 25, f"writer {n}"))
+                   for n, cache in enumerate(caches)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        for cache in caches:
+            cache.close()
+
+        cache = self.open_cache(backend='sharded')
+        self.assertEqual(len(cache.cache), 100)
+
+if __name__ == '__main__':
+    unittest.main()
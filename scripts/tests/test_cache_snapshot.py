@@ -0,0 +1,99 @@
+"""Snapshots and warming: export/import round-trip, integrity checks, conflict rules"""
+
+import gzip
+import json
+import unittest
+
+from tests import TempDirTestCase
+
+LARGE = 'Stream the rows in pages and commit every page in one transaction. ' * 60
+
+class SnapshotTest(TempDirTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.source = self.open_cache(cache_dir=self.root / 'source')
+        self.source.store_response('explain the order service', 'It routes orders.', 'gpt-4', 120, 0.01,
+                                   quality_score=0.6)
+        self.source.store_response('design the import pipeline', LARGE, 'gpt-4', 900, 0.05)
+        self.source.store_response('document the payment api', 'Use openapi.yaml.', 'gpt-4', 80, 0.01,
+                                   context='openapi: 3.0')
+        self.snapshot = self.root / 'cache.snapshot.gz'
+        self.assertEqual(self.source.export_snapshot(self.snapshot), 3)
+
+    def target(self, name='target'):
+        return self.open_cache(cache_dir=self.root / name)
+
+    def test_round_trip_restores_bodies_and_contexts(self):
+        cache = self.target()
+        self.assertEqual(cache.import_snapshot(self.snapshot), {'imported': 3, 'skipped': 0, 'corrupt': 0})
+        self.assertEqual(cache.get_cached_response('design the import pipeline').response, LARGE)
+        self.assertTrue(cache.cache[cache._generate_prompt_hash('design the import pipeline')].response_ref)
+        self.assertEqual(cache.get_cached_response('document the payment api', 'openapi: 3.0').response,
+                         'Use openapi.yaml.')
+        cache.close()
+        self.assertEqual(len(self.target().cache), 3)
+
+    def test_conflict_rules(self):
+        expectations = {'quality': 'It routes orders.', 'keep': 'Stale answer.', 'replace': 'It routes orders.'}
+        for rule, expected in expectations.items():
+            with self.subTest(on_conflict=rule):
+                cache = self.target(rule)
+                cache.store_response('explain the order service', 'Stale answer.', 'gpt-4', 120, 0.01,
+                                     quality_score=0.4)
+                result = cache.import_snapshot(self.snapshot, on_conflict=rule)
+                self.assertEqual(result['skipped'], 1 if rule == 'keep' else 0)
+                self.assertEqual(cache.get_cached_response('explain the order service').response, expected)
+
+        cache = self.target('better')
+        cache.store_response('explain the order service', 'Better answer.', 'gpt-4', 120, 0.01,
+                             quality_score=0.9)
+        self.assertEqual(cache.import_snapshot(self.snapshot)['skipped'], 1)
+
+    def rewrite(self, edit):
+        with gzip.open(self.snapshot, 'rt', encoding='utf-8') as f:
+            lines = f.readlines()
+        with gzip.open(self.snapshot, 'wt', encoding='utf-8') as f:
+            f.writelines(edit(lines))
+
+    def test_corrupt_entries_are_skipped(self):
+        self.rewrite(lambda lines: [lines[0], lines[1].replace('routes', 'drops')] + lines[2:])
+        result = self.target().import_snapshot(self.snapshot)
+        self.assertEqual(result, {'imported': 2, 'skipped': 0, 'corrupt': 1})
+
+    def test_truncated_snapshot_imports_the_complete_entries(self):
+        self.rewrite(lambda lines: lines[:3])
+        self.assertEqual(self.target().import_snapshot(self.snapshot)['imported'], 2)
+
+    def test_rejects_foreign_and_newer_files(self):
+        foreign = self.root / 'other.gz'
+        with gzip.open(foreign, 'wt') as f:
+            f.write('{"format": "something-else"}\n')
+        with self.assertRaises(ValueError):
+            self.target().import_snapshot(foreign)
+
+        newer = json.dumps({'format': 'ai-cache-snapshot', 'version': 99}) + '\n'
+        self.rewrite(lambda lines: [newer] + lines[1:])
+        with self.assertRaises(ValueError):
+            self.target('newer').import_snapshot(self.snapshot)
+
+class WarmTest(TempDirTestCase):
+
+    def test_warm_stores_interactions_and_counts_cached_prompts(self):
+        cache = self.open_cache()
+        cache.store_response('explain the order service', 'It routes orders.', 'gpt-4', 120, 0.01)
+        result = cache.warm([
+            '# prompts from yesterday',
+            'explain the order service',
+            'rotate the signing keys',
+            json.dumps({'prompt': 'explain the order service'}),
+            json.dumps({'prompt': 'name the import job', 'response': 'ImportJob', 'model': 'gpt-4',
+                        'tokens_used': 5, 'cost': 0.001}),
+        ])
+        self.assertEqual(result, {'stored': 1, 'warmed': 1, 'missing': 1})
+        self.assertEqual(cache.get_cached_response('name the import job').response, 'ImportJob')
+        counters = cache.metrics.to_dict()['counters']
+        self.assertEqual(counters['exact_hits'], 1)
+
+if __name__ == '__main__':
+    unittest.main()
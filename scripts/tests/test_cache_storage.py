@@ -0,0 +1,43 @@
+"""AICache storage backends: entries survive a restart and deletes stick"""
+
+import unittest
+
+from tests import TempDirTestCase
+
+class StorageBackendTest(TempDirTestCase):
+
+    def check_roundtrip(self, backend: str):
+        cache = self.open_cache(backend=backend)
+        key = cache.store_response('explain the order service', 'It routes orders.', 'gpt-4', 120, 0.01)
+        cache.store_response('document the payment api', 'See the spec.', 'gpt-4', 80, 0.01)
+        cache.close()
+
+        cache = self.open_cache(backend=backend)
+        hit = cache.get_cached_response('explain the order service')
+        self.assertIsNotNone(hit)
+        self.assertEqual(hit.response, 'It routes orders.')
+        self.assertEqual(hit.prompt_hash, key)
+
+        cache.clear_cache()
+        cache.close()
+        cache = self.open_cache(backend=backend)
+        self.assertIsNone(cache.get_cached_response('explain the order service'))
+        self.assertEqual(len(cache.cache), 0)
+
+    def test_sqlite_roundtrip(self):
+        self.check_roundtrip('sqlite')
+
+    def test_json_roundtrip(self):
+        self.check_roundtrip('json')
+
+    def test_json_cache_migrates_into_sqlite(self):
+        cache = self.open_cache(backend='json')
+        cache.store_response('list the catalog routes', 'GET /products', 'gpt-4', 50, 0.01)
+        cache.close()
+
+        cache = self.open_cache(backend='sqlite')
+        self.assertIsNotNone(cache.get_cached_response('list the catalog routes'))
+        self.assertTrue((cache.cache_dir / 'responses.db').exists())
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,91 @@
+"""ResponseTable: columnar storage, live views and row recycling"""
+
+import math
+import unittest
+from datetime import datetime
+
+from tests import script
+
+class ResponseTableTest(unittest.TestCase):
+
+    def setUp(self):
+        self.module = script('ai-cache.py')
+        self.table = self.module.ResponseTable()
+        self.now = datetime.now().replace(microsecond=0)
+
+    def response(self, key, **overrides):
+        values = dict(prompt_hash=key, prompt=f"prompt {key}", response=f"answer {key}", model='gpt-4',
+                      tokens_used=10, cost=0.01, quality_score=None, created_at=self.now,
+                      last_accessed=self.now, access_count=1)
+        values.update(overrides)
+        return self.module.CachedResponse(**values)
+
+    def test_record_round_trips_every_field(self):
+        original = self.response('a', quality_score=0.75, context_hash='ctx', metadata={'ttl_days': 2},
+                                 response=None, response_ref='ab' * 32, response_size=4096)
+        self.table['a'] = original
+        self.assertEqual(self.table.record('a'), original)
+
+        self.table['b'] = self.response('b')
+        plain = self.table.record('b')
+        self.assertIsNone(plain.quality_score)
+        self.assertEqual(plain.metadata, {})
+
+    def test_views_read_and_write_the_columns(self):
+        self.table['a'] = self.response('a')
+        view = self.table['a']
+        view.access_count += 2
+        view.quality_score = 0.5
+        view.last_accessed = datetime(2026, 1, 2, 3, 4, 5)
+
+        record = self.table.record('a')
+        self.assertEqual(record.access_count, 3)
+        self.assertEqual(record.quality_score, 0.5)
+        self.assertEqual(record.last_accessed, datetime(2026, 1, 2, 3, 4, 5))
+        self.assertEqual(view.created_ts, self.now.timestamp())
+
+    def test_detached_copy_is_independent(self):
+        self.table['a'] = self.response('a')
+        copy = self.table['a'].detach()
+        copy.access_count = 99
+        self.table.discard('a')
+        self.assertEqual(copy.prompt, 'prompt a')
+        self.assertNotIn('a', self.table)
+
+    def test_removed_rows_are_recycled_and_stale_views_fail(self):
+        for key in 'abc':
+            self.table[key] = self.response(key)
+        view = self.table['b']
+        self.assertEqual(self.table.pop('b').prompt, 'prompt b')
+        with self.assertRaises(KeyError):
+            view.prompt
+        self.assertIsNone(self.table.pop('b', None))
+
+        self.table['d'] = self.response('d')
+        self.assertEqual(len(self.table._columns[0]), 3)
+        self.assertEqual(self.table['d'].prompt, 'prompt d')
+        self.assertEqual(sorted(self.table), ['a', 'c', 'd'])
+
+    def test_update_merges_disjoint_and_overlapping_tables(self):
+        self.table['a'] = self.response('a')
+        other = self.module.ResponseTable()
+        other['b'] = self.response('b')
+        self.table.update(other)
+
+        newer = self.module.ResponseTable()
+        newer['a'] = self.response('a', access_count=7)
+        newer['c'] = self.response('c')
+        self.table.update(newer)
+
+        self.assertEqual(sorted(self.table), ['a', 'b', 'c'])
+        self.assertEqual(self.table['a'].access_count, 7)
+
+    def test_scan_yields_raw_column_values(self):
+        self.table['a'] = self.response('a', quality_score=0.9)
+        self.table['b'] = self.response('b')
+        rows = dict((key, rest) for key, *rest in self.table.scan('model', 'created_at', 'quality_score'))
+        self.assertEqual(rows['a'], ['gpt-4', self.now.timestamp(), 0.9])
+        self.assertTrue(math.isnan(rows['b'][2]))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,68 @@
+"""TokenIndex: prefix-filtered Jaccard search matches a brute-force scan"""
+
+import random
+import unittest
+
+from tests import TempDirTestCase, script
+
+WORDS = ('order', 'payment', 'service', 'api', 'explain', 'refactor', 'test', 'the', 'user',
+         'login', 'page', 'cache', 'queue', 'retry', 'schema', 'migration')
+
+def jaccard(a, b):
+    a, b = set(a.lower().split()), set(b.lower().split())
+    return len(a & b) / len(a | b) if a | b else 0.0
+
+class TokenIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        rng = random.Random(7)
+        self.prompts = {f"k{i}": ' '.join(rng.sample(WORDS, rng.randint(2, 8))) for i in range(300)}
+        self.queries = [' '.join(rng.sample(WORDS, rng.randint(1, 8))) for _ in range(40)]
+        self.index = script('ai-cache.py').TokenIndex()
+        for key, prompt in self.prompts.items():
+            self.index.add(key, prompt)
+
+    def brute_force(self, query, threshold):
+        return {key: jaccard(query, prompt) for key, prompt in self.prompts.items()
+                if jaccard(query, prompt) >= threshold}
+
+    def test_query_matches_a_full_scan(self):
+        for threshold in (0.3, 0.6, 0.85, 1.0):
+            for query in self.queries:
+                with self.subTest(threshold=threshold, query=query):
+                    found = dict(self.index.query(query, threshold))
+                    expected = self.brute_force(query, threshold)
+                    self.assertEqual(found.keys(), expected.keys())
+                    for key, similarity in found.items():
+                        self.assertAlmostEqual(similarity, expected[key])
+
+    def test_results_are_best_first(self):
+        scores = [similarity for _, similarity in self.index.query(self.queries[0], 0.2)]
+        self.assertEqual(scores, sorted(scores, reverse=True))
+
+    def test_query_many_matches_single_queries(self):
+        batched = self.index.query_many(self.queries, 0.5)
+        for query, matches in zip(self.queries, batched):
+            self.assertEqual({key for key, _ in matches}, {key for key, _ in self.index.query(query, 0.5)})
+
+    def test_removed_keys_leave_no_postings(self):
+        for key in list(self.prompts):
+            self.index.remove(key)
+        self.assertEqual(len(self.index), 0)
+        self.assertEqual(self.index.postings, {})
+        self.assertEqual(self.index.query(self.queries[0], 0.1), [])
+
+class SimilarityLookupTest(TempDirTestCase):
+
+    def test_similar_prompt_hits_and_unrelated_prompt_misses(self):
+        cache = self.open_cache()
+        cache.store_response('explain how the order service retries failed payments', 'With backoff.',
+                             'gpt-4', 100, 0.01)
+        hit = cache.get_cached_response('please explain how the order service retries failed payments')
+        self.assertEqual(hit.response, 'With backoff.')
+        self.assertIsNone(cache.get_cached_response('explain the login page'))
+        counters = cache.metrics.to_dict()['counters']
+        self.assertEqual((counters['similarity_hits'], counters['misses']), (1, 1))
+
+if __name__ == '__main__':
+    unittest.main()
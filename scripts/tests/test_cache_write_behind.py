@@ -0,0 +1,125 @@
+"""WriteBehindBuffer: queued writes are snapshots, failed flushes are not lost"""
+
+import unittest
+
+from tests import TempDirTestCase, script
+
+class RecordingStorage:
+    """Storage stand-in that records what each apply_batch call received"""
+
+    def __init__(self):
+        self.batches = []
+
+    def apply_batch(self, upserts, touches, deletes):
+        self.batches.append((list(upserts), list(touches), list(deletes)))
+
+    def clear(self):
+        pass
+
+class WriteBehindSnapshotTest(TempDirTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.ai_cache = script('ai-cache.py')
+        self.storage = RecordingStorage()
+        self.buffer = self.ai_cache.WriteBehindBuffer(self.storage, flush_interval=3600)
+        self.addCleanup(self.buffer.close)
+        cache = self.open_cache()
+        cache.store_response('describe the tenant model', 'One row per tenant.', 'gpt-4', 90, 0.01)
+        self.table = cache.cache
+        self.key = next(iter(self.table.keys()))
+
+    def test_flush_writes_the_state_at_enqueue_time(self):
+        view = self.table[self.key]
+        self.buffer.touch(view)
+        view.access_count = 99
+        self.buffer.flush()
+        (_, touches, _), = self.storage.batches
+        self.assertEqual(touches[0].access_count, 1)
+
+    def test_removed_row_still_flushes(self):
+        self.buffer.upsert(self.table[self.key], ['ctx'])
+        self.table.pop(self.key)
+        self.buffer.flush()
+        (upserts, _, _), = self.storage.batches
+        response, context_hashes = upserts[0]
+        self.assertEqual(response.response, 'One row per tenant.')
+        self.assertEqual(context_hashes, ['ctx'])
+
+    def test_touch_refreshes_a_pending_upsert(self):
+        view = self.table[self.key]
+        self.buffer.upsert(view, ['ctx'])
+        view.access_count = 5
+        self.buffer.touch(view)
+        self.buffer.flush()
+        (upserts, touches, _), = self.storage.batches
+        self.assertEqual(touches, [])
+        self.assertEqual(upserts[0][0].access_count, 5)
+        self.assertEqual(upserts[0][1], ['ctx'])
+
+class FailingStorage(RecordingStorage):
+    """Rejects any batch that touches one of the poisoned keys"""
+
+    def __init__(self, poisoned):
+        super().__init__()
+        self.poisoned = set(poisoned)
+        self.before_apply = lambda: None
+
+    def apply_batch(self, upserts, touches, deletes):
+        self.before_apply()
+        keys = [response.prompt_hash for response, _ in upserts]
+        keys += [response.prompt_hash for response in touches] + list(deletes)
+        if self.poisoned.intersection(keys):
+            raise KeyError(sorted(self.poisoned.intersection(keys))[0])
+        super().apply_batch(upserts, touches, deletes)
+
+class WriteBehindFailureTest(TempDirTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.ai_cache = script('ai-cache.py')
+        cache = self.open_cache()
+        for prompt in ('k1 catalog routes', 'k2 payment api', 'k3 order service'):
+            cache.store_response(prompt, 'answer', 'gpt-4', 10, 0.01)
+        self.responses = [cache.cache[key] for key in cache.cache.keys()]
+
+    def make_buffer(self, storage):
+        buffer = self.ai_cache.WriteBehindBuffer(storage, flush_interval=3600)
+        self.addCleanup(buffer.close)
+        return buffer
+
+    def test_failing_entry_does_not_drop_the_rest(self):
+        bad, *good = self.responses
+        storage = FailingStorage([bad.prompt_hash])
+        buffer = self.make_buffer(storage)
+        for response in self.responses:
+            buffer.upsert(response)
+        with self.assertLogs('ai_cache', 'WARNING'):
+            buffer.flush()
+        written = {response.prompt_hash for upserts, _, _ in storage.batches for response, _ in upserts}
+        self.assertEqual(written, {response.prompt_hash for response in good})
+        self.assertEqual(len(buffer), 1)
+
+    def test_failing_entry_is_dropped_after_max_retries(self):
+        bad = self.responses[0]
+        buffer = self.make_buffer(FailingStorage([bad.prompt_hash]))
+        buffer.upsert(bad)
+        with self.assertLogs('ai_cache', 'WARNING') as logs:
+            for _ in range(buffer.max_retries):
+                buffer.flush()
+        self.assertEqual(len(buffer), 0)
+        self.assertTrue(any(record.levelname == 'ERROR' for record in logs.records))
+
+    def test_retry_keeps_a_newer_mutation(self):
+        bad = self.responses[0]
+        storage = FailingStorage([bad.prompt_hash])
+        buffer = self.make_buffer(storage)
+        buffer.upsert(bad)
+        # The key is deleted while the failing flush is in progress
+        storage.before_apply = lambda: buffer.delete([bad.prompt_hash])
+        with self.assertLogs('ai_cache', 'WARNING'):
+            buffer.flush()
+        self.assertEqual(buffer._pending[bad.prompt_hash], ('delete', None))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,36 @@
+"""AIOptimizationCenter: the cache daemon is only probed when the cache is used"""
+
+import unittest
+
+from tests import TempDirTestCase, script
+
+class LazyCacheClientTest(TempDirTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.module = script('ai-optimization-center.py')
+        self.loads = []
+        real_load = self.module.load_script
+
+        def load_script(*args, **kwargs):
+            self.loads.append(args[0])
+            return real_load(*args, **kwargs)
+
+        self.module.load_script = load_script
+        self.addCleanup(setattr, self.module, 'load_script', real_load)
+        self.center = self.module.AIOptimizationCenter(self.root)
+        self.commands = []
+        self.center.run_command = lambda script, args: self.commands.append(args) or ''
+
+    def test_construction_does_not_load_the_cache(self):
+        self.assertEqual(self.loads, [])
+
+    def test_first_cache_call_probes_once(self):
+        self.assertFalse(self.center.cache_lookup('explain the order service'))
+        self.center.cache_store('explain the order service', 'r', 'gpt-4', 10, 0.01)
+        self.assertEqual(self.loads, ['ai-cache.py'])
+        # No daemon runs under the temp root, so both calls used the CLI
+        self.assertEqual([args[0] for args in self.commands], ['get', 'store'])
+
+if __name__ == '__main__':
+    unittest.main()